@@ -1,24 +1,128 @@
-import os, io, re
+import os, io, re, json, time, asyncio, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+import httplib2
+import numpy as np
 import pandas as pd
-from fastapi import FastAPI, HTTPException, Request
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import FastAPI, HTTPException, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
 from pydantic import BaseModel
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
 
 FOLDER_ID = os.getenv("DRIVE_FOLDER_ID")  # the SKU_ELIGIBILITY folder id
 SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
+CACHE_MAX_MB = int(os.getenv("SKU_CACHE_MAX_MB", "512"))  # memory budget for cached cities
+CACHE_REVALIDATE_S = int(os.getenv("SKU_CACHE_REVALIDATE_S", "60"))  # how often to re-check Drive
+PREFETCH_INTERVAL_S = int(os.getenv("SKU_PREFETCH_INTERVAL_S", "300"))  # 0 disables background refresh
+CACHE_RECENT_S = int(os.getenv("SKU_CACHE_RECENT_S", "900"))  # background loads never evict cities used this recently
+DRIVE_WORKERS = int(os.getenv("SKU_DRIVE_WORKERS", "8"))  # max concurrent Drive downloads
+ELIGIBILITY_STEM = "_eligibility"
+ELIGIBILITY_FORMATS = [".parquet", ".csv"]  # preferred first when a city has both
+RESULT_COLS = ["item_id","item_name","item_status","in_campaign","eligible_for_submission",
+               "reason","am_name","merchant_id","city_id","lm_order_count","lm_pax_count","as_of_date"]
+# columns read from the dataset; eligibility/reason are computed per request
+SOURCE_COLS = [c for c in RESULT_COLS if c not in ("eligible_for_submission", "reason")]
+CATEGORY_COLS = ["item_status", "am_name", "city_id"]
+
+DRIVE_HTTP_TIMEOUT_S = int(os.getenv("DRIVE_HTTP_TIMEOUT_S", "60"))
 
 # Auth to Drive
+class DriveClient:
+    """Application-lifetime Drive client.
+
+    Credentials are parsed once and shared; they refresh their own token when
+    it expires. httplib2 connections are not thread-safe, so each worker
+    thread gets its own service object over a keep-alive connection, built
+    from the bundled discovery document (no network fetch).
+    """
+
+    def __init__(self, creds_json: str):
+        self.creds = service_account.Credentials.from_service_account_info(
+            json.loads(creds_json), scopes=SCOPES
+        )
+        self.local = threading.local()
+
+    def service(self):
+        svc = getattr(self.local, "svc", None)
+        if svc is None:
+            http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=DRIVE_HTTP_TIMEOUT_S))
+            svc = build("drive", "v3", http=http, cache_discovery=False, static_discovery=True)
+            self.local.svc = svc
+        return svc
+
+drive_client = None
+drive_client_lock = threading.Lock()
+
 def drive_svc():
-    creds_json = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
-    if not creds_json:
-        raise RuntimeError("Missing GOOGLE_APPLICATION_CREDENTIALS_JSON")
-    creds = service_account.Credentials.from_service_account_info(
-        eval(creds_json), scopes=SCOPES
-    )
-    return build("drive", "v3", credentials=creds)
+    global drive_client
+    if drive_client is None:
+        with drive_client_lock:
+            if drive_client is None:
+                creds_json = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
+                if not creds_json:
+                    raise RuntimeError("Missing GOOGLE_APPLICATION_CREDENTIALS_JSON")
+                drive_client = DriveClient(creds_json)
+    return drive_client.service()
+
+# Metrics, scraped from /metrics
+STAGE_SECONDS = Histogram(
+    "sku_stage_seconds", "Time spent per load/query stage", ["stage"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60),
+)
+DOWNLOAD_BYTES = Histogram(
+    "sku_drive_download_bytes", "Size of downloaded city datasets",
+    buckets=(1e5, 1e6, 1e7, 5e7, 1e8, 2.5e8, 5e8, 1e9),
+)
+CACHE_REQUESTS = Counter("sku_cache_requests_total", "City lookups by cache outcome", ["result"])
+CACHE_BYTES = Gauge("sku_cache_bytes", "Estimated memory held by cached cities")
+CACHE_CITIES = Gauge("sku_cache_cities", "Number of cached cities")
+HTTP_IN_FLIGHT = Gauge("sku_http_in_flight", "Requests currently being served")
+HTTP_SECONDS = Histogram("sku_http_request_seconds", "End-to-end request latency", ["method", "path", "status"])
+
+# Drive I/O and parsing run here, never on the event loop
+drive_pool = ThreadPoolExecutor(max_workers=DRIVE_WORKERS, thread_name_prefix="drive")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    refresher = None
+    # fail fast on bad credentials instead of on the first request
+    if os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON"):
+        drive_svc()
+        if FOLDER_ID and PREFETCH_INTERVAL_S > 0:
+            city_cache.background_refresh = True
+            refresher = asyncio.create_task(refresh_loop())
+    yield
+    if refresher:
+        refresher.cancel()
+    drive_pool.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    HTTP_IN_FLIGHT.inc()
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        # label by route template, not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        path = route.path if route else "unmatched"
+        HTTP_SECONDS.labels(request.method, path, str(status)).observe(time.perf_counter() - t0)
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 class Req(BaseModel):
     city: str
@@ -26,68 +130,461 @@ class Req(BaseModel):
     merchant: str | None = None
     am: str | None = None
 
-def city_to_filename(city: str) -> str:
-    slug = city.strip().lower().replace(" ", "_")
-    return f"{slug}_eligibility.csv"
-
-def load_city_csv(city: str) -> pd.DataFrame:
-    filename = city_to_filename(city)
-    svc = drive_svc()
-    # find file by name in the folder
-    q = f"name='{filename}' and '{FOLDER_ID}' in parents and trashed=false"
-    res = svc.files().list(q=q, fields="files(id,name)").execute()
-    files = res.get("files", [])
+class BatchQuery(BaseModel):
+    q: str
+    merchant: str | None = None
+    am: str | None = None
+
+class BatchReq(BaseModel):
+    city: str
+    queries: list[BatchQuery]
+
+def city_slug(city: str) -> str:
+    return city.strip().lower().replace(" ", "_")
+
+def city_filenames(city: str) -> list[str]:
+    return [f"{city_slug(city)}{ELIGIBILITY_STEM}{ext}" for ext in ELIGIBILITY_FORMATS]
+
+def split_filename(name: str) -> tuple[str, str] | None:
+    # "johor_bahru_eligibility.parquet" -> ("johor_bahru", ".parquet")
+    for ext in ELIGIBILITY_FORMATS:
+        suffix = f"{ELIGIBILITY_STEM}{ext}"
+        if name.endswith(suffix):
+            return name[:-len(suffix)], ext
+    return None
+
+def preferred(files: list[dict]) -> dict:
+    return min(files, key=lambda f: ELIGIBILITY_FORMATS.index(split_filename(f["name"])[1]))
+
+def find_city_file(svc, city: str) -> dict:
+    names = " or ".join(f"name='{n}'" for n in city_filenames(city))
+    # find file by name in the folder, parquet before csv
+    q = f"({names}) and '{FOLDER_ID}' in parents and trashed=false"
+    with STAGE_SECONDS.labels("drive_list").time():
+        res = svc.files().list(q=q, fields="files(id,name,modifiedTime,md5Checksum)").execute()
+    files = [f for f in res.get("files", []) if split_filename(f["name"])]
     if not files:
         raise HTTPException(404, f"No dataset for city: {city}")
-    file_id = files[0]["id"]
-    data = svc.files().get_media(fileId=file_id).execute()
-    df = pd.read_csv(io.BytesIO(data))
-    # normalize for safe matching
-    for col in ["merchant_id","item_id","item_name","am_name","item_status"]:
-        if col in df.columns:
-            df[col] = df[col].astype(str)
+    return preferred(files)
+
+def list_city_files(svc=None) -> dict:
+    # city slug -> file metadata for every *_eligibility.{parquet,csv} in the folder
+    svc = svc or drive_svc()
+    q = f"name contains '{ELIGIBILITY_STEM}.' and '{FOLDER_ID}' in parents and trashed=false"
+    by_city, page_token = {}, None
+    while True:
+        with STAGE_SECONDS.labels("drive_list").time():
+            res = svc.files().list(q=q, fields="nextPageToken, files(id,name,modifiedTime,md5Checksum)",
+                                   pageSize=1000, pageToken=page_token).execute()
+        for f in res.get("files", []):
+            parts = split_filename(f["name"])
+            if parts:
+                by_city.setdefault(parts[0], []).append(f)
+        page_token = res.get("nextPageToken")
+        if not page_token:
+            return {slug: preferred(files) for slug, files in by_city.items()}
+
+def parse_city_csv(data: bytes) -> pd.DataFrame:
+    return pd.read_csv(io.BytesIO(data), usecols=lambda c: c in SOURCE_COLS)
+
+def parse_city_parquet(data: bytes) -> pd.DataFrame:
+    buf = pa.BufferReader(data)
+    present = set(pq.read_schema(buf).names)
+    return pq.read_table(buf, columns=[c for c in SOURCE_COLS if c in present]).to_pandas()
+
+def load_city(city: str, svc=None, meta: dict | None = None) -> pd.DataFrame:
+    svc = svc or drive_svc()
+    meta = meta or find_city_file(svc, city)
+    with STAGE_SECONDS.labels("drive_download").time():
+        data = svc.files().get_media(fileId=meta["id"]).execute()
+    DOWNLOAD_BYTES.observe(len(data))
+    with STAGE_SECONDS.labels("parse").time():
+        if meta["name"].endswith(".parquet"):
+            df = parse_city_parquet(data)
+        else:
+            df = parse_city_csv(data)
+    with STAGE_SECONDS.labels("normalize").time():
+        # normalize for safe matching
+        for col in ["merchant_id","item_id","item_name","am_name","item_status"]:
+            if col in df.columns:
+                df[col] = df[col].astype(str)
+        for col in CATEGORY_COLS:
+            if col in df.columns:
+                df[col] = df[col].astype("category")
+        # lower-cased match keys, computed once per load instead of per request
+        for col in ["merchant_id","am_name","item_name","item_id"]:
+            if col in df.columns:
+                df[f"{col}_lc"] = df[col].str.lower()
     return df
 
-def make_regex(query: str) -> str:
-    if query.isdigit(): return None
-    toks = [re.escape(t) for t in re.split(r"\s+", query.strip().lower()) if t]
-    return "".join([f"(?=.*{t})" for t in toks]) + ".*"
+def file_version(meta: dict) -> tuple:
+    return (meta.get("id"), meta.get("md5Checksum"), meta.get("modifiedTime"))
+
+class CityCache:
+    """LRU cache of normalized city frames, bounded by a memory budget.
+
+    Entries are revalidated against the Drive file's md5/modifiedTime at most
+    every `revalidate_s` seconds, so warm requests don't touch Drive at all.
+    Once the background refresher runs, cached entries are served as-is and
+    only the refresher talks to Drive for them.
+
+    Background loads don't count as use: they keep an entry's LRU position,
+    only evict cities idle for `recent_s`, and skip a new city that doesn't
+    fit otherwise.
+    """
+
+    def __init__(self, max_bytes: int, revalidate_s: int, recent_s: int = CACHE_RECENT_S):
+        self.max_bytes = max_bytes
+        self.revalidate_s = revalidate_s
+        self.recent_s = recent_s
+        self.background_refresh = False
+        self.entries = OrderedDict()  # city key -> {"df", "index", "version", "nbytes", "checked_at", "used_at"}
+        self.nbytes = 0
+        self.sizes = {}  # city key -> last loaded size, kept after eviction for prefetch planning
+        self.lock = threading.Lock()
+        self.load_locks = {}  # city key -> [lock, waiters] while a load is in flight, so concurrent misses load a city once
+
+    def peek(self, city: str) -> tuple[pd.DataFrame, "CityIndex"] | None:
+        key = city_slug(city)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and (self.background_refresh
+                          or time.monotonic() - entry["checked_at"] < self.revalidate_s):
+                self.entries.move_to_end(key)
+                entry["used_at"] = time.monotonic()
+                return entry["df"], entry["index"]
+        return None
+
+    def get(self, city: str) -> tuple[pd.DataFrame, "CityIndex"]:
+        hit = self.peek(city)
+        if hit:
+            return hit
+        key = city_slug(city)
+        with self.lock:
+            slot = self.load_locks.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                # another thread may have loaded it while we waited
+                hit = self.peek(city)
+                if hit:
+                    return hit
+                svc = drive_svc()
+                return self.refresh(key, find_city_file(svc, city), svc=svc)
+        finally:
+            # drop the lock with its last waiter, so unknown city names don't pile up
+            with self.lock:
+                slot[1] -= 1
+                if not slot[1]:
+                    del self.load_locks[key]
+
+    def refresh(self, key: str, meta: dict, svc=None,
+                background: bool = False) -> tuple[pd.DataFrame, "CityIndex"]:
+        version = file_version(meta)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry["version"] == version:
+                entry["checked_at"] = time.monotonic()
+                return entry["df"], entry["index"]
+
+        df = load_city(key, svc=svc, meta=meta)
+        with STAGE_SECONDS.labels("index_build").time():
+            index = CityIndex(df)
+        self.put(key, df, index, version, background=background)
+        return df, index
+
+    def free_bytes(self) -> int:
+        with self.lock:
+            return self.max_bytes - self.nbytes
+
+    def put(self, key: str, df: pd.DataFrame, index: "CityIndex", version: tuple,
+            background: bool = False) -> bool:
+        # returns False when a background load was not cached for lack of room
+        nbytes = int(df.memory_usage(deep=True).sum()) + index.nbytes
+        now = time.monotonic()
+        with self.lock:
+            self.sizes[key] = nbytes
+            old = self.entries.get(key)
+            entry = {"df": df, "index": index, "version": version, "nbytes": nbytes, "checked_at": now,
+                     "used_at": old["used_at"] if old else (-float("inf") if background else now)}
+            if background:
+                # make room only from cities nobody asked for recently, least recently used first
+                room = self.max_bytes - self.nbytes + (old["nbytes"] if old else 0)
+                idle = []
+                for k, e in self.entries.items():
+                    if room >= nbytes:
+                        break
+                    if k != key and now - e["used_at"] >= self.recent_s:
+                        idle.append(k)
+                        room += e["nbytes"]
+                if room < nbytes and not old:
+                    return False
+                # a newer version replaces a cached city even when over budget; serving stale data is worse
+                for k in idle:
+                    self.nbytes -= self.entries.pop(k)["nbytes"]
+                # swap in place, keeping the LRU position; new cities start least recently used
+                self.entries[key] = entry
+                if not old:
+                    self.entries.move_to_end(key, last=False)
+            else:
+                # swap the whole entry at once; readers holding the old frame keep using it
+                self.entries.pop(key, None)
+                self.entries[key] = entry
+            self.nbytes += nbytes - (old["nbytes"] if old else 0)
+            # evict least recently used cities, but always keep the one just loaded
+            while not background and self.nbytes > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= evicted["nbytes"]
+            CACHE_BYTES.set(self.nbytes)
+            CACHE_CITIES.set(len(self.entries))
+        return True
+
+city_cache = CityCache(CACHE_MAX_MB * 1024 * 1024, CACHE_REVALIDATE_S)
+
+async def prefetch_all():
+    # refresh cached cities; load others only while they fit the memory budget
+    loop = asyncio.get_running_loop()
+    files = await loop.run_in_executor(drive_pool, list_city_files)
+    cached = [slug for slug in files if slug in city_cache.entries]
+    results = await asyncio.gather(
+        *(loop.run_in_executor(drive_pool, partial(city_cache.refresh, slug, files[slug], background=True))
+          for slug in cached),
+        return_exceptions=True,
+    )
+    for slug, res in zip(cached, results):
+        if isinstance(res, Exception):
+            print(f"prefetch failed for {slug}: {res!r}")
+    # one at a time, so each check sees the previous load; cities never loaded before are tried once
+    for slug, meta in files.items():
+        if slug in city_cache.entries or city_cache.sizes.get(slug, 0) > city_cache.free_bytes():
+            continue
+        if city_cache.free_bytes() <= 0:
+            break
+        try:
+            await loop.run_in_executor(drive_pool, partial(city_cache.refresh, slug, meta, background=True))
+        except Exception as e:
+            print(f"prefetch failed for {slug}: {e!r}")
+
+async def refresh_loop():
+    while True:
+        try:
+            await prefetch_all()
+        except Exception as e:
+            print(f"prefetch failed: {e!r}")
+        await asyncio.sleep(PREFETCH_INTERVAL_S)
+
+async def get_city(city: str) -> tuple[pd.DataFrame, "CityIndex"]:
+    hit = city_cache.peek(city)
+    CACHE_REQUESTS.labels("hit" if hit else "miss").inc()
+    if hit:
+        return hit
+    return await asyncio.get_running_loop().run_in_executor(drive_pool, city_cache.get, city)
+
+def query_tokens(query: str) -> list[str]:
+    return [t for t in re.split(r"\s+", query.strip().lower()) if t]
+
+def postings(s: pd.Series) -> dict:
+    # value -> sorted unique row positions of the city frame
+    rows = s.index.to_numpy()
+    return {k: np.unique(rows[pos]) for k, pos in s.groupby(s, sort=False).indices.items()}
+
+EMPTY_ROWS = np.empty(0, dtype=np.int64)
+NGRAM_MAX = 3  # vocabulary n-grams indexed, 1..NGRAM_MAX characters
+SCOPE_SCAN_ROWS = int(os.getenv("SKU_SCOPE_SCAN_ROWS", "20000"))  # scopes up to this size are matched row by row
+TOKEN_MEMO_MB = int(os.getenv("SKU_TOKEN_MEMO_MB", "8"))  # per-city cap on memoized query-token rows
+
+def vocab_ngrams(vocab: list[str]) -> dict:
+    # n-gram -> sorted vocabulary ids of the tokens containing it
+    s = pd.Series(vocab, dtype=object)
+    lengths = s.str.len().to_numpy()
+    grams = []
+    for n in range(1, NGRAM_MAX + 1):
+        for start in range(int(lengths.max(initial=0)) - n + 1):
+            g = s[lengths >= start + n].str.slice(start, start + n)
+            grams.append(g)
+    return postings(pd.concat(grams)) if grams else {}
+
+class CityIndex:
+    """Inverted index over a city frame, built once per load.
+
+    Maps merchant_id, am_name, item_id and every whitespace token of item_name
+    (all lower-cased) to sorted row positions. A query token matches any
+    indexed token that contains it, which keeps the old substring regex
+    semantics: query tokens have no whitespace, so a hit always falls inside
+    a single item-name token.
+
+    Containing tokens are found through an n-gram index over the vocabulary,
+    so a query only checks tokens sharing its n-grams. Small merchant/AM scopes
+    skip the index and match the scope's item names directly. Expanded tokens
+    are memoized in an LRU bounded by bytes; the bound is part of `nbytes`.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.merchant = postings(df["merchant_id_lc"]) if "merchant_id_lc" in df.columns else {}
+        self.am = postings(df["am_name_lc"]) if "am_name_lc" in df.columns else {}
+        self.item_id = postings(df["item_id_lc"]) if "item_id_lc" in df.columns else {}
+        if "item_name_lc" in df.columns:
+            self.names = df["item_name_lc"]
+            self.tokens = postings(self.names.str.split().explode().dropna())
+        else:
+            self.names = None
+            self.tokens = {}
+        self.vocab = list(self.tokens)
+        self.ngrams = vocab_ngrams(self.vocab)
+        index_bytes = sum(a.nbytes for d in (self.merchant, self.am, self.item_id, self.tokens, self.ngrams)
+                          for a in d.values())
+        # memo never outgrows half the index it caches
+        self.memo_max_bytes = min(TOKEN_MEMO_MB * 1024 * 1024, index_bytes // 2)
+        self.memo = OrderedDict()  # query token -> row positions, least recently used first
+        self.memo_bytes = 0
+        self.memo_lock = threading.Lock()
+        self.nbytes = index_bytes + self.memo_max_bytes
+
+    def matching_vocab(self, tok: str) -> list[str]:
+        # vocabulary tokens containing tok; candidates share all of its n-grams
+        n = min(NGRAM_MAX, len(tok))
+        ids = intersect_all([self.ngrams.get(tok[i:i + n], EMPTY_ROWS) for i in range(len(tok) - n + 1)])
+        if len(tok) <= NGRAM_MAX:
+            return [self.vocab[i] for i in ids]
+        return [self.vocab[i] for i in ids if tok in self.vocab[i]]
+
+    def token_rows(self, tok: str) -> np.ndarray:
+        with self.memo_lock:
+            rows = self.memo.get(tok)
+            if rows is not None:
+                self.memo.move_to_end(tok)
+                return rows
+        hits = [self.tokens[v] for v in self.matching_vocab(tok)]
+        rows = np.unique(np.concatenate(hits)) if hits else EMPTY_ROWS
+        if rows.nbytes <= self.memo_max_bytes // 4:
+            with self.memo_lock:
+                if tok not in self.memo:
+                    self.memo[tok] = rows
+                    self.memo_bytes += rows.nbytes
+                while self.memo_bytes > self.memo_max_bytes:
+                    _, evicted = self.memo.popitem(last=False)
+                    self.memo_bytes -= evicted.nbytes
+        return rows
+
+    def scan_scope(self, tokens: list[str], scope: np.ndarray) -> np.ndarray:
+        # substring match over the scope's own item names, for scopes smaller than the index lookups
+        names = self.names.iloc[scope]
+        keep = np.ones(len(scope), dtype=bool)
+        for t in tokens:
+            keep &= names.str.contains(t, regex=False, na=False).to_numpy(dtype=bool)
+        return scope[keep]
+
+    def scope_rows(self, merchant: str | None = None, am: str | None = None) -> np.ndarray | None:
+        # rows for a merchant and/or AM scope; None means unscoped
+        sets = []
+        if merchant:
+            sets.append(self.merchant.get(merchant.strip().lower(), EMPTY_ROWS))
+        if am:
+            sets.append(self.am.get(am.strip().lower(), EMPTY_ROWS))
+        return intersect_all(sets) if sets else None
+
+    def lookup(self, q: str, merchant: str | None = None, am: str | None = None,
+               scope: np.ndarray | None = None) -> np.ndarray:
+        if scope is None:
+            scope = self.scope_rows(merchant, am)
+        sets = [] if scope is None else [scope]
+        q = q.strip().lower()
+        if q.isdigit():
+            sets.append(self.item_id.get(q, EMPTY_ROWS))
+        elif scope is not None and self.names is not None and len(scope) <= SCOPE_SCAN_ROWS:
+            return self.scan_scope(query_tokens(q), scope)
+        else:
+            sets.extend(self.token_rows(t) for t in query_tokens(q))
+        return intersect_all(sets)
+
+def intersect_all(sets: list[np.ndarray]) -> np.ndarray:
+    # intersect smallest posting lists first; nothing to intersect matches nothing
+    if not sets:
+        return EMPTY_ROWS
+    sets = sorted(sets, key=len)
+    rows = sets[0]
+    for other in sets[1:]:
+        if not len(rows):
+            break
+        rows = np.intersect1d(rows, other, assume_unique=True)
+    return rows
+
+MAX_RESULTS = 10
+
+def blank_to_none(value: str | None) -> str | None:
+    # whitespace-only merchant / am values count as missing, not as an empty scope
+    return value if value and value.strip() else None
+MAX_BATCH = int(os.getenv("SKU_MAX_BATCH", "500"))  # queries per /skucheck/batch call
+def add_eligibility(df: pd.DataFrame) -> pd.DataFrame:
+    # vectorized over item_status / in_campaign; callers pass only the rows they return
+    in_campaign = df["in_campaign"].astype(bool).to_numpy()
+    active = (df["item_status"].str.upper() == "ACTIVE").to_numpy()
+    df["eligible_for_submission"] = active & ~in_campaign
+    df["reason"] = np.select(
+        [in_campaign, ~active],
+        ["Already in campaign", "Item not ACTIVE on menu"],
+        default="Eligible",
+    )
+    return df
+
+def result_records(df: pd.DataFrame, rows: np.ndarray) -> list[dict]:
+    # copy only the rows being returned; the cached frame is shared between requests
+    out = add_eligibility(df.iloc[rows].copy())
+    out_cols = [c for c in RESULT_COLS if c in out.columns]
+    return out[out_cols].to_dict(orient="records")
+
+def to_results(df: pd.DataFrame, rows: np.ndarray) -> list[dict]:
+    return result_records(df, rows[:MAX_RESULTS])
 
 @app.post("/skucheck")
-def skucheck(r: Req):
-    if not r.city or not r.q:
+async def skucheck(r: Req):
+    if not r.city.strip() or not r.q.strip():
         raise HTTPException(400, "city and q required")
-    if not (r.merchant or r.am):
+    if not (blank_to_none(r.merchant) or blank_to_none(r.am)):
         raise HTTPException(400, "merchant or am required")
 
-    df = load_city_csv(r.city)
-
-    # scope by merchant or AM
-    if r.merchant:
-        df = df[df["merchant_id"].str.lower() == r.merchant.strip().lower()]
-    if r.am:
-        df = df[df["am_name"].str.lower() == r.am.strip().lower()]
-
-    # match by id or name tokens
-    q = r.q.strip().lower()
-    if q.isdigit():
-        df = df[df["item_id"].str.lower() == q]
-    else:
-        pat = make_regex(q)
-        df = df[df["item_name"].str.lower().str.contains(pat, regex=True, na=False)]
-
-    # compute eligibility
-    df["eligible_for_submission"] = (df["item_status"].str.upper()=="ACTIVE") & (~df["in_campaign"].astype(bool))
-    df["reason"] = df.apply(
-        lambda x: "Already in campaign" if bool(x["in_campaign"])
-        else ("Item not ACTIVE on menu" if str(x["item_status"]).upper()!="ACTIVE"
-              else "Eligible"),
-        axis=1
-    )
+    df, index = await get_city(r.city)
+
+    # scope by merchant or AM and match by id or name tokens via the index
+    with STAGE_SECONDS.labels("filter").time():
+        scope = index.scope_rows(r.merchant, r.am)
+    with STAGE_SECONDS.labels("match").time():
+        rows = index.lookup(r.q, scope=scope)
+    with STAGE_SECONDS.labels("render").time():
+        results = to_results(df, rows)
+
+    return {"count": len(results), "total_matches": int(len(rows)), "results": results}
+
+@app.post("/skucheck/batch")
+async def skucheck_batch(r: BatchReq):
+    if not r.city.strip() or not r.queries:
+        raise HTTPException(400, "city and queries required")
+    if len(r.queries) > MAX_BATCH:
+        raise HTTPException(400, f"at most {MAX_BATCH} queries per batch")
+    for i, bq in enumerate(r.queries):
+        if not bq.q.strip():
+            raise HTTPException(400, f"queries[{i}]: q required")
+        if not (blank_to_none(bq.merchant) or blank_to_none(bq.am)):
+            raise HTTPException(400, f"queries[{i}]: merchant or am required")
+
+    df, index = await get_city(r.city)
+
+    # group by scope so each merchant/AM is resolved once for the whole sheet
+    keys = [((bq.merchant or "").strip().lower(), (bq.am or "").strip().lower()) for bq in r.queries]
+    with STAGE_SECONDS.labels("filter").time():
+        scopes = {key: index.scope_rows(*key) for key in set(keys)}
+    with STAGE_SECONDS.labels("match").time():
+        matches = [index.lookup(bq.q, scope=scopes[key]) for bq, key in zip(r.queries, keys)]
 
-    cols = ["item_id","item_name","item_status","in_campaign","eligible_for_submission",
-            "reason","am_name","merchant_id","city_id","lm_order_count","lm_pax_count","as_of_date"]
-    out_cols = [c for c in cols if c in df.columns]
-    out = df[out_cols].head(10)
+    # build every returned row in one slice, then split it back per query
+    pages = [rows[:MAX_RESULTS] for rows in matches]
+    with STAGE_SECONDS.labels("render").time():
+        records = result_records(df, np.concatenate(pages))
+    bounds = np.cumsum([0] + [len(p) for p in pages])
 
-    return {"count": len(out), "results": out.to_dict(orient="records")}
+    results = []
+    for bq, rows, lo, hi in zip(r.queries, matches, bounds[:-1], bounds[1:]):
+        results.append({"q": bq.q, "merchant": bq.merchant, "am": bq.am,
+                        "count": int(hi - lo), "total_matches": int(len(rows)),
+                        "results": records[lo:hi]})
+    return {"count": len(results), "results": results}
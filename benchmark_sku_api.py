@@ -0,0 +1,252 @@
+"""
+Benchmark the SKU checker API (api/main.py)
+Serves synthetic {city}_eligibility files from disk through a local stand-in
+for the Drive service, drives /skucheck with a realistic query mix and
+reports p50/p95/p99 latency, RPS and peak RSS per dataset size (RSS is n/a on
+Windows, which has no resource module).
+
+Usage:
+    python benchmark_sku_api.py
+    python benchmark_sku_api.py --rows 10000 100000 2000000 --requests 2000 --concurrency 32
+    python benchmark_sku_api.py --format parquet --json bench_results.json
+    python benchmark_sku_api.py --url http://localhost:8080   # hit a running server instead
+
+Run the same command before and after a change to compare results.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+import numpy as np
+import pandas as pd
+import httpx
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api')
+sys.path.insert(0, API_DIR)
+os.environ.setdefault('DRIVE_FOLDER_ID', 'local-bench')
+
+import main  # noqa: E402  (api/main.py)
+
+WORDS = [
+    'nasi', 'lemak', 'ayam', 'goreng', 'mee', 'kuey', 'teow', 'char', 'roti', 'canai',
+    'teh', 'tarik', 'kopi', 'ais', 'laksa', 'penang', 'asam', 'curry', 'satay', 'rendang',
+    'daging', 'ikan', 'bakar', 'sambal', 'udang', 'sotong', 'telur', 'mamak', 'special',
+    'set', 'combo', 'large', 'small', 'spicy', 'cheese', 'burger', 'pizza', 'bubble', 'milk',
+    'tea', 'coffee', 'latte', 'matcha', 'chicken', 'rice', 'noodle', 'soup', 'fried', 'wrap',
+]
+
+
+def generate_dataset(rows: int, seed: int = 7) -> pd.DataFrame:
+    """Synthetic eligibility rows with roughly the shape of a real city file"""
+    rng = np.random.default_rng(seed)
+    n_merchants = max(rows // 200, 10)
+    n_ams = max(n_merchants // 150, 3)
+    words = np.array(WORDS)
+    name_len = rng.integers(2, 5, rows)
+    picks = rng.integers(0, len(words), (rows, 4))
+    names = [' '.join(words[picks[i, :name_len[i]]]).title() for i in range(rows)]
+    merchant_idx = rng.integers(0, n_merchants, rows)
+    return pd.DataFrame({
+        'merchant_id': np.char.add('1-', (merchant_idx + 100000).astype(str)),
+        'item_id': (np.arange(rows) + 5_000_000).astype(str),
+        'item_name': names,
+        'item_status': rng.choice(['ACTIVE', 'INACTIVE'], rows, p=[0.85, 0.15]),
+        'in_campaign': rng.random(rows) < 0.2,
+        'am_name': np.char.add('AM ', (merchant_idx % n_ams).astype(str)),
+        'city_id': 13,
+        'lm_order_count': rng.poisson(40, rows),
+        'lm_pax_count': rng.poisson(25, rows),
+        'as_of_date': '2025-11-30',
+    })
+
+
+def ensure_dataset(data_dir: str, rows: int, fmt: str) -> str:
+    """Write bench{rows}_eligibility.{fmt} once and reuse it on later runs"""
+    os.makedirs(data_dir, exist_ok=True)
+    city = f'bench{rows}'
+    path = os.path.join(data_dir, f'{city}_eligibility.{fmt}')
+    if not os.path.exists(path):
+        print(f'Generating {rows:,} rows -> {path}')
+        df = generate_dataset(rows)
+        if fmt == 'parquet':
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+    return city
+
+
+class _Call:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self, **kwargs):
+        return self.fn()
+
+
+class LocalDriveFiles:
+    """Answers the files().list / files().get_media calls main.py makes"""
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+
+    def _meta(self, name: str) -> dict:
+        path = os.path.join(self.data_dir, name)
+        st = os.stat(path)
+        return {'id': name, 'name': name, 'modifiedTime': str(st.st_mtime_ns), 'md5Checksum': str(st.st_size)}
+
+    def list(self, q: str, fields: str = None, **kwargs):
+        def run():
+            names = [n for n in os.listdir(self.data_dir) if main.split_filename(n)]
+            if "name='" in q:
+                names = [n for n in names if f"name='{n}'" in q]
+            return {'files': [self._meta(n) for n in sorted(names)]}
+        return _Call(run)
+
+    def get_media(self, fileId: str):
+        def run():
+            with open(os.path.join(self.data_dir, fileId), 'rb') as f:
+                return f.read()
+        return _Call(run)
+
+
+class LocalDrive:
+    def __init__(self, data_dir: str):
+        self._files = LocalDriveFiles(data_dir)
+
+    def files(self):
+        return self._files
+
+
+def build_queries(df: pd.DataFrame, n: int, seed: int = 11) -> list:
+    """Mix of numeric item ids and 1-3 token names, scoped by merchant or AM"""
+    rng = random.Random(seed)
+    sample = df.sample(min(len(df), 5000), random_state=seed)
+    rows = sample.to_dict(orient='records')
+    queries = []
+    for _ in range(n):
+        row = rng.choice(rows)
+        kind = rng.random()
+        if kind < 0.25:
+            q = str(row['item_id'])
+        else:
+            tokens = str(row['item_name']).lower().split()
+            q = ' '.join(rng.sample(tokens, min(len(tokens), rng.randint(1, 3))))
+            if rng.random() < 0.2:
+                q = q[1:]  # partial word, exercises substring matching
+        scope = {'merchant': row['merchant_id']} if rng.random() < 0.7 else {'am': row['am_name']}
+        queries.append({'q': q, **scope})
+    return queries
+
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS; None where there is no resource module
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+async def run_load(client: httpx.AsyncClient, city: str, queries: list, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(body):
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            resp = await client.post('/skucheck', json={'city': city, **body})
+            latencies.append(time.perf_counter() - t0)
+            if resp.status_code != 200:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(b) for b in queries))
+    wall = time.perf_counter() - t0
+    ms = np.array(latencies) * 1000
+    return {
+        'requests': len(queries),
+        'errors': errors,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'rps': len(queries) / wall,
+    }
+
+
+async def bench_size(args, rows: int) -> dict:
+    city = ensure_dataset(args.data_dir, rows, args.format)
+    df = pd.read_parquet(os.path.join(args.data_dir, f'{city}_eligibility.parquet')) if args.format == 'parquet' \
+        else pd.read_csv(os.path.join(args.data_dir, f'{city}_eligibility.csv'), dtype=str)
+    queries = build_queries(df, args.requests)
+    del df
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url='http://bench', timeout=120)
+
+    async with client:
+        # first request pays the download + parse + index build
+        t0 = time.perf_counter()
+        resp = await client.post('/skucheck', json={'city': city, **queries[0]})
+        cold_ms = (time.perf_counter() - t0) * 1000
+        resp.raise_for_status()
+        result = await run_load(client, city, queries, args.concurrency)
+
+    result.update({'rows': rows, 'format': args.format, 'cold_ms': cold_ms, 'peak_rss_mb': peak_rss_mb()})
+    return result
+
+
+def print_report(results: list):
+    print()
+    print('=' * 80)
+    print('SKU API BENCHMARK')
+    print('=' * 80)
+    print(f"{'rows':>10} {'fmt':>8} {'cold ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'RPS':>8} {'errors':>7} {'RSS MB':>8}")
+    for r in results:
+        print(f"{r['rows']:>10,} {r['format']:>8} {r['cold_ms']:>9.0f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['p99_ms']:>8.2f} {r['rps']:>8.0f} {r['errors']:>7} "
+              + (f"{r['peak_rss_mb']:>8.0f}" if r['peak_rss_mb'] is not None else f"{'n/a':>8}"))
+    print('=' * 80)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Benchmark the /skucheck endpoint')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='Dataset sizes to benchmark, smallest first (peak RSS is cumulative)')
+    parser.add_argument('--requests', type=int, default=1000, help='Requests per dataset size')
+    parser.add_argument('--concurrency', type=int, default=16, help='In-flight requests')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--data-dir', default='bench_data', help='Where synthetic datasets are written')
+    parser.add_argument('--url', help='Benchmark a running server instead of the in-process app')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    if not args.url:
+        local = LocalDrive(args.data_dir)
+        main.drive_svc = lambda: local
+
+    results = []
+    for rows in sorted(args.rows):
+        results.append(asyncio.run(bench_size(args, rows)))
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Results written to {args.json}')
+
+
+if __name__ == '__main__':
+    main_cli()
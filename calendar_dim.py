@@ -0,0 +1,256 @@
+"""
+Precomputed Calendar Dimension
+One row per day from 2019-01-01 to 2030-12-31, stored as numpy columns:
+
+    date_id              20251130
+    year / month / day   2025 / 11 / 30
+    day_of_week          0 = Monday ... 6 = Sunday
+    iso_year / iso_week  ISO-8601 week
+    month_start / month_end / days_in_month
+    week_start           Monday of the day's week
+    same_day_last_month  same day a month earlier, clamped to month end (Mar 31 -> Feb 28)
+    same_day_last_year   same day a year earlier (Feb 29 -> Feb 28)
+    is_holiday           Malaysian national public holiday
+
+Date windows are array indexing instead of datetime arithmetic, and date_id
+lookups take whole arrays: calendar.weekday(date_ids) parses nothing.
+
+Holidays are the nominal national dates. Sunday replacement days and state-only
+holidays are not modelled. Lunar / Islamic dates after 2025 are the expected
+dates - update MY_PUBLIC_HOLIDAYS when the gazette is published.
+
+Usage:
+    from calendar_dim import get_calendar
+    calendar = get_calendar()
+    calendar.report_windows()                  # the weekly report's get_week_dates() dict
+    calendar.weekday([20251110, 20251116])     # -> array([0, 6])
+    calendar.shift(20251130, -7)               # -> 20251123
+
+    python calendar_dim.py 20251101 20251130   # print the calendar rows for a range
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import numpy as np
+
+CALENDAR_START = '2019-01-01'
+CALENDAR_END = '2030-12-31'
+WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+MONTH_ABBRS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+# Per-year (month, day) of the moving national holidays; 2026 onwards are expected dates
+_MOVING_HOLIDAYS = {
+    'Chinese New Year': {
+        2019: (2, 5), 2020: (1, 25), 2021: (2, 12), 2022: (2, 1), 2023: (1, 22), 2024: (2, 10),
+        2025: (1, 29), 2026: (2, 17), 2027: (2, 6), 2028: (1, 26), 2029: (2, 13), 2030: (2, 3)},
+    'Hari Raya Aidilfitri': {
+        2019: (6, 5), 2020: (5, 24), 2021: (5, 13), 2022: (5, 2), 2023: (4, 22), 2024: (4, 10),
+        2025: (3, 31), 2026: (3, 21), 2027: (3, 10), 2028: (2, 27), 2029: (2, 15), 2030: (2, 5)},
+    'Hari Raya Haji': {
+        2019: (8, 11), 2020: (7, 31), 2021: (7, 20), 2022: (7, 10), 2023: (6, 29), 2024: (6, 17),
+        2025: (6, 7), 2026: (5, 27), 2027: (5, 17), 2028: (5, 6), 2029: (4, 25), 2030: (4, 14)},
+    'Awal Muharram': {
+        2019: (9, 1), 2020: (8, 20), 2021: (8, 10), 2022: (7, 30), 2023: (7, 19), 2024: (7, 7),
+        2025: (6, 27), 2026: (6, 16), 2027: (6, 6), 2028: (5, 25), 2029: (5, 14), 2030: (5, 3)},
+    'Maulidur Rasul': {
+        2019: (11, 9), 2020: (10, 29), 2021: (10, 19), 2022: (10, 8), 2023: (9, 28), 2024: (9, 16),
+        2025: (9, 5), 2026: (8, 25), 2027: (8, 15), 2028: (8, 3), 2029: (7, 24), 2030: (7, 13)},
+    'Wesak Day': {
+        2019: (5, 19), 2020: (5, 7), 2021: (5, 26), 2022: (5, 15), 2023: (5, 4), 2024: (5, 22),
+        2025: (5, 12), 2026: (5, 31), 2027: (5, 20), 2028: (5, 9), 2029: (5, 27), 2030: (5, 16)},
+    'Deepavali': {
+        2019: (10, 27), 2020: (11, 14), 2021: (11, 4), 2022: (10, 24), 2023: (11, 12), 2024: (10, 31),
+        2025: (10, 20), 2026: (11, 8), 2027: (10, 28), 2028: (10, 17), 2029: (11, 5), 2030: (10, 26)},
+}
+_SECOND_DAY = ('Chinese New Year', 'Hari Raya Aidilfitri')
+_FIXED_HOLIDAYS = {
+    (1, 1): "New Year's Day",
+    (5, 1): 'Labour Day',
+    (8, 31): 'National Day',
+    (9, 16): 'Malaysia Day',
+    (12, 25): 'Christmas Day',
+}
+
+
+def _malaysian_holidays() -> Dict[int, str]:
+    """{date_id: name} of the national public holidays, CALENDAR_START to CALENDAR_END"""
+    holidays = {}
+
+    def add(d: datetime, name: str):
+        date_id = int(d.strftime('%Y%m%d'))
+        holidays[date_id] = f'{holidays[date_id]} / {name}' if date_id in holidays else name
+
+    first_year, last_year = int(CALENDAR_START[:4]), int(CALENDAR_END[:4])
+    for year in range(first_year, last_year + 1):
+        for (month, day), name in _FIXED_HOLIDAYS.items():
+            add(datetime(year, month, day), name)
+        # Agong's birthday: first Monday of June since 2020
+        if year == 2019:
+            add(datetime(2019, 9, 9), "Agong's Birthday")
+        else:
+            june_first = datetime(year, 6, 1)
+            add(june_first + timedelta(days=(7 - june_first.weekday()) % 7), "Agong's Birthday")
+        for name, dates in _MOVING_HOLIDAYS.items():
+            d = datetime(year, *dates[year])
+            add(d, name)
+            if name in _SECOND_DAY:
+                add(d + timedelta(days=1), f'{name} (day 2)')
+    return holidays
+
+
+MY_PUBLIC_HOLIDAYS = _malaysian_holidays()
+
+
+def _date_ids(days: np.ndarray) -> np.ndarray:
+    """datetime64[D] array -> YYYYMMDD int array"""
+    months = days.astype('datetime64[M]')
+    years = months.astype('datetime64[Y]').astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12 + 1
+    day = (days - months).astype(np.int64) + 1
+    return (years * 10000 + month * 100 + day).astype(np.int64)
+
+
+def _month_offset(days: np.ndarray, months_back: int) -> np.ndarray:
+    """Same day `months_back` months earlier, clamped to that month's last day"""
+    month_start = days.astype('datetime64[M]')
+    target = month_start - months_back
+    days_in_target = ((target + 1).astype('datetime64[D]') - target.astype('datetime64[D]')).astype(np.int64)
+    day = np.minimum((days - month_start.astype('datetime64[D]')).astype(np.int64), days_in_target - 1)
+    return target.astype('datetime64[D]') + day
+
+
+class Calendar:
+    """Array-backed calendar dimension; row i is CALENDAR_START + i days"""
+
+    def __init__(self, start: str = CALENDAR_START, end: str = CALENDAR_END):
+        days = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+        month_start = days.astype('datetime64[M]')
+        next_month = (month_start + 1).astype('datetime64[D]')
+
+        self.date_id = _date_ids(days)
+        self.year = self.date_id // 10000
+        self.month = self.date_id // 100 % 100
+        self.day = self.date_id % 100
+        self.day_of_week = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+        thursday = days + (3 - self.day_of_week)
+        iso_year_start = thursday.astype('datetime64[Y]')
+        self.iso_year = iso_year_start.astype(np.int64) + 1970
+        self.iso_week = (thursday - iso_year_start.astype('datetime64[D]')).astype(np.int64) // 7 + 1
+        self.month_start = _date_ids(month_start.astype('datetime64[D]'))
+        self.month_end = _date_ids(next_month - 1)
+        self.days_in_month = (next_month - month_start.astype('datetime64[D]')).astype(np.int64)
+        self.week_start = _date_ids(days - self.day_of_week)
+        self.same_day_last_month = _date_ids(_month_offset(days, 1))
+        self.same_day_last_year = _date_ids(_month_offset(days, 12))
+        self.is_holiday = np.isin(self.date_id, np.fromiter(MY_PUBLIC_HOLIDAYS, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.date_id)
+
+    def rows(self, date_ids) -> np.ndarray:
+        """Row index of every date_id (int or YYYYMMDD string); ValueError outside the calendar"""
+        ids = np.asarray(date_ids).astype(np.int64)
+        rows = np.searchsorted(self.date_id, ids)
+        found = self.date_id[np.minimum(rows, len(self.date_id) - 1)] == ids
+        if not found.all():
+            bad = np.atleast_1d(ids)[~np.atleast_1d(found)][0]
+            raise ValueError(f'{bad} is not a date_id between {self.date_id[0]} and {self.date_id[-1]}')
+        return rows
+
+    @staticmethod
+    def _take(column: np.ndarray, rows: np.ndarray):
+        values = column[rows]
+        return values.item() if values.ndim == 0 else values
+
+    def lookup(self, column: str, date_ids):
+        """Any calendar column for date_id(s), e.g. lookup('same_day_last_year', 20250301)"""
+        return self._take(getattr(self, column), self.rows(date_ids))
+
+    def weekday(self, date_ids):
+        """0 = Monday ... 6 = Sunday"""
+        return self._take(self.day_of_week, self.rows(date_ids))
+
+    def holiday(self, date_ids):
+        return self._take(self.is_holiday, self.rows(date_ids))
+
+    def shift(self, date_ids, days: int):
+        """date_id(s) moved by `days` calendar days"""
+        rows = self.rows(date_ids) + days
+        if np.any(rows < 0) or np.any(rows >= len(self.date_id)):
+            raise ValueError(f'shifting by {days} day(s) leaves the calendar')
+        return self._take(self.date_id, rows)
+
+    def today_id(self, today: datetime = None) -> int:
+        return int((today or datetime.now()).strftime('%Y%m%d'))
+
+    def report_windows(self, today: datetime = None) -> Dict[str, str]:
+        """
+        The weekly report windows (generate_weekly_queries_with_new_pax.get_week_dates): the last 7 days
+        (current_date -8 to -1), the same days last month / last year, and the month ranges for MTM
+        """
+        row = int(self.rows(self.today_id(today)))
+        start, end = row - 8, row - 1
+        month_start = self.month_start[end]
+        last_month = self.rows(self.same_day_last_month[self.rows(month_start)])
+        last_year = self.rows(self.same_day_last_year[self.rows(month_start)])
+        windows = {
+            'this_week_start': self.date_id[start],
+            'this_week_end': self.date_id[end],
+            'same_week_last_month_start': self.same_day_last_month[start],
+            'same_week_last_month_end': self.same_day_last_month[end],
+            'same_week_last_year_start': self.same_day_last_year[start],
+            'same_week_last_year_end': self.same_day_last_year[end],
+            'current_month_start': month_start,
+            'current_month_end': self.month_end[end],
+            'last_month_start': self.month_start[last_month],
+            'last_month_end': self.month_end[last_month],
+            'same_month_last_year_start': self.month_start[last_year],
+            'same_month_last_year_end': self.month_end[last_year],
+        }
+        return {key: str(value) for key, value in windows.items()}
+
+    def monday_weeks(self, today: datetime = None) -> Tuple[str, str, str, str]:
+        """(this_week_start, this_week_end, last_week_start, last_week_end): Monday-Sunday weeks"""
+        start = int(self.rows(self.week_start[self.rows(self.today_id(today))]))
+        return tuple(str(self.date_id[r]) for r in (start, start + 6, start - 7, start - 1))
+
+    def last_completed_week(self, today: datetime = None) -> Dict[str, str]:
+        """The last Monday-Sunday week ending before today, and the same dates a year earlier"""
+        yesterday = int(self.rows(self.today_id(today))) - 1
+        end = yesterday - (self.day_of_week[yesterday] + 1) % 7
+        start = end - 6
+        return {
+            'this_week_start': str(self.date_id[start]),
+            'this_week_end': str(self.date_id[end]),
+            'same_week_last_year_start': str(self.same_day_last_year[start]),
+            'same_week_last_year_end': str(self.same_day_last_year[end]),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_calendar() -> Calendar:
+    """The shared calendar, built on first use (~4,400 rows, a few milliseconds)"""
+    return Calendar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print calendar dimension rows')
+    parser.add_argument('start', type=int, help='First date_id')
+    parser.add_argument('end', type=int, help='Last date_id')
+    args = parser.parse_args()
+
+    calendar = get_calendar()
+    rows = calendar.rows([args.start, args.end])
+    print(f"{'date_id':>8}  {'day':<9} {'iso':>7}  {'last_month':>10}  {'last_year':>9}  holiday")
+    for r in range(rows[0], rows[1] + 1):
+        date_id = int(calendar.date_id[r])
+        print(f"{date_id:>8}  {WEEKDAY_NAMES[calendar.day_of_week[r]]:<9} "
+              f"{calendar.iso_year[r]}-W{calendar.iso_week[r]:02d}  {calendar.same_day_last_month[r]:>10}  "
+              f"{calendar.same_day_last_year[r]:>9}  {MY_PUBLIC_HOLIDAYS.get(date_id, '')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,9 +12,10 @@ Usage:
 import os
 import sys
 import json
-import requests
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, Optional, List
+from calendar_dim import get_calendar
+from slack_delivery import deliver
 
 # Configuration
 SLACK_WEBHOOK_URL = os.getenv('SLACK_WEBHOOK_URL', '')
@@ -31,27 +32,8 @@ def get_week_dates():
     Returns:
         Tuple of (this_week_start, this_week_end, last_week_start, last_week_end) as YYYYMMDD strings
     """
-    today = datetime.now()
-    
-    # Calculate this week (Monday to Sunday)
-    days_since_monday = today.weekday()
-    this_week_start = today - timedelta(days=days_since_monday)
-    this_week_end = this_week_start + timedelta(days=6)
-    
-    # Calculate last week
-    last_week_start = this_week_start - timedelta(days=7)
-    last_week_end = this_week_end - timedelta(days=7)
-    
-    # Format as YYYYMMDD
-    def format_date(d):
-        return d.strftime('%Y%m%d')
-    
-    return (
-        format_date(this_week_start),
-        format_date(this_week_end),
-        format_date(last_week_start),
-        format_date(last_week_end)
-    )
+    # Monday-Sunday weeks from the precomputed calendar dimension (calendar_dim.py)
+    return get_calendar().monday_weeks(datetime.now())
 
 def generate_oc_report(this_week_start: str, this_week_end: str, 
                       last_week_start: str, last_week_end: str) -> Optional[Dict]:
@@ -465,25 +447,14 @@ def send_to_slack(message: Dict) -> bool:
         print("ERROR: SLACK_WEBHOOK_URL not set. Please set it as an environment variable or in the script.")
         return False
     
-    try:
-        response = requests.post(
-            SLACK_WEBHOOK_URL,
-            json=message,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            print("✅ Successfully sent message to Slack")
-            return True
-        else:
-            print(f"❌ Failed to send to Slack. Status code: {response.status_code}")
-            print(f"Response: {response.text}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Error sending to Slack: {str(e)}")
-        return False
+    # Split at 50 blocks, retried on rate limits / 5xx (slack_delivery.py)
+    # Deduped per report week, so a rerun after a partial send doesn't post it twice
+    report_id = f"weekly-{get_week_dates()[1]}-oc"
+    if deliver(message, [SLACK_WEBHOOK_URL], report_id=report_id)[SLACK_WEBHOOK_URL]:
+        print("✅ Successfully sent message to Slack")
+        return True
+    print("❌ Failed to send to Slack")
+    return False
 
 def main():
     """
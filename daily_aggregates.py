@@ -0,0 +1,379 @@
+"""
+Incremental Daily Aggregate Store for the Weekly Report
+Keeps per-city, per-day totals of the additive weekly metrics (orders, completed
+orders, GMV, basket, promo, sessions and COPS inputs) in SQLite. A weekly run
+only fetches the days it has not stored yet - normally the last 7 - instead of
+rescanning same week last month / last year from ocd_adw.f_food_metrics.
+
+Every window metric the report compares is rebuilt from these daily sums:
+    completion_rate    = completed_orders / orders
+    basket             = basket_sum / basket_count   (AVG over completed rows)
+    promo_penetration  = promo_orders / orders
+    orders_per_session = orders / sessions
+    cops               = cops_completed_orders / sessions
+Orders are counted distinct per city and day; an order belongs to exactly one
+city and day, so the daily counts add up to the window count.
+
+Late data: a day fetched less than DAILY_AGG_LATE_DAYS after it ended is
+fetched again on the next run, so late-landing orders are picked up.
+
+Not additive (kept out of the store): unique eaters, MTM, median earning per
+MEX and New Pax - see generate_distinct_metrics_query and passenger_state.py.
+
+The monthly run-rate baselines in the report insights (last month, same month
+last year, average month) are summed from the same days - see gmv_baselines.
+
+Usage:
+    python daily_aggregates.py --refresh 20251101 20251130     # fetch missing / unsettled days
+    python daily_aggregates.py --show 20251110 20251116 --city 13
+"""
+
+import os
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from generate_weekly_queries_with_new_pax import WEEK_WINDOWS
+
+DEFAULT_DB_PATH = os.getenv('DAILY_AGG_DB', 'daily_aggregates.db')
+LATE_DATA_DAYS = int(os.getenv('DAILY_AGG_LATE_DAYS', '3'))
+# Complete calendar months averaged for the run-rate GMV baseline (gmv_baselines)
+BASELINE_MONTHS = int(os.getenv('DAILY_AGG_BASELINE_MONTHS', '12'))
+
+# Additive daily columns, in query / table order
+AGGREGATE_COLUMNS = [
+    'orders', 'completed_orders', 'gmv', 'basket_sum', 'basket_count',
+    'promo_expense', 'promo_orders', 'sessions', 'cops_completed_orders',
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_city_metrics (
+    city_id INTEGER NOT NULL,
+    date_id INTEGER NOT NULL,
+    orders INTEGER NOT NULL DEFAULT 0,
+    completed_orders INTEGER NOT NULL DEFAULT 0,
+    gmv REAL NOT NULL DEFAULT 0,
+    basket_sum REAL NOT NULL DEFAULT 0,
+    basket_count INTEGER NOT NULL DEFAULT 0,
+    promo_expense REAL NOT NULL DEFAULT 0,
+    promo_orders INTEGER NOT NULL DEFAULT 0,
+    sessions REAL NOT NULL DEFAULT 0,
+    cops_completed_orders REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (date_id, city_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fetched_days (
+    date_id INTEGER PRIMARY KEY,
+    fetched_on INTEGER NOT NULL
+);
+"""
+
+
+def _to_date(date_id) -> datetime:
+    return datetime.strptime(str(date_id), '%Y%m%d')
+
+
+def _date_id(d: datetime) -> int:
+    return int(d.strftime('%Y%m%d'))
+
+
+def days_between(start_date, end_date) -> List[int]:
+    """Every date_id from start_date to end_date inclusive"""
+    start, end = _to_date(start_date), _to_date(end_date)
+    return [_date_id(start + timedelta(days=i)) for i in range((end - start).days + 1)]
+
+
+def contiguous_ranges(date_ids: Iterable[int]) -> List[Tuple[int, int]]:
+    """Group date_ids into (start, end) runs of consecutive calendar days"""
+    ranges = []
+    for date_id in sorted(set(date_ids)):
+        if ranges and _to_date(date_id) - _to_date(ranges[-1][1]) == timedelta(days=1):
+            ranges[-1][1] = date_id
+        else:
+            ranges.append([date_id, date_id])
+    return [tuple(r) for r in ranges]
+
+
+def unsettled_days(conn: sqlite3.Connection, start_date, end_date, late_days: int = LATE_DATA_DAYS) -> List[int]:
+    """Days in [start_date, end_date] missing from a fetched_days table, or fetched less than late_days after they ended"""
+    fetched = dict(conn.execute(
+        'SELECT date_id, fetched_on FROM fetched_days WHERE date_id >= ? AND date_id <= ?',
+        (int(start_date), int(end_date))).fetchall())
+    return [d for d in days_between(start_date, end_date)
+            if fetched.get(d) is None or _to_date(fetched[d]) < _to_date(d) + timedelta(days=late_days)]
+
+
+def mark_fetched(conn: sqlite3.Connection, start_date, end_date, fetched_on: Optional[int] = None):
+    """Record every day in [start_date, end_date] as fetched today (or on fetched_on)"""
+    fetched_on = fetched_on or _date_id(datetime.now())
+    conn.executemany('INSERT OR REPLACE INTO fetched_days (date_id, fetched_on) VALUES (?, ?)',
+                     [(d, fetched_on) for d in days_between(start_date, end_date)])
+
+
+def generate_daily_aggregate_query(start_date, end_date) -> str:
+    """Per-city, per-day additive totals from f_food_metrics and agg_food_cops_metrics"""
+    return f"""
+-- Daily city aggregates {start_date} to {end_date}
+WITH order_days AS (
+    SELECT
+        f.city_id,
+        f.date_id,
+        COUNT(DISTINCT f.order_id) as orders,
+        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as completed_orders,
+        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv,
+        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.basket_size END) as basket_sum,
+        COUNT(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.basket_size END) as basket_count,
+        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.promo_expense ELSE 0 END) as promo_expense,
+        COUNT(DISTINCT CASE WHEN f.is_promotion = TRUE THEN f.order_id END) as promo_orders
+    FROM ocd_adw.f_food_metrics f
+    WHERE f.country_id = 1
+      AND f.city_id != 1
+      AND f.business_type = 0
+      AND f.date_id >= {start_date} AND f.date_id <= {end_date}
+    GROUP BY f.city_id, f.date_id
+),
+cops_days AS (
+    SELECT
+        city_id,
+        date_id,
+        CAST(SUM(preorder_sessions) AS DOUBLE) as sessions,
+        CAST(SUM(completed_orders) AS DOUBLE) as cops_completed_orders
+    FROM ocd_adw.agg_food_cops_metrics
+    WHERE country_id = 1
+      AND city_id != 1
+      AND business = 'food'
+      AND date_id >= {start_date} AND date_id <= {end_date}
+    GROUP BY city_id, date_id
+)
+SELECT
+    COALESCE(o.city_id, c.city_id) as city_id,
+    COALESCE(o.date_id, c.date_id) as date_id,
+    COALESCE(o.orders, 0) as orders,
+    COALESCE(o.completed_orders, 0) as completed_orders,
+    COALESCE(o.gmv, 0) as gmv,
+    COALESCE(o.basket_sum, 0) as basket_sum,
+    COALESCE(o.basket_count, 0) as basket_count,
+    COALESCE(o.promo_expense, 0) as promo_expense,
+    COALESCE(o.promo_orders, 0) as promo_orders,
+    COALESCE(c.sessions, 0) as sessions,
+    COALESCE(c.cops_completed_orders, 0) as cops_completed_orders
+FROM order_days o
+FULL OUTER JOIN cops_days c ON o.city_id = c.city_id AND o.date_id = c.date_id
+ORDER BY 2, 1
+"""
+
+
+def _round(value, digits):
+    return None if value is None else round(value, digits)
+
+
+def window_columns(totals: Dict[str, float], prefix: str) -> Dict[str, Optional[float]]:
+    """Weekly query columns for one window ({prefix}_orders, {prefix}_cops, ...) from summed daily totals"""
+    orders = totals['orders']
+    sessions = totals['sessions']
+    return {
+        f'{prefix}_orders': int(orders),
+        f'{prefix}_completed_orders': int(totals['completed_orders']),
+        f'{prefix}_completion_rate': _round(100.0 * totals['completed_orders'] / orders, 2) if orders else None,
+        f'{prefix}_gmv': totals['gmv'],
+        f'{prefix}_basket': totals['basket_sum'] / totals['basket_count'] if totals['basket_count'] else None,
+        f'{prefix}_promo_expense': totals['promo_expense'],
+        f'{prefix}_promo_orders': int(totals['promo_orders']),
+        f'{prefix}_promo_penetration': _round(100.0 * totals['promo_orders'] / orders, 1) if orders else None,
+        f'{prefix}_sessions': sessions,
+        f'{prefix}_completed_sessions': sessions,
+        f'{prefix}_orders_per_session': _round(1.0 * orders / sessions, 2) if sessions else None,
+        f'{prefix}_cops': round(totals['cops_completed_orders'] / sessions, 2) if sessions else 0,
+    }
+
+
+class DailyAggregateStore:
+    """SQLite-backed per-city daily totals, one row per (date_id, city_id)"""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stale_days(self, start_date, end_date, late_days: int = LATE_DATA_DAYS) -> List[int]:
+        """Days in [start_date, end_date] never fetched, or fetched before they had late_days to settle"""
+        return unsettled_days(self.conn, start_date, end_date, late_days)
+
+    def store_days(self, start_date, end_date, rows: Sequence[Dict], fetched_on: Optional[int] = None):
+        """Replace every day in [start_date, end_date] with the fetched rows and mark the days fetched"""
+        placeholders = ', '.join(['?'] * len(AGGREGATE_COLUMNS))
+        with self.conn:
+            self.conn.execute('DELETE FROM daily_city_metrics WHERE date_id >= ? AND date_id <= ?',
+                              (int(start_date), int(end_date)))
+            self.conn.executemany(
+                f"INSERT INTO daily_city_metrics (city_id, date_id, {', '.join(AGGREGATE_COLUMNS)}) "
+                f"VALUES (?, ?, {placeholders})",
+                [(int(r['city_id']), int(r['date_id']), *[r.get(c) or 0 for c in AGGREGATE_COLUMNS])
+                 for r in rows if r.get('city_id') is not None]
+            )
+            mark_fetched(self.conn, start_date, end_date, fetched_on)
+
+    def refresh(self, ranges: Iterable[Tuple], run: Callable[[str], List[Dict]],
+                late_days: int = LATE_DATA_DAYS) -> int:
+        """
+        Fetch the stale days of the given (start, end) ranges, one query per run of consecutive days.
+        Returns the number of days fetched.
+        """
+        stale = set()
+        for start, end in ranges:
+            stale.update(self.stale_days(start, end, late_days))
+        for start, end in contiguous_ranges(stale):
+            self.store_days(start, end, run(generate_daily_aggregate_query(start, end)) or [])
+        return len(stale)
+
+    def totals_by_city(self, start_date, end_date) -> Dict[int, Dict[str, float]]:
+        """Summed daily columns per city for [start_date, end_date]"""
+        sums = ', '.join(f'SUM({c})' for c in AGGREGATE_COLUMNS)
+        rows = self.conn.execute(
+            f'SELECT city_id, {sums} FROM daily_city_metrics WHERE date_id >= ? AND date_id <= ? GROUP BY city_id',
+            (int(start_date), int(end_date))).fetchall()
+        return {row[0]: dict(zip(AGGREGATE_COLUMNS, row[1:])) for row in rows}
+
+    def totals(self, start_date, end_date, city_id: Optional[int] = None) -> Dict[str, float]:
+        """Summed daily columns for one city, or across all OC cities when city_id is None"""
+        by_city = self.totals_by_city(start_date, end_date)
+        if city_id is not None:
+            return by_city.get(int(city_id), dict.fromkeys(AGGREGATE_COLUMNS, 0))
+        return {c: sum(t[c] for t in by_city.values()) for c in AGGREGATE_COLUMNS}
+
+    def monthly_gmv(self, start_date, end_date) -> Dict[int, Dict[int, float]]:
+        """{city_id: {month_id: GMV}} for [start_date, end_date]"""
+        rows = self.conn.execute(
+            'SELECT city_id, date_id / 100, SUM(gmv) FROM daily_city_metrics '
+            'WHERE date_id >= ? AND date_id <= ? GROUP BY city_id, date_id / 100',
+            (int(start_date), int(end_date))).fetchall()
+        months = {}
+        for city_id, month_id, gmv in rows:
+            months.setdefault(city_id, {})[month_id] = gmv
+        return months
+
+    def complete_months(self, months: Sequence[Tuple[int, int]]) -> List[int]:
+        """month_ids of the (first day, last day) months whose every day has been fetched"""
+        complete = []
+        for start, end in months:
+            fetched = self.conn.execute('SELECT COUNT(*) FROM fetched_days WHERE date_id >= ? AND date_id <= ?',
+                                        (start, end)).fetchone()[0]
+            if fetched == len(days_between(start, end)):
+                complete.append(start // 100)
+        return complete
+
+    def weekly_columns(self, dates: Dict, city_id: Optional[int] = None) -> Dict:
+        """Additive weekly query columns for every window of a get_week_dates() dict"""
+        columns = {}
+        for _, key, prefix in WEEK_WINDOWS:
+            columns.update(window_columns(self.totals(dates[f'{key}_start'], dates[f'{key}_end'], city_id), prefix))
+        return columns
+
+
+def week_ranges(dates: Dict) -> List[Tuple[str, str]]:
+    """(start, end) of every week window the report compares"""
+    return [(dates[f'{key}_start'], dates[f'{key}_end']) for _, key, _ in WEEK_WINDOWS]
+
+
+def build_weekly_rows(dates: Dict, store: DailyAggregateStore, oc_distinct: Dict,
+                      city_distinct: List[Dict], top_n: Optional[int] = 5) -> Tuple[List[Dict], List[Dict]]:
+    """
+    OC and top cities rows in the weekly query layout: additive columns from the store,
+    eaters / MTM / earning per MEX from the generate_distinct_metrics_query rows.
+    Top cities are the top_n by this week's GMV, or every city with top_n=None (cities
+    missing from d_city are skipped, like the top cities query's d_city join).
+    """
+    oc_rows = [{**store.weekly_columns(dates), **oc_distinct}]
+    this_week = store.totals_by_city(dates['this_week_start'], dates['this_week_end'])
+    ranked = sorted(city_distinct, key=lambda r: this_week.get(int(r['city_id']), {}).get('gmv', 0), reverse=True)
+    city_rows = [
+        {'city_id': r['city_id'], 'city_name': r['city_name'],
+         **store.weekly_columns(dates, int(r['city_id'])),
+         **{k: v for k, v in r.items() if k not in ('city_id', 'city_name')}}
+        for r in ranked[:top_n]
+    ]
+    return oc_rows, city_rows
+
+
+def baseline_months(today: Optional[datetime] = None, months: int = BASELINE_MONTHS) -> List[Tuple[int, int]]:
+    """(first day, last day) of the last `months` complete calendar months, oldest first"""
+    month_start = (today or datetime.now()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    ranges = []
+    for _ in range(months):
+        month_end = month_start - timedelta(days=1)
+        month_start = month_end.replace(day=1)
+        ranges.append((_date_id(month_start), _date_id(month_end)))
+    return ranges[::-1]
+
+
+def gmv_baselines(store: DailyAggregateStore, today: Optional[datetime] = None,
+                  months: int = BASELINE_MONTHS) -> Dict[Optional[int], Dict[str, Optional[float]]]:
+    """
+    Monthly run-rate baselines for the report insights, per city_id and for all OC
+    cities (key None): last_month (previous calendar month), last_year (this calendar
+    month a year ago) and avg_monthly (mean GMV of the last `months` complete months).
+    Months the store has not fully fetched are left out rather than under-counted.
+    Refresh the store with baseline_months() first to fill them in.
+    """
+    today = today or datetime.now()
+    ranges = baseline_months(today, months)
+    complete = set(store.complete_months(ranges))
+    by_city = store.monthly_gmv(ranges[0][0], ranges[-1][1])
+    oc = {}
+    for city_months in by_city.values():
+        for month_id, gmv in city_months.items():
+            oc[month_id] = oc.get(month_id, 0) + gmv
+
+    last_month = ranges[-1][0] // 100
+    last_year = (today.year - 1) * 100 + today.month
+
+    def baseline(city_months: Dict[int, float]) -> Dict[str, Optional[float]]:
+        values = [city_months.get(m, 0) for m in sorted(complete)]
+        return {
+            'last_month': city_months.get(last_month) if last_month in complete else None,
+            'last_year': city_months.get(last_year) if last_year in complete else None,
+            'avg_monthly': sum(values) / len(values) if values else None,
+        }
+
+    baselines = {city_id: baseline(city_months) for city_id, city_months in by_city.items()}
+    baselines[None] = baseline(oc)
+    return baselines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the local per-city daily aggregate store')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='SQLite file (default: %(default)s)')
+    parser.add_argument('--refresh', nargs=2, metavar=('START', 'END'),
+                        help='Fetch missing or unsettled days in START..END via the configured QUERY_BACKEND')
+    parser.add_argument('--late-days', type=int, default=LATE_DATA_DAYS,
+                        help='Refetch days fetched less than this many days after they ended (default: %(default)s)')
+    parser.add_argument('--show', nargs=2, metavar=('START', 'END'), help='Print window metrics for START..END')
+    parser.add_argument('--city', type=int, help='City for --show (default: all OC cities)')
+    args = parser.parse_args()
+
+    with DailyAggregateStore(args.db) as store:
+        if args.refresh:
+            from query_executor import run_query
+            fetched = store.refresh([tuple(args.refresh)], run_query, args.late_days)
+            print(f'✅ {fetched} day(s) fetched into {args.db}')
+        if args.show:
+            start, end = args.show
+            scope = f'city {args.city}' if args.city is not None else 'OC cities'
+            print(f'{start}-{end} ({scope}):')
+            for name, value in window_columns(store.totals(start, end, args.city), 'window').items():
+                print(f'   {name[len("window_"):]}: {value}')
+        if not args.refresh and not args.show:
+            parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,23 @@
 """
 Execute MGS Impact Queries in Batches
 Read merchant IDs and execute queries via Presto
+Each MGS portfolio runs as merchant chunks (portfolio_query) in parallel through
+job_runner (bounded concurrency, retries, resumable result store) on the
+configured QUERY_BACKEND, so every merchant is covered however large the list
 """
 
 import json
-from mcp import mcp_hubble_run_presto_query
+import argparse
+
+from job_runner import DEFAULT_WORKERS
+from portfolio_query import PORTFOLIO_CHUNK_SIZE, clean_merchant_ids, generate_mgs_impact_query, run_mgs_impact
+
+parser = argparse.ArgumentParser(description='Execute MGS impact queries in parallel')
+parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Queries in flight at once')
+parser.add_argument('--chunk-size', type=int, default=PORTFOLIO_CHUNK_SIZE, help='Merchants per chunk query')
+parser.add_argument('--results', default='mgs_impact_results.jsonl', help='Result store (resumable)')
+parser.add_argument('--dry-run', action='store_true', help='Only write the query files')
+args = parser.parse_args()
 
 # Load MGS assignments
 with open('mgs_merchant_assignments.json', 'r', encoding='utf-8') as f:
@@ -19,9 +32,10 @@ print("="*80)
 print()
 
 all_results = {}
+portfolios = {}
 
 for mgs_name, merchant_ids in mgs_list:
-    merchant_ids_clean = [mid.strip() for mid in merchant_ids if mid.strip()]
+    merchant_ids_clean = clean_merchant_ids(merchant_ids)
     
     if not merchant_ids_clean:
         continue
@@ -30,59 +44,8 @@ for mgs_name, merchant_ids in mgs_list:
     print(f"Querying {mgs_name} ({len(merchant_ids_clean)} merchants)...")
     print(f"{'='*80}")
     
-    # Create VALUES clause
-    values_clause = ', '.join([f"('{mid}')" for mid in merchant_ids_clean])
     mgs_var_name = mgs_name.replace(' ', '_').replace('.', '').lower()
-    
-    query = f"""
-WITH {mgs_var_name}_merchants AS (
-    SELECT merchant_id_nk
-    FROM (VALUES {values_clause}) AS t(merchant_id_nk)
-),
-monthly_gmv AS (
-    SELECT 
-        CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER) as month_id,
-        COUNT(DISTINCT f.merchant_id) as unique_merchants,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.passenger_id END) as unique_eaters,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv
-    FROM ocd_adw.f_food_metrics f
-    WHERE f.city_id = 13
-        AND f.country_id = 1
-        AND f.date_id >= 20250501
-        AND f.date_id < 20251101
-        AND f.business_type = 0
-        AND f.merchant_id IN (SELECT merchant_id_nk FROM {mgs_var_name}_merchants)
-    GROUP BY CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER)
-),
-total_penang_gmv AS (
-    SELECT 
-        CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER) as month_id,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as total_penang_gmv
-    FROM ocd_adw.f_food_metrics f
-    WHERE f.city_id = 13
-        AND f.country_id = 1
-        AND f.date_id >= 20250501
-        AND f.date_id < 20251101
-        AND f.business_type = 0
-    GROUP BY CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER)
-)
-SELECT 
-    mg.month_id,
-    '{mgs_name}' as mgs_name,
-    mg.unique_merchants,
-    mg.orders,
-    mg.unique_eaters,
-    mg.gmv,
-    tp.total_penang_gmv,
-    ROUND(mg.gmv * 100.0 / NULLIF(tp.total_penang_gmv, 0), 2) as gmv_pct_of_penang,
-    ROUND(mg.gmv / NULLIF(mg.unique_merchants, 0), 2) as avg_gmv_per_merchant,
-    ROUND(mg.gmv / NULLIF(mg.orders, 0), 2) as avg_gmv_per_order,
-    ROUND(mg.gmv / NULLIF(mg.unique_eaters, 0), 2) as avg_gmv_per_eater
-FROM monthly_gmv mg
-INNER JOIN total_penang_gmv tp ON mg.month_id = tp.month_id
-ORDER BY mg.month_id;
-"""
+    query = generate_mgs_impact_query(mgs_name, merchant_ids_clean)
     
     # Save query for reference
     query_file = f"query_{mgs_var_name}_impact_exec.sql"
@@ -90,21 +53,33 @@ ORDER BY mg.month_id;
         f.write(query)
     
     print(f"Query saved to: {query_file}")
-    print(f"Ready to execute...")
-    
-    # Note: Actual execution would be done via MCP tool
-    # For now, we'll save the queries and note that they need to be executed
+    portfolios[mgs_name] = merchant_ids_clean
     all_results[mgs_name] = {
         'merchant_count': len(merchant_ids_clean),
         'query_file': query_file
     }
 
+results = {}
+if not args.dry_run:
+    print("\n" + "="*80)
+    print(f"EXECUTING {len(portfolios)} MGS PORTFOLIOS ({args.chunk_size} merchants per chunk, {args.workers} in parallel)")
+    print("="*80)
+    results = run_mgs_impact(portfolios, chunk_size=args.chunk_size, workers=args.workers, store_path=args.results)
+
 print("\n" + "="*80)
 print("SUMMARY")
 print("="*80)
 for mgs_name, info in all_results.items():
-    print(f"{mgs_name}: {info['merchant_count']} merchants - Query: {info['query_file']}")
+    rows = results.get(mgs_name)
+    if rows:
+        gmv = sum(float(r.get('gmv') or 0) for r in rows)
+        print(f"{mgs_name}: {info['merchant_count']} merchants - GMV RM {gmv:,.2f} over {len(rows)} months")
+    else:
+        print(f"{mgs_name}: {info['merchant_count']} merchants - Query: {info['query_file']}")
 
-print("\n[INFO] All queries generated. Execute them via Presto/Hubble MCP tool.")
+if args.dry_run:
+    print("\n[INFO] All queries generated. Rerun without --dry-run to execute them.")
+else:
+    print(f"\n[OK] Results saved to: {args.results}")
 
 
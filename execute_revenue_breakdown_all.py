@@ -1,16 +1,29 @@
 """
 Execute Revenue Breakdown for All Individuals
 Uses am_name filtering for AMs (more efficient than merchant ID lists)
+--single-query runs the whole team as one query (one scan per fact table) instead of one query per person
 """
 
 import json
 import sys
 import io
+import argparse
+
+from job_runner import Job, run_jobs, DEFAULT_WORKERS
+from portfolio_query import clean_merchant_ids, merchant_values_clause, run_portfolio_queries
 
 # Fix Windows encoding
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
 
+parser = argparse.ArgumentParser(description='Generate (and optionally execute) revenue breakdown queries per AM/MGS')
+parser.add_argument('--execute', action='store_true', help='Run all queries in parallel via the configured QUERY_BACKEND')
+parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Queries in flight at once')
+parser.add_argument('--results', default='revenue_breakdown_results.jsonl', help='Result store (resumable)')
+parser.add_argument('--single-query', action='store_true',
+                    help='Run one query for the whole team (one scan per fact table) instead of one per person')
+args = parser.parse_args()
+
 # Load MGS assignments
 print("Loading MGS assignments...")
 with open('mgs_merchant_assignments.json', 'r', encoding='utf-8') as f:
@@ -164,15 +177,22 @@ ORDER BY month_id;
     return query
 
 # Generate MGS revenue query (using merchant IDs)
-def generate_mgs_revenue_query(mgs_name, merchant_ids):
-    """Generate revenue breakdown query for MGS using merchant IDs"""
+def generate_mgs_revenue_query(mgs_name, merchant_ids, chunked=False):
+    """
+    Generate revenue breakdown query for MGS using merchant IDs
+    chunked=True is the per-chunk form used by run_mgs_revenue: it also returns the
+    distinct campaign ids per month so unique_campaigns can be merged across chunks
+    """
     
     if not merchant_ids:
         return None
     
-    # Format merchant IDs (limit to avoid query size issues)
-    merchant_id_values = ",\n        ".join([f"('{mid}')" for mid in merchant_ids[:1000]])
+    # Full merchant list - large portfolios are executed in chunks (see run_mgs_revenue)
+    merchant_id_values = merchant_values_clause(merchant_ids, ",\n        ")
     person_var = mgs_name.lower().replace(' ', '_').replace('.', '_')
+    campaign_ids_agg = ",\n        ARRAY_AGG(DISTINCT mfc_campaign_id) FILTER (WHERE mfc_campaign_id IS NOT NULL) as campaign_ids" if chunked else ""
+    campaign_ids_combined = ",\n        m.campaign_ids" if chunked else ""
+    campaign_ids_select = ",\n    campaign_ids" if chunked else ""
     
     query = f"""
 -- ============================================================================
@@ -238,7 +258,7 @@ mex_campaign_spend AS (
         SUM(COALESCE(total_grab_promo_spend, 0)) as grab_campaign_spend,
         COUNT(DISTINCT merchant_id) as merchants_with_campaigns,
         COUNT(DISTINCT order_id) as campaign_orders,
-        COUNT(DISTINCT mfc_campaign_id) as unique_campaigns
+        COUNT(DISTINCT mfc_campaign_id) as unique_campaigns{campaign_ids_agg}
     FROM ocd_adw.f_food_discount
     WHERE city_id = 13
         AND date_id >= 20250501
@@ -264,7 +284,7 @@ combined_revenue AS (
         COALESCE(m.grab_campaign_spend, 0) as grab_campaign_spend,
         COALESCE(m.merchants_with_campaigns, 0) as merchants_with_campaigns,
         COALESCE(m.campaign_orders, 0) as campaign_orders,
-        COALESCE(m.unique_campaigns, 0) as unique_campaigns
+        COALESCE(m.unique_campaigns, 0) as unique_campaigns{campaign_ids_combined}
     FROM commission_revenue c
     FULL OUTER JOIN ads_revenue a ON c.month_id = a.month_id
     FULL OUTER JOIN mex_campaign_spend m ON COALESCE(c.month_id, a.month_id) = m.month_id
@@ -290,18 +310,210 @@ SELECT
     merchants_in_ads,
     merchants_with_campaigns,
     campaign_orders,
-    unique_campaigns
+    unique_campaigns{campaign_ids_select}
 FROM combined_revenue
 ORDER BY month_id;
 """
     return query
 
+# Generate one revenue breakdown query for the whole team (AMs and MGS)
+def generate_team_revenue_query(am_mappings, mgs_assignments):
+    """
+    Generate a single revenue breakdown query for every AM and MGS
+    Joins a merchant -> person mapping (AM via d_merchant.am_name, MGS via their merchant
+    lists) once and groups by person and month, so each fact table is scanned once for
+    the whole team. Returns the same columns as the per-person queries, one row per
+    person and month (a merchant shared by several people counts for each of them).
+    """
+    # escaped for the SQL string literals below, like the MGS values
+    am_emails = {email.replace("'", "''"): name.replace("'", "''") for name, email in am_mappings.items() if email}
+    mgs_values = ",\n        ".join(
+        "('{}', '{}')".format(mid.replace("'", "''"), mgs_name.replace("'", "''"))
+        for mgs_name, merchant_ids in mgs_assignments.items()
+        for mid in clean_merchant_ids(merchant_ids)
+    )
+    if not am_emails and not mgs_values:
+        return None
+
+    mappings = []
+    if am_emails:
+        am_cases = "\n            ".join(f"WHEN '{email}' THEN '{name}'" for email, name in am_emails.items())
+        am_list = ", ".join(f"'{email}'" for email in am_emails)
+        mappings.append(f"""    SELECT DISTINCT
+        merchant_id_nk,
+        CASE am_name
+            {am_cases}
+        END as person_name,
+        'AM' as role
+    FROM ocd_adw.d_merchant
+    WHERE city_id = 13
+        AND am_name IN ({am_list})""")
+    if mgs_values:
+        mappings.append(f"""    SELECT DISTINCT merchant_id_nk, person_name, 'MGS' as role
+    FROM (VALUES {mgs_values}
+    ) AS t(merchant_id_nk, person_name)""")
+    person_merchants = "\n    UNION ALL\n".join(mappings)
+
+    query = f"""
+-- ============================================================================
+-- REVENUE BREAKDOWN: WHOLE TEAM (AM & MGS) - SINGLE QUERY
+-- Last 6 Months (May 2025 - October 2025)
+-- {len(am_emails)} AMs (by am_name), {len(mgs_assignments)} MGS (by merchant list)
+-- ============================================================================
+
+WITH person_merchants AS (
+{person_merchants}
+),
+-- 1. COMMISSION REVENUE (Gross billing from deliveries/dine out)
+commission_revenue AS (
+    SELECT
+        pm.person_name,
+        pm.role,
+        CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER) as month_id,
+        SUM(CASE
+            WHEN f.booking_state_simple = 'COMPLETED'
+            THEN COALESCE(f.commission_from_merchant, 0)
+            ELSE 0
+        END) as commission_revenue,
+        SUM(CASE
+            WHEN f.booking_state_simple = 'COMPLETED'
+            THEN COALESCE(f.gross_merchandise_value, 0)
+            ELSE 0
+        END) as gmv,
+        COUNT(DISTINCT CASE
+            WHEN f.booking_state_simple = 'COMPLETED'
+            THEN f.order_id
+        END) as orders,
+        COUNT(DISTINCT CASE
+            WHEN f.booking_state_simple = 'COMPLETED'
+            THEN f.merchant_id
+        END) as active_merchants
+    FROM ocd_adw.f_food_metrics f
+    INNER JOIN person_merchants pm ON f.merchant_id = pm.merchant_id_nk
+    WHERE f.city_id = 13
+        AND f.business_type = 0
+        AND f.date_id >= 20250501
+        AND f.date_id < 20251101
+    GROUP BY pm.person_name, pm.role, CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER)
+),
+-- 2. ADS/SPOTLIGHT REVENUE (Grab's revenue from ads)
+ads_revenue AS (
+    SELECT
+        pm.person_name,
+        pm.role,
+        CAST(SUBSTRING(CAST(a.date_id AS VARCHAR), 1, 6) AS INTEGER) as month_id,
+        SUM(COALESCE(a.accrued_amount_before_tax_local, 0)) as ads_revenue,
+        SUM(COALESCE(a.billable_ad_spend_local, 0)) as total_ads_spend,
+        SUM(COALESCE(a.mex_prorated_billable_ad_spend_local, 0)) as mex_ads_spend,
+        COUNT(DISTINCT a.merchant_id) as merchants_in_ads
+    FROM ocd_adw.agg_ads_merchant a
+    INNER JOIN person_merchants pm ON a.merchant_id = pm.merchant_id_nk
+    WHERE a.date_id >= 20250501
+        AND a.date_id < 20251101
+    GROUP BY pm.person_name, pm.role, CAST(SUBSTRING(CAST(a.date_id AS VARCHAR), 1, 6) AS INTEGER)
+),
+-- 3. MEX FUNDED CAMPAIGN SPENDING (MEX-funded promotional campaigns)
+mex_campaign_spend AS (
+    SELECT
+        pm.person_name,
+        pm.role,
+        CAST(SUBSTRING(CAST(d.date_id AS VARCHAR), 1, 6) AS INTEGER) as month_id,
+        SUM(COALESCE(d.total_mex_promo_spend, 0)) as mex_campaign_spend,
+        SUM(COALESCE(d.total_grab_promo_spend, 0)) as grab_campaign_spend,
+        COUNT(DISTINCT d.merchant_id) as merchants_with_campaigns,
+        COUNT(DISTINCT d.order_id) as campaign_orders,
+        COUNT(DISTINCT d.mfc_campaign_id) as unique_campaigns
+    FROM ocd_adw.f_food_discount d
+    INNER JOIN person_merchants pm ON d.merchant_id = pm.merchant_id_nk
+    WHERE d.city_id = 13
+        AND d.date_id >= 20250501
+        AND d.date_id < 20251101
+        AND d.booking_state_simple = 'COMPLETED'
+        AND d.is_mfp = TRUE
+    GROUP BY pm.person_name, pm.role, CAST(SUBSTRING(CAST(d.date_id AS VARCHAR), 1, 6) AS INTEGER)
+),
+-- Combine all revenue sources per person and month
+combined_revenue AS (
+    SELECT
+        COALESCE(c.person_name, a.person_name, m.person_name) as person_name,
+        COALESCE(c.role, a.role, m.role) as role,
+        COALESCE(c.month_id, a.month_id, m.month_id) as month_id,
+        COALESCE(c.commission_revenue, 0) as commission_revenue,
+        COALESCE(c.gmv, 0) as gmv,
+        COALESCE(c.orders, 0) as orders,
+        COALESCE(c.active_merchants, 0) as active_merchants,
+        COALESCE(a.ads_revenue, 0) as ads_revenue,
+        COALESCE(a.total_ads_spend, 0) as total_ads_spend,
+        COALESCE(a.mex_ads_spend, 0) as mex_ads_spend,
+        COALESCE(a.merchants_in_ads, 0) as merchants_in_ads,
+        COALESCE(m.mex_campaign_spend, 0) as mex_campaign_spend,
+        COALESCE(m.grab_campaign_spend, 0) as grab_campaign_spend,
+        COALESCE(m.merchants_with_campaigns, 0) as merchants_with_campaigns,
+        COALESCE(m.campaign_orders, 0) as campaign_orders,
+        COALESCE(m.unique_campaigns, 0) as unique_campaigns
+    FROM commission_revenue c
+    FULL OUTER JOIN ads_revenue a
+        ON c.person_name = a.person_name AND c.role = a.role AND c.month_id = a.month_id
+    FULL OUTER JOIN mex_campaign_spend m
+        ON COALESCE(c.person_name, a.person_name) = m.person_name
+        AND COALESCE(c.role, a.role) = m.role
+        AND COALESCE(c.month_id, a.month_id) = m.month_id
+)
+SELECT
+    month_id,
+    person_name,
+    role,
+    commission_revenue,
+    ads_revenue,
+    mex_campaign_spend,
+    (commission_revenue + ads_revenue) as total_revenue,
+    gmv,
+    orders,
+    active_merchants,
+    -- Calculate percentages of total revenue
+    ROUND(commission_revenue * 100.0 / NULLIF((commission_revenue + ads_revenue), 0), 2) as commission_revenue_pct,
+    ROUND(ads_revenue * 100.0 / NULLIF((commission_revenue + ads_revenue), 0), 2) as ads_revenue_pct,
+    -- Additional metrics
+    total_ads_spend,
+    mex_ads_spend,
+    grab_campaign_spend,
+    merchants_in_ads,
+    merchants_with_campaigns,
+    campaign_orders,
+    unique_campaigns
+FROM combined_revenue
+ORDER BY role, person_name, month_id;
+"""
+    return query
+
+REVENUE_SUM_COLS = [
+    'commission_revenue', 'ads_revenue', 'mex_campaign_spend', 'gmv', 'orders', 'active_merchants',
+    'total_ads_spend', 'mex_ads_spend', 'grab_campaign_spend', 'merchants_in_ads',
+    'merchants_with_campaigns', 'campaign_orders'
+]
+
+def run_mgs_revenue(portfolios, workers=DEFAULT_WORKERS, store_path=None):
+    """Monthly revenue breakdown per MGS for portfolios of any size, executed in merchant chunks"""
+    months_by_mgs = run_portfolio_queries(
+        portfolios, lambda name, chunk: generate_mgs_revenue_query(name, chunk, chunked=True),
+        group_by=['month_id'], sum_cols=REVENUE_SUM_COLS,
+        distinct_keys={'unique_campaigns': 'campaign_ids'}, first_cols=['person_name', 'role'],
+        workers=workers, store_path=store_path)
+    for months in months_by_mgs.values():
+        for m in months or []:
+            total = m['commission_revenue'] + m['ads_revenue']
+            m['total_revenue'] = total
+            m['commission_revenue_pct'] = round(m['commission_revenue'] * 100.0 / total, 2) if total else None
+            m['ads_revenue_pct'] = round(m['ads_revenue'] * 100.0 / total, 2) if total else None
+    return months_by_mgs
+
 # Generate all queries
 print("\n" + "="*80)
 print("GENERATING REVENUE BREAKDOWN QUERIES")
 print("="*80)
 
 queries = []
+mgs_portfolios = []
 
 # Generate AM queries
 for am_name, am_email in am_mappings.items():
@@ -317,6 +529,7 @@ for mgs_name, merchant_ids in mgs_assignments.items():
     query = generate_mgs_revenue_query(mgs_name, merchant_ids)
     if query:
         queries.append((f"Revenue Breakdown: {mgs_name} (MGS)", query))
+        mgs_portfolios.append((f"Revenue Breakdown: {mgs_name} (MGS)", mgs_name, merchant_ids))
 
 # Save all queries
 output_file = 'query_revenue_breakdown_executable.sql'
@@ -342,9 +555,56 @@ with open(output_file, 'w', encoding='utf-8') as f:
 
 print(f"[OK] Generated {len(queries)} executable queries")
 print(f"[OK] Saved to: {output_file}")
-print("\n[INFO] Ready to execute queries via Presto/Hubble")
-
-
-
 
+team_query = generate_team_revenue_query(am_mappings, mgs_assignments)
+team_output_file = 'query_revenue_breakdown_team.sql'
+if team_query:
+    with open(team_output_file, 'w', encoding='utf-8') as f:
+        f.write(team_query)
+    print(f"[OK] Single whole-team query saved to: {team_output_file}")
+else:
+    print("[WARNING] No AM emails or MGS merchants - whole-team query not generated")
 
+if args.execute and args.single_query and not team_query:
+    print("\n[ERROR] --single-query needs the whole-team query; nothing to execute")
+    results = {}
+elif args.execute and args.single_query:
+    print("\n" + "="*80)
+    print("EXECUTING WHOLE-TEAM QUERY")
+    print("="*80)
+    team_rows = run_jobs([Job('Revenue Breakdown: team', team_query)],
+                         store_path=args.results, workers=1).get('Revenue Breakdown: team')
+    results = {}
+    if team_rows is not None:
+        # Same per-person structure as the per-person queries
+        for query_name, _ in queries:
+            results[query_name] = []
+        for row in team_rows:
+            results.setdefault(f"Revenue Breakdown: {row['person_name']} ({row['role']})", []).append(row)
+elif args.execute:
+    print("\n" + "="*80)
+    print(f"EXECUTING {len(queries)} QUERIES ({args.workers} in parallel)")
+    print("="*80)
+    # AM queries filter d_merchant by am_name and run as single jobs; MGS portfolios run in merchant chunks
+    mgs_query_names = {query_name for query_name, _, _ in mgs_portfolios}
+    results = run_jobs([Job(query_name, query) for query_name, query in queries if query_name not in mgs_query_names],
+                       store_path=args.results, workers=args.workers)
+    mgs_results = run_mgs_revenue({mgs_name: merchant_ids for _, mgs_name, merchant_ids in mgs_portfolios},
+                                  workers=args.workers, store_path=args.results)
+    for query_name, mgs_name, _ in mgs_portfolios:
+        if mgs_results.get(mgs_name) is not None:
+            results[query_name] = mgs_results[mgs_name]
+    
+    print("\n" + "="*80)
+    print("TOTAL REVENUE BY INDIVIDUAL (6 months)")
+    print("="*80)
+    for query_name, _ in queries:
+        rows = results.get(query_name)
+        if rows is None:
+            print(f"  {query_name}: FAILED - rerun with --execute to retry")
+            continue
+        total = sum(float(r.get('total_revenue') or 0) for r in rows)
+        print(f"  {query_name}: RM {total:,.2f} ({len(rows)} months)")
+    print(f"\n[OK] Results saved to: {args.results}")
+else:
+    print("\n[INFO] Ready to execute queries via Presto/Hubble (rerun with --execute)")
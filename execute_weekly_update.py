@@ -7,10 +7,12 @@ It generates and sends the enhanced weekly report for OC Cities and Penang
 import os
 import sys
 import json
-import requests
 import csv
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, Optional, List
+from calendar_dim import get_calendar
+from weekly_metrics import compute_growth_frame
+from slack_delivery import deliver
 
 # Fix Windows console encoding for emojis
 if sys.platform == 'win32':
@@ -24,27 +26,8 @@ SLACK_USERNAME = os.getenv('SLACK_USERNAME', 'Weekly Report Bot')
 
 def get_week_dates():
     """Get date ranges for this week and last week"""
-    today = datetime.now()
-    
-    # Calculate this week (Monday to Sunday)
-    days_since_monday = today.weekday()
-    this_week_start = today - timedelta(days=days_since_monday)
-    this_week_end = this_week_start + timedelta(days=6)
-    
-    # Calculate last week
-    last_week_start = this_week_start - timedelta(days=7)
-    last_week_end = this_week_end - timedelta(days=7)
-    
-    # Format as YYYYMMDD
-    def format_date(d):
-        return d.strftime('%Y%m%d')
-    
-    return (
-        format_date(this_week_start),
-        format_date(this_week_end),
-        format_date(last_week_start),
-        format_date(last_week_end)
-    )
+    # Monday-Sunday weeks from the precomputed calendar dimension (calendar_dim.py)
+    return get_calendar().monday_weeks(datetime.now())
 
 def format_number(num):
     """Format large numbers"""
@@ -80,47 +63,50 @@ def process_query_results(results: List[Dict]) -> Optional[Dict]:
     
     data = results[0]
     
+    # Week-over-week growth for every metric in one vectorized pass
+    g = compute_growth_frame(results[:1], {'wow': ['last_week']}).to_dict(orient='records')[0]
+    
     # Calculate deltas and growth percentages
     report = {
         'orders': {
             'last_week': int(data.get('last_week_orders', 0)),
             'this_week': int(data.get('this_week_orders', 0)),
             'delta': int(data.get('this_week_orders', 0)) - int(data.get('last_week_orders', 0)),
-            'growth_pct': round((int(data.get('this_week_orders', 0)) - int(data.get('last_week_orders', 0))) / data.get('last_week_orders', 1) * 100, 2) if data.get('last_week_orders', 0) > 0 else 0
+            'growth_pct': round(g['orders_growth_pct_wow'], 2)
         },
         'gmv': {
             'last_week': round(float(data.get('last_week_gmv', 0)), 2),
             'this_week': round(float(data.get('this_week_gmv', 0)), 2),
             'delta': round(float(data.get('this_week_gmv', 0)) - float(data.get('last_week_gmv', 0)), 2),
-            'growth_pct': round((float(data.get('this_week_gmv', 0)) - float(data.get('last_week_gmv', 0))) / float(data.get('last_week_gmv', 1)) * 100, 2) if data.get('last_week_gmv', 0) > 0 else 0
+            'growth_pct': round(g['gmv_growth_pct_wow'], 2)
         },
         'eaters': {
             'last_week': int(data.get('last_week_eaters', 0)),
             'this_week': int(data.get('this_week_eaters', 0)),
             'delta': int(data.get('this_week_eaters', 0)) - int(data.get('last_week_eaters', 0)),
-            'growth_pct': round((int(data.get('this_week_eaters', 0)) - int(data.get('last_week_eaters', 0))) / data.get('last_week_eaters', 1) * 100, 2) if data.get('last_week_eaters', 0) > 0 else 0
+            'growth_pct': round(g['eaters_growth_pct_wow'], 2)
         },
         'basket_size': {
             'last_week': round(float(data.get('last_week_basket', 0)), 2),
             'this_week': round(float(data.get('this_week_basket', 0)), 2),
             'delta': round(float(data.get('this_week_basket', 0)) - float(data.get('last_week_basket', 0)), 2),
-            'growth_pct': round((float(data.get('this_week_basket', 0)) - float(data.get('last_week_basket', 0))) / float(data.get('last_week_basket', 1)) * 100, 2) if data.get('last_week_basket', 0) > 0 else 0
+            'growth_pct': round(g['basket_size_growth_pct_wow'], 2)
         },
         'completion_rate': {
             'last_week': round(float(data.get('last_week_completion_rate', 0)), 1),
             'this_week': round(float(data.get('this_week_completion_rate', 0)), 1),
-            'delta_pp': round(float(data.get('this_week_completion_rate', 0)) - float(data.get('last_week_completion_rate', 0)), 1)
+            'delta_pp': round(g['completion_rate_delta_pp_wow'], 1)
         },
         'sessions': {
             'last_week': int(data.get('last_week_sessions', 0)),
             'this_week': int(data.get('this_week_sessions', 0)),
             'delta': int(data.get('this_week_sessions', 0)) - int(data.get('last_week_sessions', 0)),
-            'growth_pct': round((int(data.get('this_week_sessions', 0)) - int(data.get('last_week_sessions', 0))) / data.get('last_week_sessions', 1) * 100, 2) if data.get('last_week_sessions', 0) > 0 else 0
+            'growth_pct': round(g['sessions_growth_pct_wow'], 2)
         },
         'cops': {
             'last_week': round(float(data.get('last_week_cops', 0)), 2),
             'this_week': round(float(data.get('this_week_cops', 0)), 2),
-            'delta': round(float(data.get('this_week_cops', 0)) - float(data.get('last_week_cops', 0)), 2)
+            'delta': round(g['cops_delta_wow'], 2)
         },
         'promo': {
             'expense_last_week': round(float(data.get('last_week_promo_expense', 0)), 2),
@@ -404,25 +390,14 @@ def send_to_slack(message: Dict) -> bool:
         print("ERROR: SLACK_WEBHOOK_URL not set. Please set it as an environment variable or in the script.")
         return False
     
-    try:
-        response = requests.post(
-            SLACK_WEBHOOK_URL,
-            json=message,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            print("✅ Successfully sent message to Slack")
-            return True
-        else:
-            print(f"❌ Failed to send to Slack. Status code: {response.status_code}")
-            print(f"Response: {response.text}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Error sending to Slack: {str(e)}")
-        return False
+    # Split at 50 blocks, retried on rate limits / 5xx (slack_delivery.py)
+    # Deduped per report week, so a rerun after a partial send doesn't post it twice
+    report_id = f"weekly-{get_week_dates()[1]}-oc"
+    if deliver(message, [SLACK_WEBHOOK_URL], report_id=report_id)[SLACK_WEBHOOK_URL]:
+        print("✅ Successfully sent message to Slack")
+        return True
+    print("❌ Failed to send to Slack")
+    return False
 
 def main():
     """Main function - This will be called when /weekly-update command is used"""
@@ -10,11 +10,13 @@ This script:
 Run with: python export_merchants_csv.py
 """
 
-import csv
+import io
 import sys
 import subprocess
 import json
 
+from pipe_table import table_to_csv
+
 # SQL Query to get all Mainland merchants with readable cuisine names
 SQL_QUERY = """
 WITH mainland_areas AS (
@@ -149,50 +151,14 @@ def parse_query_output_to_csv(query_output_text, output_filename='penang_mainlan
     """
     Parse the table-formatted query output and create CSV file
     """
-    lines = query_output_text.strip().split('\n')
-    
-    # Find header row
-    header_line_idx = None
-    for i, line in enumerate(lines):
-        if 'merchant_id_nk' in line and 'merchant_name' in line:
-            header_line_idx = i
-            break
-    
-    if header_line_idx is None:
-        raise ValueError("Could not find header row in query output")
-    
-    # Parse headers
-    header_line = lines[header_line_idx]
-    headers = [h.strip() for h in header_line.split('|')[1:-1]]
-    
-    # Find data start (skip separator line)
-    data_start_idx = header_line_idx + 2
-    
-    # Parse all data rows
-    data_rows = []
-    for line in lines[data_start_idx:]:
-        # Stop at execution time line
-        if '*Execution time' in line:
-            break
-        
-        if line.strip() and line.startswith('|') and not line.startswith('|---'):
-            cols = [c.strip() for c in line.split('|')[1:-1]]
-            if len(cols) == len(headers):
-                # Replace 'None' with empty string
-                cols = ['' if c == 'None' else c for c in cols]
-                data_rows.append(cols)
-    
-    # Write to CSV
-    with open(output_filename, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
-        writer.writerow(headers)
-        writer.writerows(data_rows)
+    headers, row_count = table_to_csv(io.StringIO(query_output_text), output_filename,
+                                      required_columns=['merchant_id_nk', 'merchant_name'])
     
     print(f"✅ Successfully created {output_filename}")
-    print(f"   Total merchants: {len(data_rows)}")
+    print(f"   Total merchants: {row_count}")
     print(f"   Columns: {', '.join(headers)}")
     
-    return output_filename, len(data_rows)
+    return output_filename, row_count
 
 
 def get_query_output_from_mcp():
@@ -4,8 +4,8 @@ Includes queries for OC Overall and Top 5 Cities with New Pax metrics
 """
 
 import sys
-from datetime import datetime, timedelta
-from calendar import monthrange
+from datetime import datetime
+from calendar_dim import get_calendar
 
 # Fix Windows console encoding for emojis
 if sys.platform == 'win32':
@@ -14,74 +14,8 @@ if sys.platform == 'win32':
 
 def get_week_dates():
     """Get date ranges for last 7 days (current_date -1 to -8), same period last month, and same period last year, plus month ranges for MTM"""
-    today = datetime.now()
-    
-    # Calculate period: current_date -1 to -8 (last 7 days)
-    # Period end = yesterday (current_date - 1)
-    # Period start = 8 days ago (current_date - 8)
-    period_end = today - timedelta(days=1)  # Yesterday
-    period_start = today - timedelta(days=8)  # 8 days ago (7 days total: -8 to -1)
-    
-    # Calculate same period last month (MoM - same dates, previous month)
-    def subtract_month(date):
-        """Subtract one month from a date, handling edge cases"""
-        if date.month == 1:
-            prev_month = 12
-            prev_year = date.year - 1
-        else:
-            prev_month = date.month - 1
-            prev_year = date.year
-        
-        # Handle month-end edge cases (e.g., Jan 31 -> Feb 28/29)
-        last_day = monthrange(prev_year, prev_month)[1]
-        day = min(date.day, last_day)
-        
-        return date.replace(year=prev_year, month=prev_month, day=day)
-    
-    same_period_last_month_start = subtract_month(period_start)
-    same_period_last_month_end = subtract_month(period_end)
-    
-    # Calculate same period last year (YoY - same dates, previous year)
-    same_period_last_year_start = period_start.replace(year=period_start.year - 1)
-    same_period_last_year_end = period_end.replace(year=period_end.year - 1)
-    
-    # Calculate month ranges for MTM (Monthly Transacting Merchant)
-    # Current month (month containing period_end, i.e., yesterday)
-    current_month_start = period_end.replace(day=1)
-    days_in_current_month = monthrange(current_month_start.year, current_month_start.month)[1]
-    current_month_end = current_month_start.replace(day=days_in_current_month)
-    
-    # Last month (same month last year for YoY comparison)
-    if current_month_start.month == 1:
-        last_month_start = current_month_start.replace(year=current_month_start.year - 1, month=12)
-    else:
-        last_month_start = current_month_start.replace(month=current_month_start.month - 1)
-    days_in_last_month = monthrange(last_month_start.year, last_month_start.month)[1]
-    last_month_end = last_month_start.replace(day=days_in_last_month)
-    
-    # Same month last year
-    same_month_last_year_start = current_month_start.replace(year=current_month_start.year - 1)
-    days_in_same_month_last_year = monthrange(same_month_last_year_start.year, same_month_last_year_start.month)[1]
-    same_month_last_year_end = same_month_last_year_start.replace(day=days_in_same_month_last_year)
-    
-    # Format as YYYYMMDD
-    def format_date(d):
-        return d.strftime('%Y%m%d')
-    
-    return {
-        'this_week_start': format_date(period_start),  # Last 7 days (current_date -8)
-        'this_week_end': format_date(period_end),  # Last 7 days (current_date -1)
-        'same_week_last_month_start': format_date(same_period_last_month_start),
-        'same_week_last_month_end': format_date(same_period_last_month_end),
-        'same_week_last_year_start': format_date(same_period_last_year_start),
-        'same_week_last_year_end': format_date(same_period_last_year_end),
-        'current_month_start': format_date(current_month_start),
-        'current_month_end': format_date(current_month_end),
-        'last_month_start': format_date(last_month_start),
-        'last_month_end': format_date(last_month_end),
-        'same_month_last_year_start': format_date(same_month_last_year_start),
-        'same_month_last_year_end': format_date(same_month_last_year_end)
-    }
+    # Windows come from the precomputed calendar dimension (calendar_dim.py)
+    return get_calendar().report_windows(datetime.now())
 
 def generate_new_pax_subquery(week_start, week_end, city_filter=""):
     """
@@ -157,363 +91,271 @@ def generate_new_pax_subquery(week_start, week_end, city_filter=""):
         ) new_pax
     )"""
 
-def generate_oc_query_with_new_pax(dates):
-    """Generate OC Cities overall query with New Pax"""
-    return f"""
--- OC CITIES OVERALL with New Pax, MTM, and Earning per MEX
-WITH this_week AS (
-    SELECT 
-        COUNT(DISTINCT f.order_id) as orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as completed_orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.passenger_id END) as unique_eaters,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv,
-        AVG(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.basket_size END) as avg_basket,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.promo_expense ELSE 0 END) as promo_expense,
-        COUNT(DISTINCT CASE WHEN f.is_promotion = TRUE THEN f.order_id END) as promo_orders,
-        ROUND(100.0 * COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) / 
-              NULLIF(COUNT(DISTINCT f.order_id), 0), 2) as completion_rate
-    FROM ocd_adw.f_food_metrics f
-    WHERE f.country_id = 1 
-      AND f.city_id != 1
-      AND f.date_id >= {dates['this_week_start']} AND f.date_id <= {dates['this_week_end']}
-      AND f.business_type = 0
-),
--- MTM (Monthly Transacting Merchant) for current month
-mtm_current_month AS (
-    SELECT 
-        COUNT(DISTINCT f.merchant_id) as mtm_count
-    FROM ocd_adw.f_food_metrics f
-    WHERE f.country_id = 1 
-      AND f.city_id != 1
-      AND f.date_id >= {dates['current_month_start']} AND f.date_id <= {dates['current_month_end']}
-      AND f.business_type = 0
-      AND f.booking_state_simple = 'COMPLETED'
-      AND f.merchant_id IS NOT NULL
-),
--- Median MEX Earnings for current month (median of basket_size - commission_from_merchant per order)
-median_mex_earnings_current_month AS (
-    SELECT 
-        APPROX_PERCENTILE(
-            CASE 
-                WHEN f.booking_state_simple = 'COMPLETED' 
-                THEN COALESCE(f.basket_size, 0) - COALESCE(f.commission_from_merchant, 0)
-                ELSE NULL
-            END,
-            0.5
-        ) as median_earnings
-    FROM ocd_adw.f_food_metrics f
-    WHERE f.country_id = 1 
-      AND f.city_id != 1
-      AND f.date_id >= {dates['current_month_start']} AND f.date_id <= {dates['current_month_end']}
-      AND f.business_type = 0
-      AND f.booking_state_simple = 'COMPLETED'
-      AND f.merchant_id IS NOT NULL
-      AND f.basket_size IS NOT NULL
-),
--- MTM for last month
-mtm_last_month AS (
-    SELECT 
-        COUNT(DISTINCT f.merchant_id) as mtm_count
-    FROM ocd_adw.f_food_metrics f
-    WHERE f.country_id = 1 
-      AND f.city_id != 1
-      AND f.date_id >= {dates['last_month_start']} AND f.date_id <= {dates['last_month_end']}
-      AND f.business_type = 0
-      AND f.booking_state_simple = 'COMPLETED'
-      AND f.merchant_id IS NOT NULL
-),
--- Median MEX Earnings for last month
-median_mex_earnings_last_month AS (
-    SELECT 
-        APPROX_PERCENTILE(
-            CASE 
-                WHEN f.booking_state_simple = 'COMPLETED' 
-                THEN COALESCE(f.basket_size, 0) - COALESCE(f.commission_from_merchant, 0)
-                ELSE NULL
-            END,
-            0.5
-        ) as median_earnings
-    FROM ocd_adw.f_food_metrics f
-    WHERE f.country_id = 1 
-      AND f.city_id != 1
-      AND f.date_id >= {dates['last_month_start']} AND f.date_id <= {dates['last_month_end']}
-      AND f.business_type = 0
-      AND f.booking_state_simple = 'COMPLETED'
-      AND f.merchant_id IS NOT NULL
-      AND f.basket_size IS NOT NULL
-),
--- MTM for same month last year
-mtm_same_month_last_year AS (
-    SELECT 
-        COUNT(DISTINCT f.merchant_id) as mtm_count
-    FROM ocd_adw.f_food_metrics f
-    WHERE f.country_id = 1 
-      AND f.city_id != 1
-      AND f.date_id >= {dates['same_month_last_year_start']} AND f.date_id <= {dates['same_month_last_year_end']}
-      AND f.business_type = 0
-      AND f.booking_state_simple = 'COMPLETED'
-      AND f.merchant_id IS NOT NULL
-),
--- Median MEX Earnings for same month last year
-median_mex_earnings_same_month_last_year AS (
-    SELECT 
+# Comparison windows for the single-scan OC query: (window label, dates key prefix, output column prefix).
+# The same-week-last-year window is exposed as ytd_avg_* for the report processors.
+WEEK_WINDOWS = [
+    ('this_week', 'this_week', 'this_week'),
+    ('same_week_last_month', 'same_week_last_month', 'same_week_last_month'),
+    ('same_week_last_year', 'same_week_last_year', 'ytd_avg'),
+]
+MONTH_WINDOWS = [
+    ('current_month', 'current_month'),
+    ('last_month', 'last_month'),
+    ('same_month_last_year', 'same_month_last_year'),
+]
+
+def merge_date_ranges(ranges):
+    """Merge (start, end) date_id ranges into the smallest set of non-overlapping ranges"""
+    merged = []
+    for start, end in sorted((int(s), int(e)) for s, e in ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(r) for r in merged]
+
+def _window_case(column, windows, dates):
+    """CASE expression labelling each row with the (mutually exclusive) window it falls in"""
+    whens = "\n".join(
+        f"            WHEN {column} >= {dates[key + '_start']} AND {column} <= {dates[key + '_end']} THEN '{label}'"
+        for label, key in windows
+    )
+    return f"CASE\n{whens}\n        END"
+
+def generate_oc_query_with_new_pax(dates, include_new_pax=True):
+    """
+    Generate OC Cities overall query with New Pax
+    Reads ocd_adw.f_food_metrics once over the union of all week and month windows,
+    labels each row with its week window and month window, and computes every window's
+    metrics with conditional aggregation. agg_food_cops_metrics is read once the same way.
+    With include_new_pax=False the New Pax columns are left out so they can be filled
+    from the local passenger state store (passenger_state.py) instead.
+    """
+    week_windows = [(label, key) for label, key, _ in WEEK_WINDOWS]
+    ranges = merge_date_ranges(
+        [(dates[f'{key}_start'], dates[f'{key}_end']) for _, key in week_windows + MONTH_WINDOWS]
+    )
+    date_filter = "\n          OR ".join(f"(f.date_id >= {start} AND f.date_id <= {end})" for start, end in ranges)
+    week_ranges = merge_date_ranges([(dates[f'{key}_start'], dates[f'{key}_end']) for _, key in week_windows])
+    cops_date_filter = "\n          OR ".join(f"(date_id >= {start} AND date_id <= {end})" for start, end in week_ranges)
+
+    completed = "booking_state_simple = 'COMPLETED'"
+    week_metrics = []
+    for label, _, out in WEEK_WINDOWS:
+        in_window = f"week_window = '{label}'"
+        week_metrics.append(f"""        -- {label}
+        COUNT(DISTINCT CASE WHEN {in_window} THEN order_id END) as {out}_orders,
+        COUNT(DISTINCT CASE WHEN {in_window} AND {completed} THEN order_id END) as {out}_completed_orders,
+        COUNT(DISTINCT CASE WHEN {in_window} AND {completed} THEN passenger_id END) as {out}_unique_eaters,
+        SUM(CASE WHEN {in_window} THEN (CASE WHEN {completed} THEN gross_merchandise_value ELSE 0 END) END) as {out}_gmv,
+        AVG(CASE WHEN {in_window} AND {completed} THEN basket_size END) as {out}_avg_basket,
+        SUM(CASE WHEN {in_window} THEN (CASE WHEN {completed} THEN promo_expense ELSE 0 END) END) as {out}_promo_expense,
+        COUNT(DISTINCT CASE WHEN {in_window} AND is_promotion = TRUE THEN order_id END) as {out}_promo_orders,
+        ROUND(100.0 * COUNT(DISTINCT CASE WHEN {in_window} AND {completed} THEN order_id END) / 
+              NULLIF(COUNT(DISTINCT CASE WHEN {in_window} THEN order_id END), 0), 2) as {out}_completion_rate""")
+    month_metrics = []
+    for label, out in MONTH_WINDOWS:
+        in_window = f"month_window = '{label}' AND {completed} AND merchant_id IS NOT NULL"
+        month_metrics.append(f"""        -- {label}
+        COUNT(DISTINCT CASE WHEN {in_window} THEN merchant_id END) as {out}_mtm,
         APPROX_PERCENTILE(
-            CASE 
-                WHEN f.booking_state_simple = 'COMPLETED' 
-                THEN COALESCE(f.basket_size, 0) - COALESCE(f.commission_from_merchant, 0)
-                ELSE NULL
+            CASE WHEN {in_window} AND basket_size IS NOT NULL
+                 THEN COALESCE(basket_size, 0) - COALESCE(commission_from_merchant, 0)
             END,
             0.5
-        ) as median_earnings
-    FROM ocd_adw.f_food_metrics f
-    WHERE f.country_id = 1 
-      AND f.city_id != 1
-      AND f.date_id >= {dates['same_month_last_year_start']} AND f.date_id <= {dates['same_month_last_year_end']}
-      AND f.business_type = 0
-      AND f.booking_state_simple = 'COMPLETED'
-      AND f.merchant_id IS NOT NULL
-      AND f.basket_size IS NOT NULL
-),
-same_week_last_month AS (
-    SELECT 
-        COUNT(DISTINCT f.order_id) as orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as completed_orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.passenger_id END) as unique_eaters,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv,
-        AVG(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.basket_size END) as avg_basket,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.promo_expense ELSE 0 END) as promo_expense,
-        COUNT(DISTINCT CASE WHEN f.is_promotion = TRUE THEN f.order_id END) as promo_orders,
-        COUNT(DISTINCT f.scribe_session_id) as unique_sessions,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.scribe_session_id END) as completed_sessions,
-        ROUND(100.0 * COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) / 
-              NULLIF(COUNT(DISTINCT f.order_id), 0), 2) as completion_rate
-    FROM ocd_adw.f_food_metrics f
-    WHERE f.country_id = 1 
-      AND f.city_id != 1
-      AND f.date_id >= {dates['same_week_last_month_start']} AND f.date_id <= {dates['same_week_last_month_end']}
-      AND f.business_type = 0
-),
-same_week_last_year AS (
-    SELECT 
-        COUNT(DISTINCT f.order_id) as orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as completed_orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.passenger_id END) as unique_eaters,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv,
-        AVG(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.basket_size END) as avg_basket,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.promo_expense ELSE 0 END) as promo_expense,
-        COUNT(DISTINCT CASE WHEN f.is_promotion = TRUE THEN f.order_id END) as promo_orders,
-        COUNT(DISTINCT f.scribe_session_id) as unique_sessions,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.scribe_session_id END) as completed_sessions,
-        ROUND(100.0 * COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) / 
-              NULLIF(COUNT(DISTINCT f.order_id), 0), 2) as completion_rate
+        ) as {out}_median_earnings""")
+    cops_metrics = []
+    for label, _, out in WEEK_WINDOWS:
+        in_window = f"week_window = '{label}'"
+        cops_metrics.append(f"""        CAST(SUM(CASE WHEN {in_window} THEN preorder_sessions END) AS DOUBLE) as {out}_sessions,
+        CAST(SUM(CASE WHEN {in_window} THEN completed_orders END) AS DOUBLE) / 
+            CAST(SUM(CASE WHEN {in_window} THEN preorder_sessions END) AS DOUBLE) as {out}_cops""")
+
+    week_metrics_sql = ",\n".join(week_metrics)
+    month_metrics_sql = ",\n".join(month_metrics)
+    cops_metrics_sql = ",\n".join(cops_metrics)
+    if include_new_pax:
+        new_pax_ctes = f""",
+new_pax_this_week AS {generate_new_pax_subquery(dates['this_week_start'], dates['this_week_end'])},
+new_pax_last_month AS {generate_new_pax_subquery(dates['same_week_last_month_start'], dates['same_week_last_month_end'])},
+new_pax_last_year AS {generate_new_pax_subquery(dates['same_week_last_year_start'], dates['same_week_last_year_end'])}"""
+        new_pax_columns = """
+    COALESCE(npw.new_pax_count, 0) as this_week_new_pax,
+    COALESCE(npm.new_pax_count, 0) as same_week_last_month_new_pax,
+    COALESCE(npy.new_pax_count, 0) as ytd_avg_new_pax,"""
+        new_pax_joins = """
+CROSS JOIN new_pax_this_week npw
+CROSS JOIN new_pax_last_month npm
+CROSS JOIN new_pax_last_year npy"""
+    else:
+        new_pax_ctes = new_pax_columns = new_pax_joins = ""
+    return f"""
+-- OC CITIES OVERALL with New Pax, MTM, and Earning per MEX
+-- Single scan of f_food_metrics over all windows, metrics by conditional aggregation
+WITH windowed AS (
+    SELECT 
+        {_window_case('f.date_id', week_windows, dates)} as week_window,
+        {_window_case('f.date_id', MONTH_WINDOWS, dates)} as month_window,
+        f.order_id,
+        f.passenger_id,
+        f.merchant_id,
+        f.booking_state_simple,
+        f.gross_merchandise_value,
+        f.basket_size,
+        f.promo_expense,
+        f.is_promotion,
+        f.commission_from_merchant
     FROM ocd_adw.f_food_metrics f
     WHERE f.country_id = 1 
       AND f.city_id != 1
-      AND f.date_id >= {dates['same_week_last_year_start']} AND f.date_id <= {dates['same_week_last_year_end']}
       AND f.business_type = 0
+      AND (
+          {date_filter}
+      )
 ),
--- Sessions calculation using ocd_adw.agg_food_cops_metrics (high intent sessions = preorder_sessions)
-sessions_this_week AS (
-    SELECT 
-        CAST(SUM(preorder_sessions) AS DOUBLE) as sessions_value
-    FROM ocd_adw.agg_food_cops_metrics
-    WHERE country_id = 1 
-      AND city_id != 1
-      AND date_id >= {dates['this_week_start']} AND date_id <= {dates['this_week_end']}
-      AND business = 'food'
-),
-sessions_same_week_last_month AS (
-    SELECT 
-        CAST(SUM(preorder_sessions) AS DOUBLE) as sessions_value
-    FROM ocd_adw.agg_food_cops_metrics
-    WHERE country_id = 1 
-      AND city_id != 1
-      AND date_id >= {dates['same_week_last_month_start']} AND date_id <= {dates['same_week_last_month_end']}
-      AND business = 'food'
-),
-sessions_same_week_last_year AS (
-    SELECT 
-        CAST(SUM(preorder_sessions) AS DOUBLE) as sessions_value
-    FROM ocd_adw.agg_food_cops_metrics
-    WHERE country_id = 1 
-      AND city_id != 1
-      AND date_id >= {dates['same_week_last_year_start']} AND date_id <= {dates['same_week_last_year_end']}
-      AND business = 'food'
-),
--- COPS calculation using ocd_adw.agg_food_cops_metrics (underlying table for midas_analytics.v_agg_food_cops_metrics)
-cops_this_week AS (
+window_metrics AS (
     SELECT 
-        CAST(SUM(completed_orders) AS DOUBLE) / CAST(SUM(preorder_sessions) AS DOUBLE) as cops_value
-    FROM ocd_adw.agg_food_cops_metrics
-    WHERE country_id = 1 
-      AND city_id != 1
-      AND date_id >= {dates['this_week_start']} AND date_id <= {dates['this_week_end']}
-      AND business = 'food'
+{week_metrics_sql},
+{month_metrics_sql}
+    FROM windowed
 ),
-cops_same_week_last_month AS (
+-- Sessions and COPS from ocd_adw.agg_food_cops_metrics (high intent sessions = preorder_sessions), one scan
+cops_windowed AS (
     SELECT 
-        CAST(SUM(completed_orders) AS DOUBLE) / CAST(SUM(preorder_sessions) AS DOUBLE) as cops_value
+        {_window_case('date_id', week_windows, dates)} as week_window,
+        preorder_sessions,
+        completed_orders
     FROM ocd_adw.agg_food_cops_metrics
     WHERE country_id = 1 
       AND city_id != 1
-      AND date_id >= {dates['same_week_last_month_start']} AND date_id <= {dates['same_week_last_month_end']}
       AND business = 'food'
+      AND (
+          {cops_date_filter}
+      )
 ),
-cops_same_week_last_year AS (
+cops_metrics AS (
     SELECT 
-        CAST(SUM(completed_orders) AS DOUBLE) / CAST(SUM(preorder_sessions) AS DOUBLE) as cops_value
-    FROM ocd_adw.agg_food_cops_metrics
-    WHERE country_id = 1 
-      AND city_id != 1
-      AND date_id >= {dates['same_week_last_year_start']} AND date_id <= {dates['same_week_last_year_end']}
-      AND business = 'food'
-),
-new_pax_this_week AS {generate_new_pax_subquery(dates['this_week_start'], dates['this_week_end'])},
-new_pax_last_month AS {generate_new_pax_subquery(dates['same_week_last_month_start'], dates['same_week_last_month_end'])},
-new_pax_last_year AS {generate_new_pax_subquery(dates['same_week_last_year_start'], dates['same_week_last_year_end'])}
+{cops_metrics_sql}
+    FROM cops_windowed
+){new_pax_ctes}
 SELECT 
-    t.orders as this_week_orders,
-    m.orders as same_week_last_month_orders,
-    y.orders as ytd_avg_orders,
-    t.completed_orders as this_week_completed_orders,
-    m.completed_orders as same_week_last_month_completed_orders,
-    y.completed_orders as ytd_avg_completed_orders,
-    t.completion_rate as this_week_completion_rate,
-    m.completion_rate as same_week_last_month_completion_rate,
-    y.completion_rate as ytd_avg_completion_rate,
-    t.unique_eaters as this_week_eaters,
-    m.unique_eaters as same_week_last_month_eaters,
-    y.unique_eaters as ytd_avg_eaters,
-    t.gmv as this_week_gmv,
-    m.gmv as same_week_last_month_gmv,
-    y.gmv as ytd_avg_gmv,
-    t.avg_basket as this_week_basket,
-    m.avg_basket as same_week_last_month_basket,
-    y.avg_basket as ytd_avg_basket,
-    t.promo_expense as this_week_promo_expense,
-    m.promo_expense as same_week_last_month_promo_expense,
-    y.promo_expense as ytd_avg_promo_expense,
-    t.promo_orders as this_week_promo_orders,
-    m.promo_orders as same_week_last_month_promo_orders,
-    y.promo_orders as ytd_avg_promo_orders,
-    ROUND(100.0 * t.promo_orders / NULLIF(t.orders, 0), 1) as this_week_promo_penetration,
-    ROUND(100.0 * m.promo_orders / NULLIF(m.orders, 0), 1) as same_week_last_month_promo_penetration,
-    ROUND(100.0 * y.promo_orders / NULLIF(y.orders, 0), 1) as ytd_avg_promo_penetration,
-    COALESCE(sess_tw.sessions_value, 0) as this_week_sessions,
-    COALESCE(sess_m.sessions_value, 0) as same_week_last_month_sessions,
-    COALESCE(sess_y.sessions_value, 0) as ytd_avg_sessions,
-    COALESCE(sess_tw.sessions_value, 0) as this_week_completed_sessions,
-    COALESCE(sess_m.sessions_value, 0) as same_week_last_month_completed_sessions,
-    COALESCE(sess_y.sessions_value, 0) as ytd_avg_completed_sessions,
-    ROUND(1.0 * t.orders / NULLIF(COALESCE(sess_tw.sessions_value, 0), 0), 2) as this_week_orders_per_session,
-    ROUND(1.0 * m.orders / NULLIF(COALESCE(sess_m.sessions_value, 0), 0), 2) as same_week_last_month_orders_per_session,
-    ROUND(1.0 * y.orders / NULLIF(COALESCE(sess_y.sessions_value, 0), 0), 2) as ytd_avg_orders_per_session,
-    ROUND(COALESCE(cops_tw.cops_value, 0), 2) as this_week_cops,
-    ROUND(COALESCE(cops_m.cops_value, 0), 2) as same_week_last_month_cops,
-    ROUND(COALESCE(cops_y.cops_value, 0), 2) as ytd_avg_cops,
-    COALESCE(npw.new_pax_count, 0) as this_week_new_pax,
-    COALESCE(npm.new_pax_count, 0) as same_week_last_month_new_pax,
-    COALESCE(npy.new_pax_count, 0) as ytd_avg_new_pax,
-    COALESCE(mtm_curr.mtm_count, 0) as current_month_mtm,
-    COALESCE(mtm_last.mtm_count, 0) as last_month_mtm,
-    COALESCE(mtm_yoy.mtm_count, 0) as same_month_last_year_mtm,
-    ROUND(COALESCE(median_curr.median_earnings, 0), 2) as current_month_earning_per_mex,
-    ROUND(COALESCE(median_last.median_earnings, 0), 2) as last_month_earning_per_mex,
-    ROUND(COALESCE(median_yoy.median_earnings, 0), 2) as same_month_last_year_earning_per_mex
-FROM this_week t
-CROSS JOIN same_week_last_month m
-CROSS JOIN same_week_last_year y
-CROSS JOIN sessions_this_week sess_tw
-CROSS JOIN sessions_same_week_last_month sess_m
-CROSS JOIN sessions_same_week_last_year sess_y
-CROSS JOIN cops_this_week cops_tw
-CROSS JOIN cops_same_week_last_month cops_m
-CROSS JOIN cops_same_week_last_year cops_y
-CROSS JOIN new_pax_this_week npw
-CROSS JOIN new_pax_last_month npm
-CROSS JOIN new_pax_last_year npy
-CROSS JOIN mtm_current_month mtm_curr
-CROSS JOIN mtm_last_month mtm_last
-CROSS JOIN mtm_same_month_last_year mtm_yoy
-CROSS JOIN median_mex_earnings_current_month median_curr
-CROSS JOIN median_mex_earnings_last_month median_last
-CROSS JOIN median_mex_earnings_same_month_last_year median_yoy
+    w.this_week_orders,
+    w.same_week_last_month_orders,
+    w.ytd_avg_orders,
+    w.this_week_completed_orders,
+    w.same_week_last_month_completed_orders,
+    w.ytd_avg_completed_orders,
+    w.this_week_completion_rate,
+    w.same_week_last_month_completion_rate,
+    w.ytd_avg_completion_rate,
+    w.this_week_unique_eaters as this_week_eaters,
+    w.same_week_last_month_unique_eaters as same_week_last_month_eaters,
+    w.ytd_avg_unique_eaters as ytd_avg_eaters,
+    w.this_week_gmv,
+    w.same_week_last_month_gmv,
+    w.ytd_avg_gmv,
+    w.this_week_avg_basket as this_week_basket,
+    w.same_week_last_month_avg_basket as same_week_last_month_basket,
+    w.ytd_avg_avg_basket as ytd_avg_basket,
+    w.this_week_promo_expense,
+    w.same_week_last_month_promo_expense,
+    w.ytd_avg_promo_expense,
+    w.this_week_promo_orders,
+    w.same_week_last_month_promo_orders,
+    w.ytd_avg_promo_orders,
+    ROUND(100.0 * w.this_week_promo_orders / NULLIF(w.this_week_orders, 0), 1) as this_week_promo_penetration,
+    ROUND(100.0 * w.same_week_last_month_promo_orders / NULLIF(w.same_week_last_month_orders, 0), 1) as same_week_last_month_promo_penetration,
+    ROUND(100.0 * w.ytd_avg_promo_orders / NULLIF(w.ytd_avg_orders, 0), 1) as ytd_avg_promo_penetration,
+    COALESCE(c.this_week_sessions, 0) as this_week_sessions,
+    COALESCE(c.same_week_last_month_sessions, 0) as same_week_last_month_sessions,
+    COALESCE(c.ytd_avg_sessions, 0) as ytd_avg_sessions,
+    COALESCE(c.this_week_sessions, 0) as this_week_completed_sessions,
+    COALESCE(c.same_week_last_month_sessions, 0) as same_week_last_month_completed_sessions,
+    COALESCE(c.ytd_avg_sessions, 0) as ytd_avg_completed_sessions,
+    ROUND(1.0 * w.this_week_orders / NULLIF(COALESCE(c.this_week_sessions, 0), 0), 2) as this_week_orders_per_session,
+    ROUND(1.0 * w.same_week_last_month_orders / NULLIF(COALESCE(c.same_week_last_month_sessions, 0), 0), 2) as same_week_last_month_orders_per_session,
+    ROUND(1.0 * w.ytd_avg_orders / NULLIF(COALESCE(c.ytd_avg_sessions, 0), 0), 2) as ytd_avg_orders_per_session,
+    ROUND(COALESCE(c.this_week_cops, 0), 2) as this_week_cops,
+    ROUND(COALESCE(c.same_week_last_month_cops, 0), 2) as same_week_last_month_cops,
+    ROUND(COALESCE(c.ytd_avg_cops, 0), 2) as ytd_avg_cops,{new_pax_columns}
+    COALESCE(w.current_month_mtm, 0) as current_month_mtm,
+    COALESCE(w.last_month_mtm, 0) as last_month_mtm,
+    COALESCE(w.same_month_last_year_mtm, 0) as same_month_last_year_mtm,
+    ROUND(COALESCE(w.current_month_median_earnings, 0), 2) as current_month_earning_per_mex,
+    ROUND(COALESCE(w.last_month_median_earnings, 0), 2) as last_month_earning_per_mex,
+    ROUND(COALESCE(w.same_month_last_year_median_earnings, 0), 2) as same_month_last_year_earning_per_mex
+FROM window_metrics w
+CROSS JOIN cops_metrics c{new_pax_joins}
 """
 
-def generate_top_cities_query_with_new_pax(dates):
-    """Generate Top 5 Cities query with New Pax, MTM, and Earning per MEX"""
+def generate_distinct_metrics_query(dates, by_city=False, include_counts=True):
+    """
+    Generate the non-additive weekly metrics only: unique eaters per week window, MTM and
+    median earning per MEX per month window, for OC overall or per city (by_city=True).
+    These can't be summed from daily totals, so they are queried alongside the daily
+    aggregate store (daily_aggregates.py), which supplies every additive metric.
+    With include_counts=False only the earning per MEX medians are computed (eaters and
+    MTM then come from the sketch store, hll_sketches.py) and only month windows are read.
+    """
+    week_windows = [(label, key) for label, key, _ in WEEK_WINDOWS] if include_counts else []
+    ranges = merge_date_ranges(
+        [(dates[f'{key}_start'], dates[f'{key}_end']) for _, key in week_windows + MONTH_WINDOWS]
+    )
+    date_filter = "\n          OR ".join(f"(f.date_id >= {start} AND f.date_id <= {end})" for start, end in ranges)
+
+    completed = "booking_state_simple = 'COMPLETED'"
+    metrics = [
+        f"        COUNT(DISTINCT CASE WHEN week_window = '{label}' AND {completed} THEN passenger_id END) as {out}_eaters"
+        for label, _, out in WEEK_WINDOWS
+    ] if include_counts else []
+    for label, out in MONTH_WINDOWS:
+        in_window = f"month_window = '{label}' AND {completed} AND merchant_id IS NOT NULL"
+        if include_counts:
+            metrics.append(f"        COALESCE(COUNT(DISTINCT CASE WHEN {in_window} THEN merchant_id END), 0) as {out}_mtm")
+        metrics.append(f"""        ROUND(COALESCE(APPROX_PERCENTILE(
+            CASE WHEN {in_window} AND basket_size IS NOT NULL
+                 THEN COALESCE(basket_size, 0) - COALESCE(commission_from_merchant, 0)
+            END,
+            0.5
+        ), 0), 2) as {out}_earning_per_mex""")
+    metrics_sql = ",\n".join(metrics)
+    city_column = "\n        f.city_id," if by_city else ""
+    week_column = f"\n        {_window_case('f.date_id', week_windows, dates)} as week_window," if include_counts else ""
+    city_select = "\n    w.city_id,\n    dc.city_name," if by_city else ""
+    city_join = "\nJOIN ocd_adw.d_city dc ON w.city_id = dc.city_id\nGROUP BY w.city_id, dc.city_name" if by_city else ""
+    title = 'unique eaters, MTM and Earning per MEX' if include_counts else 'Earning per MEX'
     return f"""
--- TOP 5 CITIES BY GMV with New Pax, MTM, and Earning per MEX
-WITH this_week_cities AS (
-    SELECT 
-        f.city_id,
-        dc.city_name,
-        COUNT(DISTINCT f.order_id) as orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as completed_orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.passenger_id END) as unique_eaters,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv,
-        AVG(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.basket_size END) as avg_basket,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.promo_expense ELSE 0 END) as promo_expense,
-        COUNT(DISTINCT CASE WHEN f.is_promotion = TRUE THEN f.order_id END) as promo_orders,
-        ROUND(100.0 * COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) / 
-              NULLIF(COUNT(DISTINCT f.order_id), 0), 2) as completion_rate
-    FROM ocd_adw.f_food_metrics f
-    JOIN ocd_adw.d_city dc ON f.city_id = dc.city_id
-    WHERE f.country_id = 1 
-      AND f.city_id != 1
-      AND f.date_id >= {dates['this_week_start']} AND f.date_id <= {dates['this_week_end']}
-      AND f.business_type = 0
-    GROUP BY f.city_id, dc.city_name
-),
-same_week_last_month_cities AS (
-    SELECT 
-        f.city_id,
-        dc.city_name,
-        COUNT(DISTINCT f.order_id) as orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as completed_orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.passenger_id END) as unique_eaters,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv,
-        AVG(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.basket_size END) as avg_basket,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.promo_expense ELSE 0 END) as promo_expense,
-        COUNT(DISTINCT CASE WHEN f.is_promotion = TRUE THEN f.order_id END) as promo_orders,
-        ROUND(100.0 * COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) / 
-              NULLIF(COUNT(DISTINCT f.order_id), 0), 2) as completion_rate
+-- OC CITIES {'BY CITY' if by_city else 'OVERALL'}: {title} (non-additive metrics)
+WITH windowed AS (
+    SELECT {city_column}{week_column}
+        {_window_case('f.date_id', MONTH_WINDOWS, dates)} as month_window,
+        f.passenger_id,
+        f.merchant_id,
+        f.booking_state_simple,
+        f.basket_size,
+        f.commission_from_merchant
     FROM ocd_adw.f_food_metrics f
-    JOIN ocd_adw.d_city dc ON f.city_id = dc.city_id
-    WHERE f.country_id = 1 
+    WHERE f.country_id = 1
       AND f.city_id != 1
-      AND f.date_id >= {dates['same_week_last_month_start']} AND f.date_id <= {dates['same_week_last_month_end']}
       AND f.business_type = 0
-    GROUP BY f.city_id, dc.city_name
-),
-same_week_last_year_cities AS (
-    SELECT 
-        f.city_id,
-        dc.city_name,
-        COUNT(DISTINCT f.order_id) as orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as completed_orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.passenger_id END) as unique_eaters,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv,
-        AVG(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.basket_size END) as avg_basket,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.promo_expense ELSE 0 END) as promo_expense,
-        COUNT(DISTINCT CASE WHEN f.is_promotion = TRUE THEN f.order_id END) as promo_orders,
-        ROUND(100.0 * COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) / 
-              NULLIF(COUNT(DISTINCT f.order_id), 0), 2) as completion_rate
-    FROM ocd_adw.f_food_metrics f
-    JOIN ocd_adw.d_city dc ON f.city_id = dc.city_id
-    WHERE f.country_id = 1 
-      AND f.city_id != 1
-      AND f.date_id >= {dates['same_week_last_year_start']} AND f.date_id <= {dates['same_week_last_year_end']}
-      AND f.business_type = 0
-    GROUP BY f.city_id, dc.city_name
-),
-top_cities AS (
-    SELECT city_id, city_name
-    FROM this_week_cities
-    ORDER BY gmv DESC
-    LIMIT 5
-),
--- New Pax per city for this week
+      AND (
+          {date_filter}
+      )
+)
+SELECT {city_select}
+{metrics_sql}
+FROM windowed w{city_join}
+"""
+
+def generate_top_cities_query_with_new_pax(dates, include_new_pax=True, limit=5):
+    """
+    Generate Top 5 Cities query with New Pax, MTM, and Earning per MEX
+    With include_new_pax=False the per-city New Pax CTEs are left out (see passenger_state.py)
+    limit=None returns every OC city (ranked by this week's GMV) for the per-city reports
+    """
+    limit_clause = f"\n    LIMIT {int(limit)}" if limit else ""
+    if include_new_pax:
+        new_pax_ctes = f"""-- New Pax per city for this week
 new_pax_this_week_by_city AS (
     SELECT 
         f.city_id,
@@ -698,7 +540,88 @@ new_pax_last_year_by_city AS (
       )
     GROUP BY f.city_id
 ),
--- Sessions calculation per city using ocd_adw.agg_food_cops_metrics (high intent sessions = preorder_sessions)
+"""
+        new_pax_columns = """
+    COALESCE(npw.new_pax_count, 0) as this_week_new_pax,
+    COALESCE(npm.new_pax_count, 0) as same_week_last_month_new_pax,
+    COALESCE(npy.new_pax_count, 0) as ytd_avg_new_pax,"""
+        new_pax_joins = """
+LEFT JOIN new_pax_this_week_by_city npw ON tc.city_id = npw.city_id
+LEFT JOIN new_pax_last_month_by_city npm ON tc.city_id = npm.city_id
+LEFT JOIN new_pax_last_year_by_city npy ON tc.city_id = npy.city_id"""
+    else:
+        new_pax_ctes = new_pax_columns = new_pax_joins = ""
+    return f"""
+-- TOP 5 CITIES BY GMV with New Pax, MTM, and Earning per MEX
+WITH this_week_cities AS (
+    SELECT 
+        f.city_id,
+        dc.city_name,
+        COUNT(DISTINCT f.order_id) as orders,
+        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as completed_orders,
+        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.passenger_id END) as unique_eaters,
+        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv,
+        AVG(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.basket_size END) as avg_basket,
+        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.promo_expense ELSE 0 END) as promo_expense,
+        COUNT(DISTINCT CASE WHEN f.is_promotion = TRUE THEN f.order_id END) as promo_orders,
+        ROUND(100.0 * COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) / 
+              NULLIF(COUNT(DISTINCT f.order_id), 0), 2) as completion_rate
+    FROM ocd_adw.f_food_metrics f
+    JOIN ocd_adw.d_city dc ON f.city_id = dc.city_id
+    WHERE f.country_id = 1 
+      AND f.city_id != 1
+      AND f.date_id >= {dates['this_week_start']} AND f.date_id <= {dates['this_week_end']}
+      AND f.business_type = 0
+    GROUP BY f.city_id, dc.city_name
+),
+same_week_last_month_cities AS (
+    SELECT 
+        f.city_id,
+        dc.city_name,
+        COUNT(DISTINCT f.order_id) as orders,
+        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as completed_orders,
+        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.passenger_id END) as unique_eaters,
+        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv,
+        AVG(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.basket_size END) as avg_basket,
+        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.promo_expense ELSE 0 END) as promo_expense,
+        COUNT(DISTINCT CASE WHEN f.is_promotion = TRUE THEN f.order_id END) as promo_orders,
+        ROUND(100.0 * COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) / 
+              NULLIF(COUNT(DISTINCT f.order_id), 0), 2) as completion_rate
+    FROM ocd_adw.f_food_metrics f
+    JOIN ocd_adw.d_city dc ON f.city_id = dc.city_id
+    WHERE f.country_id = 1 
+      AND f.city_id != 1
+      AND f.date_id >= {dates['same_week_last_month_start']} AND f.date_id <= {dates['same_week_last_month_end']}
+      AND f.business_type = 0
+    GROUP BY f.city_id, dc.city_name
+),
+same_week_last_year_cities AS (
+    SELECT 
+        f.city_id,
+        dc.city_name,
+        COUNT(DISTINCT f.order_id) as orders,
+        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as completed_orders,
+        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.passenger_id END) as unique_eaters,
+        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv,
+        AVG(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.basket_size END) as avg_basket,
+        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.promo_expense ELSE 0 END) as promo_expense,
+        COUNT(DISTINCT CASE WHEN f.is_promotion = TRUE THEN f.order_id END) as promo_orders,
+        ROUND(100.0 * COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) / 
+              NULLIF(COUNT(DISTINCT f.order_id), 0), 2) as completion_rate
+    FROM ocd_adw.f_food_metrics f
+    JOIN ocd_adw.d_city dc ON f.city_id = dc.city_id
+    WHERE f.country_id = 1 
+      AND f.city_id != 1
+      AND f.date_id >= {dates['same_week_last_year_start']} AND f.date_id <= {dates['same_week_last_year_end']}
+      AND f.business_type = 0
+    GROUP BY f.city_id, dc.city_name
+),
+top_cities AS (
+    SELECT city_id, city_name
+    FROM this_week_cities
+    ORDER BY gmv DESC{limit_clause}
+),
+{new_pax_ctes}-- Sessions calculation per city using ocd_adw.agg_food_cops_metrics (high intent sessions = preorder_sessions)
 sessions_this_week_by_city AS (
     SELECT 
         city_id,
@@ -807,10 +730,7 @@ SELECT
     ROUND(1.0 * y.orders / NULLIF(COALESCE(sess_y.sessions_value, 0), 0), 2) as ytd_avg_orders_per_session,
     ROUND(COALESCE(cops_tw.cops_value, 0), 2) as this_week_cops,
     ROUND(COALESCE(cops_m.cops_value, 0), 2) as same_week_last_month_cops,
-    ROUND(COALESCE(cops_y.cops_value, 0), 2) as ytd_avg_cops,
-    COALESCE(npw.new_pax_count, 0) as this_week_new_pax,
-    COALESCE(npm.new_pax_count, 0) as same_week_last_month_new_pax,
-    COALESCE(npy.new_pax_count, 0) as ytd_avg_new_pax,
+    ROUND(COALESCE(cops_y.cops_value, 0), 2) as ytd_avg_cops,{new_pax_columns}
     COALESCE(mtm_curr.mtm_count, 0) as current_month_mtm,
     COALESCE(mtm_last.mtm_count, 0) as last_month_mtm,
     COALESCE(mtm_yoy.mtm_count, 0) as same_month_last_year_mtm,
@@ -823,10 +743,7 @@ LEFT JOIN same_week_last_month_cities m ON tc.city_id = m.city_id
 LEFT JOIN same_week_last_year_cities y ON tc.city_id = y.city_id
 LEFT JOIN sessions_this_week_by_city sess_tw ON tc.city_id = sess_tw.city_id
 LEFT JOIN sessions_same_week_last_month_by_city sess_m ON tc.city_id = sess_m.city_id
-LEFT JOIN sessions_same_week_last_year_by_city sess_y ON tc.city_id = sess_y.city_id
-LEFT JOIN new_pax_this_week_by_city npw ON tc.city_id = npw.city_id
-LEFT JOIN new_pax_last_month_by_city npm ON tc.city_id = npm.city_id
-LEFT JOIN new_pax_last_year_by_city npy ON tc.city_id = npy.city_id
+LEFT JOIN sessions_same_week_last_year_by_city sess_y ON tc.city_id = sess_y.city_id{new_pax_joins}
 LEFT JOIN cops_this_week_by_city cops_tw ON tc.city_id = cops_tw.city_id
 LEFT JOIN cops_same_week_last_month_by_city cops_m ON tc.city_id = cops_m.city_id
 LEFT JOIN cops_same_week_last_year_by_city cops_y ON tc.city_id = cops_y.city_id
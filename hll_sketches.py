@@ -0,0 +1,322 @@
+"""
+HyperLogLog Sketch Store for Distinct Counts over Any Date Window
+Unique eaters (WTU / unique passengers) and transacting merchants are
+COUNT(DISTINCT ...) over a window and can't be summed from daily totals, so
+every new window used to mean a raw rescan. This store keeps one HyperLogLog
+sketch per metric, scope and day in SQLite; a distinct count for any date range
+is the merge (register-wise max) of that range's daily sketches.
+
+Metrics (completed food orders, same definitions as the weekly queries):
+    eaters      distinct passenger_id   -> {prefix}_eaters / unique_passengers
+    merchants   distinct merchant_id    -> {month}_mtm / active_merchants
+Scopes:
+    oc          all OC cities (every city except Klang Valley), scope id 0
+    city        per city_id
+    any name    per merchant group, e.g. area or segment, from a
+                merchant_id -> group mapping given at ingest
+
+Precision 2^14 registers: standard error about 0.8% on any window.
+Days are fetched incrementally like daily_aggregates.py, including the late
+data refetch of days that hadn't settled when first fetched. Fetched days are
+tracked per group scope too: a store opened without groups rewrites only the
+oc / city sketches and leaves group sketches (and their fetch state) alone.
+
+Usage:
+    python hll_sketches.py --refresh 20251101 20251130
+    python hll_sketches.py --refresh 20251101 20251130 --groups area=merchant_areas.csv
+    python hll_sketches.py --count 20251101 20251130 --metric eaters --city 13
+    python hll_sketches.py --count 20251101 20251130 --metric eaters --scope area --scope-id Kulim
+"""
+
+import os
+import sys
+import zlib
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from daily_aggregates import LATE_DATA_DAYS, contiguous_ranges, days_between, mark_fetched, unsettled_days
+from generate_weekly_queries_with_new_pax import WEEK_WINDOWS, MONTH_WINDOWS
+
+DEFAULT_DB_PATH = os.getenv('HLL_SKETCH_DB', 'hll_sketches.db')
+
+PRECISION = 14
+REGISTERS = 1 << PRECISION
+SUFFIX_BITS = 64 - PRECISION
+
+OC_SCOPE = ('oc', '0')
+BASE_SCOPES = ('oc', 'city')  # written on every fetch; merchant group scopes only when their mapping is given
+EXCLUDED_CITY_ID = 1
+
+# metric -> key column in the delta query
+METRIC_KEYS = {
+    'eaters': 'passenger_id',
+    'merchants': 'merchant_id',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sketches (
+    metric TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    scope_id TEXT NOT NULL,
+    date_id INTEGER NOT NULL,
+    registers BLOB NOT NULL,
+    PRIMARY KEY (metric, scope, scope_id, date_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fetched_days (
+    date_id INTEGER PRIMARY KEY,
+    fetched_on INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fetched_group_days (
+    scope TEXT NOT NULL,
+    date_id INTEGER NOT NULL,
+    fetched_on INTEGER NOT NULL,
+    PRIMARY KEY (scope, date_id)
+) WITHOUT ROWID;
+"""
+
+
+def hash_keys(keys) -> np.ndarray:
+    """Stable 64-bit hashes of ids; ids are hashed as strings so 123 and '123' agree"""
+    values = pd.Series(keys).dropna()
+    if pd.api.types.is_float_dtype(values):
+        values = values.astype('int64')  # ids read back as float when the column had NULLs
+    values = values.astype(str).to_numpy(dtype=object)
+    return pd.util.hash_array(values, categorize=False)
+
+
+class HyperLogLog:
+    """Dense HyperLogLog over 64-bit hashes (2^PRECISION uint8 registers)"""
+
+    def __init__(self, registers: Optional[np.ndarray] = None):
+        self.registers = np.zeros(REGISTERS, dtype=np.uint8) if registers is None else registers
+
+    @classmethod
+    def from_keys(cls, keys) -> 'HyperLogLog':
+        sketch = cls()
+        sketch.add_hashes(hash_keys(keys))
+        return sketch
+
+    def add_hashes(self, hashes: np.ndarray):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return
+        index = (hashes >> np.uint64(SUFFIX_BITS)).astype(np.int64)
+        suffix = hashes & np.uint64((1 << SUFFIX_BITS) - 1)
+        # rank = position of the first 1 bit in the suffix (SUFFIX_BITS + 1 when it is all zeros);
+        # suffixes fit in 50 bits, so float64 log2 is exact
+        rank = np.full(len(hashes), SUFFIX_BITS + 1, dtype=np.uint8)
+        nonzero = suffix > 0
+        rank[nonzero] = SUFFIX_BITS - np.floor(np.log2(suffix[nonzero].astype(np.float64))).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def cardinality(self) -> int:
+        m = float(REGISTERS)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # linear counting for small sets
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(self.registers.tobytes(), 6)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> 'HyperLogLog':
+        return cls(np.frombuffer(zlib.decompress(blob), dtype=np.uint8).copy())
+
+
+def _settled_on(date_id: int, late_days: int) -> int:
+    """First fetch date (YYYYMMDD) at which date_id counts as settled"""
+    return int((datetime.strptime(str(date_id), '%Y%m%d') + timedelta(days=late_days)).strftime('%Y%m%d'))
+
+
+def generate_sketch_delta_query(start_date, end_date) -> str:
+    """Daily delta for the sketches: distinct (day, city, merchant, passenger) with a completed food order"""
+    return f"""
+-- Sketch delta {start_date} to {end_date}
+SELECT DISTINCT
+    f.date_id,
+    f.city_id,
+    f.merchant_id,
+    f.passenger_id
+FROM ocd_adw.f_food_metrics f
+WHERE f.country_id = 1
+  AND f.city_id != {EXCLUDED_CITY_ID}
+  AND f.date_id >= {start_date}
+  AND f.date_id <= {end_date}
+  AND f.business_type = 0
+  AND f.booking_state_simple = 'COMPLETED'
+"""
+
+
+def load_groups(spec: str) -> Tuple[str, Dict[str, str]]:
+    """NAME=CSV -> (NAME, merchant_id -> group) from a CSV with merchant_id and a group column"""
+    name, _, path = spec.partition('=')
+    df = pd.read_csv(path, dtype=str)
+    group_column = next(c for c in df.columns if c != 'merchant_id')
+    return name, dict(zip(df['merchant_id'].str.strip(), df[group_column].str.strip()))
+
+
+class SketchStore:
+    """SQLite-backed daily HyperLogLog sketches, one row per (metric, scope, scope_id, date_id)"""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, groups: Optional[Dict[str, Dict[str, str]]] = None):
+        self.path = path
+        self.groups = groups or {}
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stale_days(self, start_date, end_date, late_days: int = LATE_DATA_DAYS,
+                   scopes: Optional[Iterable[str]] = None) -> List[int]:
+        """
+        Days in [start_date, end_date] never fetched, or fetched before they had late_days to settle,
+        for the oc / city scopes or any of the group scopes (default: this store's groups)
+        """
+        stale = set(unsettled_days(self.conn, start_date, end_date, late_days))
+        for scope in (self.groups if scopes is None else scopes):
+            fetched = dict(self.conn.execute(
+                'SELECT date_id, fetched_on FROM fetched_group_days WHERE scope = ? AND date_id >= ? AND date_id <= ?',
+                (scope, int(start_date), int(end_date))).fetchall())
+            stale.update(d for d in days_between(start_date, end_date)
+                         if fetched.get(d) is None or _settled_on(d, late_days) > fetched[d])
+        return sorted(stale)
+
+    def _day_sketches(self, day: pd.DataFrame) -> Iterable[Tuple[str, str, str, HyperLogLog]]:
+        """(metric, scope, scope_id, sketch) for one day's delta rows"""
+        oc_day = day[day['city_id'] != EXCLUDED_CITY_ID]
+        scoped = [(*OC_SCOPE, oc_day)]
+        scoped += [('city', str(city_id), rows) for city_id, rows in day.groupby('city_id')]
+        for name, mapping in self.groups.items():
+            group = day['merchant_id'].map(mapping)
+            scoped += [(name, str(group_id), rows) for group_id, rows in day.groupby(group)]
+        for scope, scope_id, rows in scoped:
+            for metric, key in METRIC_KEYS.items():
+                yield metric, scope, scope_id, HyperLogLog.from_keys(rows[key].unique())
+
+    def store_days(self, start_date, end_date, df: pd.DataFrame, fetched_on: Optional[int] = None):
+        """
+        Replace the oc / city and this store's group sketches of every day in [start_date, end_date] with
+        sketches of the delta frame and mark the days fetched; other group scopes are left as they are
+        """
+        df = df.dropna(subset=['date_id', 'city_id'])
+        df = df.assign(date_id=df['date_id'].astype(int), city_id=df['city_id'].astype(int),
+                       merchant_id=df['merchant_id'].astype(str).str.strip().where(df['merchant_id'].notna()))
+        rows = [
+            (metric, scope, scope_id, date_id, sketch.to_bytes())
+            for date_id, day in df.groupby('date_id')
+            for metric, scope, scope_id, sketch in self._day_sketches(day)
+        ]
+        scopes = list(BASE_SCOPES) + list(self.groups)
+        with self.conn:
+            self.conn.execute(f"DELETE FROM sketches WHERE date_id >= ? AND date_id <= ? "
+                              f"AND scope IN ({', '.join('?' * len(scopes))})",
+                              (int(start_date), int(end_date), *scopes))
+            self.conn.executemany('INSERT INTO sketches VALUES (?, ?, ?, ?, ?)', rows)
+            mark_fetched(self.conn, start_date, end_date, fetched_on)
+            fetched_on = fetched_on or int(datetime.now().strftime('%Y%m%d'))
+            self.conn.executemany('INSERT OR REPLACE INTO fetched_group_days (scope, date_id, fetched_on) VALUES (?, ?, ?)',
+                                  [(scope, d, fetched_on) for scope in self.groups
+                                   for d in days_between(start_date, end_date)])
+
+    def refresh(self, ranges: Iterable[Tuple], run: Callable[[str], List[Dict]],
+                late_days: int = LATE_DATA_DAYS) -> int:
+        """Fetch and sketch the stale days of the given (start, end) ranges; returns days fetched"""
+        stale = set()
+        for start, end in ranges:
+            stale.update(self.stale_days(start, end, late_days))
+        for start, end in contiguous_ranges(stale):
+            rows = run(generate_sketch_delta_query(start, end)) or []
+            self.store_days(start, end, pd.DataFrame(rows, columns=['date_id', 'city_id', 'merchant_id', 'passenger_id']))
+        return len(stale)
+
+    def sketch(self, metric: str, start_date, end_date, scope: str = OC_SCOPE[0],
+               scope_id=OC_SCOPE[1]) -> HyperLogLog:
+        """Merged sketch of one metric and scope over [start_date, end_date]"""
+        merged = HyperLogLog()
+        for (blob,) in self.conn.execute(
+                'SELECT registers FROM sketches WHERE metric = ? AND scope = ? AND scope_id = ? '
+                'AND date_id >= ? AND date_id <= ?',
+                (metric, scope, str(scope_id), int(start_date), int(end_date))):
+            merged.merge(HyperLogLog.from_bytes(blob))
+        return merged
+
+    def distinct_count(self, metric: str, start_date, end_date, scope: str = OC_SCOPE[0],
+                       scope_id=OC_SCOPE[1]) -> int:
+        return self.sketch(metric, start_date, end_date, scope, scope_id).cardinality()
+
+    def distinct_columns(self, dates: Dict, city_id: Optional[int] = None) -> Dict[str, int]:
+        """{prefix}_eaters for the week windows and {month}_mtm for the month windows of a get_week_dates() dict"""
+        scope = OC_SCOPE if city_id is None else ('city', str(int(city_id)))
+        columns = {f'{prefix}_eaters': self.distinct_count('eaters', dates[f'{key}_start'], dates[f'{key}_end'], *scope)
+                   for _, key, prefix in WEEK_WINDOWS}
+        columns.update({f'{key}_mtm': self.distinct_count('merchants', dates[f'{key}_start'], dates[f'{key}_end'], *scope)
+                        for _, key in MONTH_WINDOWS})
+        return columns
+
+
+def sketch_ranges(dates: Dict) -> List[Tuple[str, str]]:
+    """(start, end) of every week and month window distinct_columns reads"""
+    return ([(dates[f'{key}_start'], dates[f'{key}_end']) for _, key, _ in WEEK_WINDOWS]
+            + [(dates[f'{key}_start'], dates[f'{key}_end']) for _, key in MONTH_WINDOWS])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain and query the HyperLogLog distinct-count sketch store')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='SQLite file (default: %(default)s)')
+    parser.add_argument('--refresh', nargs=2, metavar=('START', 'END'),
+                        help='Fetch and sketch missing or unsettled days in START..END via the configured QUERY_BACKEND')
+    parser.add_argument('--late-days', type=int, default=LATE_DATA_DAYS,
+                        help='Refetch days fetched less than this many days after they ended (default: %(default)s)')
+    parser.add_argument('--groups', action='append', default=[], metavar='NAME=CSV',
+                        help='Also sketch per merchant group (CSV: merchant_id, group), e.g. area=merchant_areas.csv')
+    parser.add_argument('--count', nargs=2, metavar=('START', 'END'), help='Print a distinct count for START..END')
+    parser.add_argument('--metric', choices=sorted(METRIC_KEYS), default='eaters')
+    parser.add_argument('--city', type=int, help='City for --count (default: all OC cities)')
+    parser.add_argument('--scope', help='Merchant group scope for --count (with --scope-id)')
+    parser.add_argument('--scope-id', help='Group id for --scope')
+    args = parser.parse_args()
+
+    groups = dict(load_groups(spec) for spec in args.groups)
+    with SketchStore(args.db, groups) as store:
+        if args.refresh:
+            from query_executor import run_query
+            fetched = store.refresh([tuple(args.refresh)], run_query, args.late_days)
+            print(f'✅ {fetched} day(s) sketched into {args.db}')
+        if args.count:
+            if args.scope:
+                scope = (args.scope, args.scope_id)
+            elif args.city is not None:
+                scope = ('city', str(args.city))
+            else:
+                scope = OC_SCOPE
+            start, end = args.count
+            if store.stale_days(start, end, late_days=0, scopes=[args.scope] if args.scope else []):
+                print(f'⚠️  Some days in {start}-{end} are not sketched yet; run --refresh first')
+                sys.exit(1)
+            print(f'{args.metric} {start}-{end} ({scope[0]} {scope[1]}): '
+                  f'~{store.distinct_count(args.metric, start, end, *scope):,}')
+        if not args.refresh and not args.count:
+            parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
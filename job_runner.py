@@ -0,0 +1,240 @@
+"""
+Bounded-Concurrency Query Job Runner
+Runs many independent queries (one per AM / MGS / city ...) in parallel with a
+fixed number of workers, per-job retry with exponential backoff and a per-attempt
+timeout. Each finished job is appended to one JSON Lines result store as soon as
+it completes, so an interrupted run resumes where it stopped: jobs already
+stored as ok with the same query (by hash) are skipped on the next run, and a
+job whose query changed runs again.
+
+Only timeouts and transient connection errors are retried; anything else (a SQL
+error, a missing client or PRESTO_HOST) fails the job on its first attempt. A
+timed-out query can't be cancelled, so it keeps its worker slot (and its
+connection) until it actually returns; no more than `workers` queries ever run
+at once.
+
+Decimal values (Presto sums) are stored tagged and read back as Decimal, so
+resumed rows merge with fresh ones.
+
+Usage:
+    from job_runner import Job, run_jobs
+    jobs = [Job('Darren', query_darren), Job('Suki', query_suki)]
+    results = run_jobs(jobs, store_path='revenue_breakdown_results.jsonl')
+    results['Darren']  # -> list of row dicts
+
+    python job_runner.py revenue_breakdown_results.jsonl   # summarise a result store
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import threading
+from decimal import Decimal
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_WORKERS = int(os.getenv('JOB_RUNNER_WORKERS', '8'))
+DEFAULT_RETRIES = int(os.getenv('JOB_RUNNER_RETRIES', '3'))
+DEFAULT_TIMEOUT_S = float(os.getenv('JOB_RUNNER_TIMEOUT_S', '900'))
+DEFAULT_BACKOFF_S = 2.0
+
+
+@dataclass
+class Job:
+    job_id: str
+    query: str
+    meta: Dict = field(default_factory=dict)
+
+
+class JobTimeout(Exception):
+    pass
+
+
+TRANSIENT_ERRORS = (JobTimeout, TimeoutError, ConnectionError)
+try:
+    import requests  # presto-python-client talks HTTP through requests
+    TRANSIENT_ERRORS += (requests.ConnectionError, requests.Timeout)
+except ImportError:
+    pass
+
+
+def is_transient(error: Exception) -> bool:
+    """Worth retrying: timeouts, dropped connections, and Presto running out of cluster resources"""
+    return isinstance(error, TRANSIENT_ERRORS) or getattr(error, 'error_type', None) == 'INSUFFICIENT_RESOURCES'
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()[:16]
+
+
+def _call_with_timeout(fn: Callable, arg, timeout_s: Optional[float], slots: Optional[threading.Semaphore] = None):
+    """
+    Run fn(arg) on a daemon thread and wait at most timeout_s.
+    A timed-out call can't be killed; it is abandoned and its result ignored, but it holds
+    its slot (if given) until it really finishes, so abandoned calls still count as running.
+    """
+    if slots is not None:
+        slots.acquire()
+    if not timeout_s:
+        try:
+            return fn(arg)
+        finally:
+            if slots is not None:
+                slots.release()
+    outcome = {}
+
+    def target():
+        try:
+            outcome['value'] = fn(arg)
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            if slots is not None:
+                slots.release()
+
+    t = threading.Thread(target=target, daemon=True)
+    t.start()
+    t.join(timeout_s)
+    if t.is_alive():
+        raise JobTimeout(f'timed out after {timeout_s:.0f}s')
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['value']
+
+
+DECIMAL_TAG = '$decimal'
+
+
+def _encode(value):
+    # Decimal keeps its exact value and type through the store; anything else unknown is stored as text
+    if isinstance(value, Decimal):
+        return {DECIMAL_TAG: str(value)}
+    return str(value)
+
+
+def _decode(obj: Dict):
+    if len(obj) == 1 and DECIMAL_TAG in obj:
+        return Decimal(obj[DECIMAL_TAG])
+    return obj
+
+
+class ResultStore:
+    """Append-only JSON Lines file: one record per finished job, last record per job wins"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict]:
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line, object_hook=_decode)
+                except ValueError:
+                    continue  # partial line from an interrupted write
+                records[record['job_id']] = record
+        return records
+
+    def append(self, record: Dict):
+        line = json.dumps(record, default=_encode)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def run_jobs(jobs: List[Job], run: Callable[[str], List[Dict]] = None, store_path: Optional[str] = None,
+             workers: int = DEFAULT_WORKERS, retries: int = DEFAULT_RETRIES,
+             timeout_s: Optional[float] = DEFAULT_TIMEOUT_S, backoff_s: float = DEFAULT_BACKOFF_S,
+             resume: bool = True) -> Dict[str, List[Dict]]:
+    """
+    Execute jobs with at most `workers` in flight; returns job_id -> rows for every job that succeeded.
+    run defaults to query_executor.run_query (configured backend, cached).
+    """
+    if run is None:
+        from query_executor import run_query
+        run = run_query
+
+    store = ResultStore(store_path) if store_path else None
+    done = store.load() if (store and resume) else {}
+    hashes = {job.job_id: query_hash(job.query) for job in jobs}
+    # a stored result counts only for the same query: edited SQL or re-chunked portfolios run again
+    results = {job_id: r['rows'] for job_id, r in done.items()
+               if r.get('status') == 'ok' and job_id in hashes and r.get('query_hash') == hashes[job_id]}
+    pending = [job for job in jobs if job.job_id not in results]
+
+    total = len(jobs)
+    finished = total - len(pending)
+    if finished:
+        print(f"⏭️  Resuming: {finished}/{total} job(s) already in {store_path}")
+    if not pending:
+        return results
+
+    progress_lock = threading.Lock()
+    # one slot per running query, held past a timeout until the abandoned call returns
+    slots = threading.Semaphore(max(1, workers))
+    t_start = time.perf_counter()
+
+    def attempt(job: Job) -> Dict:
+        t0 = time.perf_counter()
+        error = None
+        n = 0
+        for n in range(1, retries + 2):
+            try:
+                rows = _call_with_timeout(run, job.query, timeout_s, slots)
+                return {'job_id': job.job_id, 'status': 'ok', 'attempts': n, 'rows': rows or [],
+                        'query_hash': hashes[job.job_id], 'elapsed_s': round(time.perf_counter() - t0, 2),
+                        'meta': job.meta}
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                if not is_transient(e):
+                    break
+                if n <= retries:
+                    delay = backoff_s * (2 ** (n - 1)) * (1 + random.random() * 0.25)
+                    print(f"   ↻ {job.job_id}: attempt {n} failed ({error}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+        return {'job_id': job.job_id, 'status': 'failed', 'attempts': n, 'error': error,
+                'query_hash': hashes[job.job_id], 'elapsed_s': round(time.perf_counter() - t0, 2),
+                'meta': job.meta}
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as pool:
+        futures = {pool.submit(attempt, job): job for job in pending}
+        for future in as_completed(futures):
+            record = future.result()
+            if store:
+                store.append(record)
+            with progress_lock:
+                finished += 1
+                if record['status'] == 'ok':
+                    results[record['job_id']] = record['rows']
+                    print(f"[{finished}/{total}] ✅ {record['job_id']}: {len(record['rows'])} row(s) "
+                          f"in {record['elapsed_s']:.1f}s")
+                else:
+                    failed.append(record['job_id'])
+                    print(f"[{finished}/{total}] ❌ {record['job_id']}: {record['error']}")
+
+    print(f"Finished {total - len(failed)}/{total} job(s) in {time.perf_counter() - t_start:.1f}s"
+          + (f" - failed: {', '.join(failed)} (rerun to retry)" if failed else ''))
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('Usage: python job_runner.py RESULT_STORE.jsonl')
+        sys.exit(1)
+    for job_id, record in sorted(ResultStore(sys.argv[1]).load().items()):
+        status = '✅' if record.get('status') == 'ok' else '❌'
+        detail = f"{len(record.get('rows', []))} row(s)" if record.get('status') == 'ok' else record.get('error')
+        print(f"{status} {job_id}: {detail} ({record.get('attempts')} attempt(s), {record.get('elapsed_s')}s)")
@@ -2,8 +2,9 @@
 Parse merchant query results and create CSV file
 """
 
-import csv
-import re
+import io
+
+from pipe_table import table_to_csv
 
 # Query result text (from the MCP tool output)
 query_result = """| merchant_id_nk | merchant_name | area_name | halal_status | cuisine_names | segment | custom_segment | am_name | last_order_date | merchant_status |
@@ -23,41 +24,11 @@ def parse_table_to_csv(query_output_text, output_filename='penang_mainland_merch
     """
     Parse the table-formatted query output and create CSV file
     """
-    lines = query_output_text.strip().split('\n')
-    
-    # Find header row
-    header_line_idx = None
-    for i, line in enumerate(lines):
-        if 'merchant_id_nk' in line and 'merchant_name' in line:
-            header_line_idx = i
-            break
-    
-    if header_line_idx is None:
-        raise ValueError("Could not find header row in query output")
-    
-    # Parse headers
-    header_line = lines[header_line_idx]
-    headers = [h.strip() for h in header_line.split('|')[1:-1]]
-    
-    # Parse data rows (skip header and separator line)
-    data_start = header_line_idx + 2
-    data_rows = []
-    
-    for line in lines[data_start:]:
-        if line.strip() and not line.startswith('|---') and '*Execution time' not in line:
-            if line.startswith('|'):
-                cols = [c.strip() for c in line.split('|')[1:-1]]
-                if len(cols) == len(headers):
-                    data_rows.append(cols)
-    
-    # Write to CSV
-    with open(output_filename, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(headers)
-        writer.writerows(data_rows)
+    _, row_count = table_to_csv(io.StringIO(query_output_text), output_filename,
+                                required_columns=['merchant_id_nk', 'merchant_name'])
     
-    print(f"✅ Successfully created {output_filename} with {len(data_rows)} merchants")
-    return len(data_rows)
+    print(f"✅ Successfully created {output_filename} with {row_count} merchants")
+    return row_count
 
 if __name__ == "__main__":
     # Read the full query result from a file or paste it here
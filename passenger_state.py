@@ -0,0 +1,265 @@
+"""
+Local Passenger State Store for New Pax
+Keeps first_order_date / last_order_date per passenger and city in SQLite,
+updated incrementally from daily deltas of completed food orders, so New Pax
+for any week and city is an index lookup instead of a multi-year rescan of
+ocd_adw.f_food_metrics.
+
+New Pax definition (same as generate_new_pax_subquery): a passenger who
+completed an order in the window and whose first order was within the window,
+or whose last order before the window is older than window_start - 36500
+(date_id arithmetic).
+
+Every time a passenger orders on a day whose previous order is that old (or
+who has never ordered) an acquisition row is written with the previous order
+date. A passenger is New Pax for [start, end] exactly when they have an
+acquisition row in the window whose prev_order_date is NULL or older than
+start - 36500. The store must be backfilled from the start of order history
+once; after that, ingest each new day as it lands.
+
+Usage:
+    python passenger_state.py --delta-query 20251101 20251130    # print the daily delta SQL
+    python passenger_state.py --ingest delta_2025_11.csv          # date_id, city_id, passenger_id
+    python passenger_state.py --new-pax 20251110 20251116 --city 13
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+DEFAULT_DB_PATH = os.getenv('PASSENGER_STATE_DB', 'passenger_state.db')
+
+# Scope key for "all OC cities" (every city except Klang Valley, city_id 1)
+OC_SCOPE = 0
+EXCLUDED_CITY_ID = 1
+
+# Matches `date_id < week_start - 36500` in the SQL definition
+REACTIVATION_GAP = 36500
+
+# (new pax column prefix, dates key prefix) - same-week-last-year is reported as ytd_avg_*
+NEW_PAX_WINDOWS = [
+    ('this_week', 'this_week'),
+    ('same_week_last_month', 'same_week_last_month'),
+    ('ytd_avg', 'same_week_last_year'),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS passenger_state (
+    passenger_id INTEGER NOT NULL,
+    city_id INTEGER NOT NULL,
+    first_order_date INTEGER NOT NULL,
+    last_order_date INTEGER NOT NULL,
+    PRIMARY KEY (passenger_id, city_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS acquisition (
+    city_id INTEGER NOT NULL,
+    date_id INTEGER NOT NULL,
+    passenger_id INTEGER NOT NULL,
+    prev_order_date INTEGER,
+    PRIMARY KEY (city_id, date_id, passenger_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+
+def generate_passenger_delta_query(start_date: str, end_date: str) -> str:
+    """Daily delta for ingest: one row per passenger, city and day with a completed food order"""
+    return f"""
+-- Passenger daily delta {start_date} to {end_date}
+SELECT DISTINCT
+    f.date_id,
+    f.city_id,
+    f.passenger_id
+FROM ocd_adw.f_food_metrics f
+WHERE f.country_id = 1
+  AND f.date_id >= {start_date}
+  AND f.date_id <= {end_date}
+  AND f.business_type = 0
+  AND f.booking_state_simple = 'COMPLETED'
+  AND f.passenger_id IS NOT NULL
+ORDER BY f.date_id
+"""
+
+
+class PassengerStateStore:
+    """SQLite-backed passenger recency index, one row per (passenger_id, city_id)"""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _meta(self, key: str) -> Optional[int]:
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: int):
+        self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    @property
+    def first_ingested_date(self) -> Optional[int]:
+        return self._meta('first_ingested_date')
+
+    @property
+    def last_ingested_date(self) -> Optional[int]:
+        return self._meta('last_ingested_date')
+
+    def covers(self, end_date, start_date=None) -> bool:
+        """
+        True once the store has ingested every day up to end_date and, for a window starting at
+        start_date, far enough back to see orders before start_date - REACTIVATION_GAP
+        """
+        first, last = self.first_ingested_date, self.last_ingested_date
+        if last is None or last < int(end_date):
+            return False
+        return start_date is None or first <= int(start_date) - REACTIVATION_GAP
+
+    def covers_windows(self, dates: Dict) -> bool:
+        """covers() for every New Pax window of a get_week_dates() dict, the YTD (same week last year) one included"""
+        return self.covers(max(int(dates[f'{key}_end']) for _, key in NEW_PAX_WINDOWS),
+                           min(int(dates[f'{key}_start']) for _, key in NEW_PAX_WINDOWS))
+
+    def ingest_day(self, date_id, rows: Iterable[Sequence]) -> int:
+        """
+        Apply one day's delta of (city_id, passenger_id) pairs.
+        Days must arrive in order; a day at or before the last ingested one is skipped.
+        Returns the number of passenger scopes touched.
+        """
+        date_id = int(date_id)
+        last = self.last_ingested_date
+        if last is not None and date_id <= last:
+            return 0
+
+        scoped = set()
+        for city_id, passenger_id in rows:
+            city_id, passenger_id = int(city_id), int(passenger_id)
+            scoped.add((city_id, passenger_id))
+            if city_id != EXCLUDED_CITY_ID:
+                scoped.add((OC_SCOPE, passenger_id))
+
+        with self.conn:
+            self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS day_delta (city_id INTEGER, passenger_id INTEGER)')
+            self.conn.execute('DELETE FROM day_delta')
+            self.conn.executemany('INSERT INTO day_delta VALUES (?, ?)', scoped)
+            self.conn.execute("""
+                INSERT INTO acquisition (city_id, date_id, passenger_id, prev_order_date)
+                SELECT d.city_id, ?, d.passenger_id, s.last_order_date
+                FROM day_delta d
+                LEFT JOIN passenger_state s
+                  ON s.passenger_id = d.passenger_id AND s.city_id = d.city_id
+                WHERE s.last_order_date IS NULL OR s.last_order_date < ? - ?
+            """, (date_id, date_id, REACTIVATION_GAP))
+            self.conn.execute("""
+                INSERT INTO passenger_state (passenger_id, city_id, first_order_date, last_order_date)
+                SELECT passenger_id, city_id, ?, ? FROM day_delta WHERE true
+                ON CONFLICT (passenger_id, city_id) DO UPDATE SET last_order_date = excluded.last_order_date
+            """, (date_id, date_id))
+            if self.first_ingested_date is None:
+                self._set_meta('first_ingested_date', date_id)
+            self._set_meta('last_ingested_date', date_id)
+        return len(scoped)
+
+    def ingest_frame(self, df: pd.DataFrame) -> int:
+        """Ingest a delta frame with date_id, city_id, passenger_id columns, oldest day first"""
+        df = df.dropna(subset=['date_id', 'city_id', 'passenger_id'])
+        total_days = 0
+        for date_id, day in df.groupby(df['date_id'].astype(int), sort=True):
+            if self.ingest_day(date_id, day[['city_id', 'passenger_id']].itertuples(index=False)):
+                total_days += 1
+        return total_days
+
+    def ingest_csv(self, path: str) -> int:
+        return self.ingest_frame(pd.read_csv(path, usecols=['date_id', 'city_id', 'passenger_id']))
+
+    def new_pax_count(self, start_date, end_date, city_id: Optional[int] = None) -> int:
+        """New Pax for [start_date, end_date] in one city, or across all OC cities when city_id is None"""
+        scope = OC_SCOPE if city_id is None else int(city_id)
+        start_date, end_date = int(start_date), int(end_date)
+        row = self.conn.execute("""
+            SELECT COUNT(DISTINCT passenger_id)
+            FROM acquisition
+            WHERE city_id = ?
+              AND date_id >= ? AND date_id <= ?
+              AND (prev_order_date IS NULL OR prev_order_date < ? - ?)
+        """, (scope, start_date, end_date, start_date, REACTIVATION_GAP)).fetchone()
+        return row[0]
+
+    def new_pax_by_city(self, start_date, end_date) -> Dict[int, int]:
+        """New Pax per city (OC cities only) for [start_date, end_date]"""
+        start_date, end_date = int(start_date), int(end_date)
+        rows = self.conn.execute("""
+            SELECT city_id, COUNT(DISTINCT passenger_id)
+            FROM acquisition
+            WHERE city_id NOT IN (?, ?)
+              AND date_id >= ? AND date_id <= ?
+              AND (prev_order_date IS NULL OR prev_order_date < ? - ?)
+            GROUP BY city_id
+        """, (OC_SCOPE, EXCLUDED_CITY_ID, start_date, end_date, start_date, REACTIVATION_GAP)).fetchall()
+        return dict(rows)
+
+    def new_pax_columns(self, dates: Dict, city_id: Optional[int] = None) -> Dict[str, int]:
+        """this_week_new_pax / same_week_last_month_new_pax / ytd_avg_new_pax for a get_week_dates() dict"""
+        return {
+            f'{prefix}_new_pax': self.new_pax_count(dates[f'{key}_start'], dates[f'{key}_end'], city_id)
+            for prefix, key in NEW_PAX_WINDOWS
+        }
+
+
+def fill_new_pax(rows: List[Dict], dates: Dict, store: PassengerStateStore, per_city: bool = False) -> List[Dict]:
+    """Add the New Pax columns to weekly query rows (OC overall, or per city keyed by city_id)"""
+    for row in rows:
+        city_id = int(row['city_id']) if per_city else None
+        row.update(store.new_pax_columns(dates, city_id))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the local passenger state store used for New Pax')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='SQLite file (default: %(default)s)')
+    parser.add_argument('--delta-query', nargs=2, metavar=('START', 'END'),
+                        help='Print the Presto query that extracts the daily delta for START..END')
+    parser.add_argument('--ingest', nargs='+', metavar='CSV',
+                        help='Ingest delta CSV files (date_id, city_id, passenger_id), oldest first')
+    parser.add_argument('--new-pax', nargs=2, metavar=('START', 'END'), help='Print New Pax for START..END')
+    parser.add_argument('--city', type=int, help='City for --new-pax (default: all OC cities)')
+    args = parser.parse_args()
+
+    if args.delta_query:
+        print(generate_passenger_delta_query(*args.delta_query))
+        return
+
+    with PassengerStateStore(args.db) as store:
+        for path in args.ingest or []:
+            days = store.ingest_csv(path)
+            print(f'✅ {path}: {days} new day(s) ingested')
+        if args.ingest:
+            print(f'   Store covers {store.first_ingested_date} to {store.last_ingested_date}')
+
+        if args.new_pax:
+            start, end = args.new_pax
+            if not store.covers(end, start):
+                print(f'⚠️  Store covers {store.first_ingested_date} to {store.last_ingested_date}; New Pax for '
+                      f'{start}-{end} needs {int(start) - REACTIVATION_GAP} through {end} ingested first')
+                sys.exit(1)
+            scope = f'city {args.city}' if args.city is not None else 'OC cities'
+            print(f'New Pax {start}-{end} ({scope}): {store.new_pax_count(start, end, args.city):,}')
+
+
+if __name__ == '__main__':
+    main()
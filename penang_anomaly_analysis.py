@@ -4,9 +4,10 @@ Analyzes daily GMV & Orders trends, identifies anomalies, and suggests root caus
 """
 
 import json
-from datetime import datetime
 from typing import Dict, List, Tuple
 
+from calendar_dim import get_calendar, MY_PUBLIC_HOLIDAYS, MONTH_ABBRS, WEEKDAY_NAMES
+
 # Query results from MCP
 data = [
     {'period': 'Same Week Last Year', 'date_id': 20241110, 'daily_orders': 37251, 'daily_completed_orders': 34860, 'daily_gmv': 1314059.39, 'daily_wtu': 29487, 'avg_basket_size': 33.22, 'daily_promo_expense': 121696.75, 'daily_promo_orders': 17163, 'daily_sessions': 33301, 'daily_active_merchants': 3597, 'promo_penetration_pct': 49.2, 'cops': 1.047},
@@ -50,16 +51,13 @@ def identify_anomalies(this_week_data: List[Dict], last_year_data: List[Dict]) -
     """Identify anomalies by comparing day-by-day"""
     anomalies = []
     
-    # Create lookup by day of week (0=Monday, 6=Sunday)
-    last_year_by_dow = {}
-    for row in last_year_data:
-        date_obj = datetime.strptime(str(row['date_id']), '%Y%m%d')
-        dow = date_obj.weekday()
-        last_year_by_dow[dow] = row
+    # Create lookup by day of week (0=Monday, 6=Sunday), one calendar lookup per period
+    calendar = get_calendar()
+    last_year_dows = calendar.weekday([row['date_id'] for row in last_year_data]).tolist()
+    this_week_dows = calendar.weekday([row['date_id'] for row in this_week_data]).tolist()
+    last_year_by_dow = dict(zip(last_year_dows, last_year_data))
     
-    for this_row in this_week_data:
-        date_obj = datetime.strptime(str(this_row['date_id']), '%Y%m%d')
-        dow = date_obj.weekday()
+    for this_row, dow in zip(this_week_data, this_week_dows):
         last_row = last_year_by_dow.get(dow)
         
         if not last_row:
@@ -109,7 +107,11 @@ def identify_anomalies(this_week_data: List[Dict], last_year_data: List[Dict]) -
         if is_anomaly:
             anomalies.append({
                 'date': format_date(this_row['date_id']),
-                'day_of_week': date_obj.strftime('%A'),
+                'day_of_week': WEEKDAY_NAMES[dow],
+                'holidays': {
+                    'this_week': MY_PUBLIC_HOLIDAYS.get(int(this_row['date_id'])),
+                    'last_year': MY_PUBLIC_HOLIDAYS.get(int(last_row['date_id']))
+                },
                 'reasons': anomaly_reasons,
                 'this_week': this_row,
                 'last_year': last_row,
@@ -186,6 +188,16 @@ def causal_inference_analysis(anomalies: List[Dict]) -> List[Dict]:
             insights.append("Promo expense up significantly but orders not responding - ROI issue")
             confidence.append("HIGH")
         
+        # Causal Factor 7: Public holiday on only one side of the comparison
+        holidays = anomaly['holidays']
+        if holidays['this_week'] != holidays['last_year']:
+            if holidays['this_week']:
+                insights.append(f"Public holiday this year ({holidays['this_week']}) - calendar effect, not a trend")
+                confidence.append("HIGH")
+            if holidays['last_year']:
+                insights.append(f"Last year's comparison day was a public holiday ({holidays['last_year']}) - calendar effect")
+                confidence.append("HIGH")
+        
         if insights:
             causal_insights.append({
                 'date': anomaly['date'],
@@ -253,18 +265,19 @@ def generate_report():
     print()
     
     # Day-by-day comparison
+    weekdays = get_calendar().weekday([row['date_id'] for row in this_week_data]).tolist()
     for i, this_row in enumerate(this_week_data):
         last_row = last_year_data[i] if i < len(last_year_data) else None
         if not last_row:
             continue
         
-        date_obj = datetime.strptime(str(this_row['date_id']), '%Y%m%d')
         orders_yoy = calculate_yoy_growth(this_row, last_row, 'daily_completed_orders')
         gmv_yoy = calculate_yoy_growth(this_row, last_row, 'daily_gmv')
         basket_yoy = calculate_yoy_growth(this_row, last_row, 'avg_basket_size')
         sessions_yoy = calculate_yoy_growth(this_row, last_row, 'daily_sessions')
         
-        print(f"{date_obj.strftime('%A, %b %d')} ({format_date(this_row['date_id'])})")
+        date_id = int(this_row['date_id'])
+        print(f"{WEEKDAY_NAMES[weekdays[i]]}, {MONTH_ABBRS[date_id // 100 % 100 - 1]} {date_id % 100:02d} ({format_date(date_id)})")
         print(f"  This Week: Orders={format_number(this_row['daily_completed_orders'])}, GMV={format_number(this_row['daily_gmv'])}, Basket={this_row['avg_basket_size']:.2f}")
         print(f"  Last Year: Orders={format_number(last_row['daily_completed_orders'])}, GMV={format_number(last_row['daily_gmv'])}, Basket={last_row['avg_basket_size']:.2f}")
         print(f"  YoY: Orders={orders_yoy:+.1f}%, GMV={gmv_yoy:+.1f}%, Basket={basket_yoy:+.1f}%, Sessions={sessions_yoy:+.1f}%")
@@ -5,36 +5,14 @@ Identify anomalies and perform causal inference analysis
 """
 
 import sys
-from datetime import datetime, timedelta
-from calendar import monthrange
+from datetime import datetime
+
+from calendar_dim import get_calendar
 
 def get_week_dates():
     """Get date ranges for last completed week and same week last year"""
-    today = datetime.now()
-    
-    # Calculate last completed week (Monday to Sunday)
-    yesterday = today - timedelta(days=1)
-    days_since_sunday = (yesterday.weekday() + 1) % 7
-    if days_since_sunday == 0:
-        last_week_end = yesterday
-    else:
-        last_week_end = yesterday - timedelta(days=days_since_sunday)
-    
-    last_week_start = last_week_end - timedelta(days=6)
-    
-    # Same week last year
-    same_week_last_year_start = last_week_start.replace(year=last_week_start.year - 1)
-    same_week_last_year_end = last_week_end.replace(year=last_week_end.year - 1)
-    
-    def format_date(d):
-        return d.strftime('%Y%m%d')
-    
-    return {
-        'this_week_start': format_date(last_week_start),
-        'this_week_end': format_date(last_week_end),
-        'same_week_last_year_start': format_date(same_week_last_year_start),
-        'same_week_last_year_end': format_date(same_week_last_year_end)
-    }
+    # Last completed Monday-Sunday week from the precomputed calendar dimension (calendar_dim.py)
+    return get_calendar().last_completed_week(datetime.now())
 
 def generate_penang_daily_query(dates):
     """Generate SQL query for daily Penang GMV and orders for both periods"""
@@ -0,0 +1,374 @@
+"""
+Streaming Pipe-Table Parser
+Reads markdown / MCP tool result tables
+
+    | month_id | merchant_id_nk | merchant_gmv |
+    | --- | --- | --- |
+    | 202501 | 1-CZEJRAMXLU6JAT | 1234.5 |
+
+line by line and writes them out in chunks, so a multi-hundred-MB result dump
+imports with constant memory instead of readlines() + a list of dicts.
+
+- the header is the first pipe row containing every required column (or, with
+  none given, the first pipe row followed by a | --- | separator)
+- None / NULL / null / NaN / empty cells become nulls
+- column dtypes (int / float / bool / string) are inferred from the first chunk;
+  a later value that doesn't fit widens the column (int -> float -> string,
+  bool -> string) and the rows read so far are recast, so nothing is lost
+  (read_pipe_table / table_to_parquet; iter_table_chunks can't recast chunks
+  already yielded). Pass dtypes= to pin a column, e.g. numeric-looking ids as
+  'string' or amounts as 'float'; values that don't fit a pinned dtype become
+  null and are counted
+- rows with the wrong number of cells are skipped and counted
+- the table ends at the *Execution time footer or the first non-pipe line
+
+Sources are a file path, an open text file or any iterable of lines
+(io.StringIO(text) for pasted output).
+
+Usage:
+    columns, rows = table_to_csv('dump.txt', 'out.csv', required_columns=['merchant_id_nk'])
+    table_to_parquet('dump.txt', 'out.parquet')
+    df = read_pipe_table('dump.txt', columns=['month_id', 'merchant_gmv'])
+    for chunk in iter_table_chunks('dump.txt'): ...
+
+    python pipe_table.py dump.txt out.csv|out.parquet [--require month_id merchant_id_nk]
+"""
+
+import os
+import re
+import csv
+import argparse
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+CHUNK_ROWS = int(os.getenv('PIPE_TABLE_CHUNK_ROWS', '100000'))
+
+NULL_TOKENS = frozenset({'', 'None', 'NULL', 'null', 'NaN', 'nan', '<null>'})
+_NULL_SET = pa.array(sorted(NULL_TOKENS), pa.string())
+TABLE_END_MARKER = '*Execution time'
+SEPARATOR_CELL_RE = re.compile(r'^:?-+:?$')
+SEPARATOR_ROW_PATTERN = r'\|(?:\s*:?-+:?\s*\|)+'
+INT_RE = re.compile(r'^[+-]?(?:0|[1-9]\d*)$')
+# no leading zeros, so zero-padded ids stay strings
+FLOAT_RE = re.compile(r'^[+-]?(?:(?:0|[1-9]\d*)(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?$')
+BOOL_VALUES = {'true': True, 'false': False, 'True': True, 'False': False}
+WIDER_DTYPE = {'int': 'float', 'float': 'string', 'bool': 'string'}
+ARROW_TYPES = {'int': pa.int64(), 'float': pa.float64(), 'bool': pa.bool_(), 'string': pa.string()}
+
+
+def split_row(line: str) -> Optional[List[str]]:
+    """Cells of a | a | b | row (stripped), or None if the line isn't a pipe row"""
+    line = line.strip()
+    if not line.startswith('|'):
+        return None
+    cells = line[1:-1] if line.endswith('|') and len(line) > 1 else line[1:]
+    return [cell.strip() for cell in cells.split('|')]
+
+
+def is_separator(cells: Sequence[str]) -> bool:
+    return bool(cells) and all(SEPARATOR_CELL_RE.match(cell) for cell in cells)
+
+
+@contextmanager
+def _open_lines(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'r', encoding='utf-8', errors='replace') as f:
+            yield f
+    else:
+        yield source
+
+
+class PipeTableReader:
+    """
+    Streams one pipe table from a source. columns is set once the header is found;
+    string_chunks() then yields the body as DataFrames of stripped cell strings
+    (NaN for nulls). Only the header search runs line by line in Python - the body
+    is read by pandas' C parser and checked / split with vectorized string ops per
+    chunk, which is what keeps large dumps near disk speed.
+    """
+
+    def __init__(self, lines: Iterable[str], required_columns: Sequence[str] = ()):
+        self._source = lines
+        self._lines = iter(lines)
+        self._buffer = ''
+        self.skipped = 0
+        self.required_columns = list(required_columns)
+        self.columns = self._find_header()
+
+    def _find_header(self) -> List[str]:
+        candidate = None
+        for line in self._lines:
+            cells = split_row(line)
+            if cells is None:
+                candidate = None
+                continue
+            if self.required_columns:
+                if all(col in cells for col in self.required_columns):
+                    return cells
+            elif candidate is not None and is_separator(cells):
+                return candidate
+            elif not is_separator(cells):
+                candidate = cells
+        wanted = ', '.join(self.required_columns) or 'a | --- | separated header'
+        raise ValueError(f'Could not find header row ({wanted}) in query output')
+
+    def read(self, size: int = -1) -> str:
+        """File-like read() over the rest of the source, for pd.read_csv"""
+        if size is None or size < 0:
+            data = self._buffer + ''.join(self._lines)
+            self._buffer = ''
+            return data
+        if hasattr(self._source, 'read') and not self._buffer:
+            return self._source.read(size)
+        parts = [self._buffer]
+        have = len(self._buffer)
+        for line in self._lines:
+            parts.append(line if line.endswith('\n') else line + '\n')
+            have += len(parts[-1])
+            if have >= size:
+                break
+        data = ''.join(parts)
+        data, self._buffer = data[:size], data[size:]
+        return data
+
+    def string_chunks(self, chunk_rows: int = CHUNK_ROWS,
+                      columns: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+        keep = list(columns) if columns else list(self.columns)
+        missing = [col for col in keep if col not in self.columns]
+        if missing:
+            raise ValueError(f"Columns not in table: {', '.join(missing)}")
+        width = len(self.columns)
+        positions = [self.columns.index(col) for col in keep]
+        try:
+            # one column of whole lines (\x1f never appears in query output); checks and splitting are vectorized
+            parts = pd.read_csv(self, sep='\x1f', header=None, names=['line'], dtype=str, na_filter=False,
+                                quoting=csv.QUOTE_NONE, engine='c', skip_blank_lines=True, on_bad_lines='skip',
+                                chunksize=chunk_rows)
+            for part in parts:
+                lines = part['line'].str.strip()
+                # the table ends at the first line that isn't a pipe row (e.g. *Execution time)
+                ended = ~lines.str.startswith('|') | lines.str.contains(TABLE_END_MARKER, regex=False)
+                if ended.any():
+                    lines = lines.iloc[:ended.to_numpy().argmax()]
+                lines = lines.where(lines.str.endswith('|') & (lines.str.len() > 1), lines + '|')
+                wrong_width = lines.str.count(r'\|') != width + 1
+                if wrong_width.any():
+                    self.skipped += int(wrong_width.sum())
+                    lines = lines[~wrong_width]
+                # every remaining row has exactly width cells, so column j is every width-th flattened cell
+                flat = pc.list_flatten(pc.split_pattern(pa.array(lines.str.slice(1, -1), pa.string()), '|'))
+                chunk = pd.DataFrame(index=range(len(lines)))
+                for col, pos in zip(keep, positions):
+                    values = pc.utf8_trim_whitespace(flat.take(pa.array(np.arange(pos, len(flat), width))))
+                    values = pc.if_else(pc.is_in(values, value_set=_NULL_SET), pa.scalar(None, pa.string()), values)
+                    chunk[col] = values.to_pandas()
+                separator = lines.str.fullmatch(SEPARATOR_ROW_PATTERN).to_numpy()
+                if separator.any():
+                    chunk = chunk[~separator].reset_index(drop=True)
+                yield chunk
+                if ended.any():
+                    return
+        except pd.errors.EmptyDataError:
+            return
+
+
+def infer_dtype(values: pd.Series) -> str:
+    """int / float / bool / string for a column of cell strings (nulls ignored)"""
+    present = values.dropna()
+    if present.empty:
+        return 'string'
+    if present.str.fullmatch(INT_RE.pattern).all():
+        try:
+            pc.cast(pa.array(present, pa.string()), pa.int64())
+            return 'int'
+        except pa.ArrowInvalid:
+            return 'string'  # beyond int64 - keep the digits
+    if present.str.fullmatch(FLOAT_RE.pattern).all():
+        return 'float'
+    if present.isin(list(BOOL_VALUES)).all():
+        return 'bool'
+    return 'string'
+
+
+def _cast_column(values: pd.Series, dtype: str) -> Tuple[pd.Series, int]:
+    """Cast cell strings to dtype; returns (series, number of non-null values that didn't fit)"""
+    if dtype == 'string':
+        return values, 0
+    if dtype == 'bool':
+        cast = values.map(BOOL_VALUES).astype('boolean')
+    elif dtype == 'int':
+        # parsed by arrow straight from the strings (no float round trip), so 19-digit ids keep every digit
+        digits = values.where(values.str.fullmatch(INT_RE.pattern).fillna(False).astype(bool))
+        try:
+            ints = pc.cast(pa.array(digits, pa.string(), from_pandas=True), pa.int64())
+        except (pa.ArrowInvalid, OverflowError):
+            ints = pa.array([int(v) if isinstance(v, str) and -2 ** 63 <= int(v) < 2 ** 63 else None
+                             for v in digits], pa.int64())
+        cast = pd.Series(ints.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get).array, index=values.index)
+    else:
+        numbers = values.where(values.str.fullmatch(FLOAT_RE.pattern).fillna(False).astype(bool))
+        cast = pd.Series(pc.cast(pa.array(numbers, pa.string(), from_pandas=True), pa.float64()).to_numpy(
+            zero_copy_only=False), index=values.index)
+    return cast, int(values.notna().sum() - cast.notna().sum())
+
+
+def _widen_column(values: pd.Series, dtype: str) -> pd.Series:
+    """Recast an already typed column to a wider dtype (float, or string with nulls kept)"""
+    if dtype == 'float':
+        return values.astype('float64')
+    text = lambda v: str(v).lower() if isinstance(v, (bool, np.bool_)) else str(v)  # bools as arrow writes them
+    return values.astype(object).map(text, na_action='ignore').where(values.notna(), None)
+
+
+class _ChunkCaster:
+    """Infers the schema on the first chunk, casts every chunk to it and widens columns that stop fitting"""
+
+    def __init__(self, dtypes: Optional[Dict[str, str]] = None):
+        self.pinned = dict(dtypes or {})
+        self.dtypes: Optional[Dict[str, str]] = None
+        self.coerced: Dict[str, int] = {}
+        self.widened: Dict[str, str] = {}  # column -> dtype it was inferred as
+
+    def cast(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        if self.dtypes is None:
+            self.dtypes = {col: self.pinned.get(col) or infer_dtype(chunk[col]) for col in chunk.columns}
+        for col in chunk.columns:
+            dtype = self.dtypes[col]
+            cast, bad = _cast_column(chunk[col], dtype)
+            while bad and col not in self.pinned and dtype in WIDER_DTYPE:
+                # ints beyond int64 keep their digits as strings rather than rounding through float
+                overflow = dtype == 'int' and chunk[col].dropna().str.fullmatch(INT_RE.pattern).all()
+                dtype = 'string' if overflow else WIDER_DTYPE[dtype]
+                cast, bad = _cast_column(chunk[col], dtype)
+            if dtype != self.dtypes[col]:
+                self.widened.setdefault(col, self.dtypes[col])
+                self.dtypes[col] = dtype
+            chunk[col] = cast
+            if bad:
+                self.coerced[col] = self.coerced.get(col, 0) + bad
+        return chunk
+
+    def widen(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Bring a chunk cast before a later widening up to the current schema"""
+        for col in self.widened:
+            if col in chunk.columns:
+                chunk[col] = _widen_column(chunk[col], self.dtypes[col])
+        return chunk
+
+    def schema(self, columns: Sequence[str]) -> pa.Schema:
+        return pa.schema([(col, ARROW_TYPES[self.dtypes[col]]) for col in columns])
+
+    def report(self, log=print):
+        for col, dtype in self.widened.items():
+            log(f"   ⚠️  pipe_table: '{col}' had values that didn't fit {dtype}, read as {self.dtypes[col]}")
+        for col, count in self.coerced.items():
+            log(f"   ⚠️  pipe_table: {count:,} value(s) in '{col}' didn't fit {self.dtypes[col]} and were set to null")
+
+
+def _typed_chunks(reader: PipeTableReader, columns: Optional[Sequence[str]], dtypes: Optional[Dict[str, str]],
+                  chunk_rows: int, log, caster: Optional[_ChunkCaster] = None) -> Iterator[pd.DataFrame]:
+    caster = caster or _ChunkCaster(dtypes)
+    for chunk in reader.string_chunks(chunk_rows, columns):
+        yield caster.cast(chunk)
+    if log:
+        caster.report(log)
+        _report_skipped(reader, log)
+
+
+def _report_skipped(reader: PipeTableReader, log):
+    if log and reader.skipped:
+        log(f'   ⚠️  pipe_table: skipped {reader.skipped:,} row(s) with the wrong number of cells')
+
+
+def iter_table_chunks(source, required_columns: Sequence[str] = (), columns: Optional[Sequence[str]] = None,
+                      dtypes: Optional[Dict[str, str]] = None, chunk_rows: int = CHUNK_ROWS,
+                      log=print) -> Iterator[pd.DataFrame]:
+    """Typed DataFrame chunks of the table (same schema for every chunk)"""
+    with _open_lines(source) as lines:
+        reader = PipeTableReader(lines, required_columns)
+        yield from _typed_chunks(reader, columns, dtypes, chunk_rows, log)
+
+
+def read_pipe_table(source, required_columns: Sequence[str] = (), columns: Optional[Sequence[str]] = None,
+                    dtypes: Optional[Dict[str, str]] = None, chunk_rows: int = CHUNK_ROWS, log=print) -> pd.DataFrame:
+    """The whole table as one typed DataFrame (columns= keeps only those columns)"""
+    caster = _ChunkCaster(dtypes)
+    with _open_lines(source) as lines:
+        reader = PipeTableReader(lines, required_columns)
+        chunks = list(_typed_chunks(reader, columns, dtypes, chunk_rows, log, caster))
+    if not chunks:
+        return pd.DataFrame(columns=list(columns) if columns else reader.columns)
+    return pd.concat([caster.widen(chunk) for chunk in chunks], ignore_index=True)
+
+
+def table_to_csv(source, output_path: str, required_columns: Sequence[str] = (),
+                 columns: Optional[Sequence[str]] = None, chunk_rows: int = CHUNK_ROWS,
+                 log=print) -> Tuple[List[str], int]:
+    """Stream the table into a CSV (cells written as-is, nulls empty); returns (columns, rows written)"""
+    rows = 0
+    with _open_lines(source) as lines:
+        reader = PipeTableReader(lines, required_columns)
+        keep = list(columns) if columns else list(reader.columns)
+        with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
+            csv.writer(csvfile).writerow(keep)
+            for chunk in reader.string_chunks(chunk_rows, keep):
+                chunk.to_csv(csvfile, header=False, index=False)
+                rows += len(chunk)
+    _report_skipped(reader, log)
+    return keep, rows
+
+
+def table_to_parquet(source, output_path: str, required_columns: Sequence[str] = (),
+                     columns: Optional[Sequence[str]] = None, dtypes: Optional[Dict[str, str]] = None,
+                     chunk_rows: int = CHUNK_ROWS, log=print) -> Tuple[List[str], int]:
+    """Stream the table into a parquet file, one row group per chunk; returns (columns, rows written)"""
+    writer = None
+    rows = 0
+    caster = _ChunkCaster(dtypes)
+    with _open_lines(source) as lines:
+        reader = PipeTableReader(lines, required_columns)
+        keep = list(columns) if columns else list(reader.columns)
+        try:
+            for frame in _typed_chunks(reader, keep, dtypes, chunk_rows, log, caster):
+                schema = caster.schema(keep)
+                if writer is not None and not schema.equals(writer.schema):
+                    # a column widened: rewrite the row groups written so far in the new schema
+                    writer.close()
+                    written = pq.read_table(output_path).cast(schema)
+                    writer = pq.ParquetWriter(output_path, schema)
+                    writer.write_table(written)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, schema)
+                writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+                rows += len(frame)
+        finally:
+            if writer is not None:
+                writer.close()
+    if writer is None:
+        pq.write_table(pa.table({col: pa.array([], pa.string()) for col in keep}), output_path)
+    return keep, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a pipe-table query result dump to CSV or parquet')
+    parser.add_argument('source', help='Text file containing the | a | b | table')
+    parser.add_argument('output', help='Output .csv or .parquet file')
+    parser.add_argument('--require', nargs='*', default=[], help='Column names identifying the header row')
+    parser.add_argument('--columns', nargs='*', help='Only keep these columns')
+    args = parser.parse_args()
+
+    if args.output.endswith('.parquet'):
+        columns, rows = table_to_parquet(args.source, args.output, args.require, args.columns)
+    else:
+        columns, rows = table_to_csv(args.source, args.output, args.require, args.columns)
+    print(f'✅ {rows:,} rows x {len(columns)} columns -> {args.output}')
+
+
+if __name__ == '__main__':
+    main()
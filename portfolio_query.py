@@ -0,0 +1,243 @@
+"""
+Portfolio Queries over Large Merchant Lists
+Splits a merchant portfolio into chunks of PORTFOLIO_CHUNK_SIZE ids, runs one
+query per chunk in parallel (job_runner) and merges the chunk results, so
+portfolios of any size are covered without truncation and without one huge
+inline VALUES list.
+
+Merging rules (chunks are disjoint merchant sets):
+- sum columns: GMV, revenue, spend, and distinct counts of things that belong to
+  exactly one merchant (orders, merchants) - these add up across chunks
+- distinct-key columns: distinct counts that can span merchants (eaters,
+  campaigns). Each chunk returns the distinct keys as an array
+  (ARRAY_AGG(DISTINCT ...)) and the merged count is the size of their union
+- first columns: values that are the same in every chunk
+Ratios must be recomputed by the caller after merging.
+
+Usage:
+    from portfolio_query import run_mgs_impact
+    impact = run_mgs_impact({'Teoh Jun Ling': merchant_ids, ...})
+    impact['Teoh Jun Ling']  # -> monthly rows, or None if a chunk failed
+"""
+
+import os
+from typing import Callable, Dict, List, Optional, Sequence
+
+from job_runner import Job, run_jobs, DEFAULT_WORKERS
+
+PORTFOLIO_CHUNK_SIZE = int(os.getenv('PORTFOLIO_CHUNK_SIZE', '500'))
+
+
+def clean_merchant_ids(merchant_ids: Sequence[str]) -> List[str]:
+    """Strip blanks and duplicates, keeping the original order"""
+    seen = set()
+    cleaned = []
+    for mid in merchant_ids:
+        mid = str(mid).strip()
+        if mid and mid not in seen:
+            seen.add(mid)
+            cleaned.append(mid)
+    return cleaned
+
+
+def chunk_merchant_ids(merchant_ids: Sequence[str], chunk_size: int = PORTFOLIO_CHUNK_SIZE) -> List[List[str]]:
+    ids = clean_merchant_ids(merchant_ids)
+    return [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+
+def merchant_values_clause(merchant_ids: Sequence[str], separator: str = ', ') -> str:
+    """('id1'), ('id2'), ... for a VALUES list (single quotes escaped)"""
+    return separator.join("('{}')".format(str(mid).replace("'", "''")) for mid in merchant_ids)
+
+
+def merge_chunk_rows(chunk_results: List[List[Dict]], group_by: Sequence[str], sum_cols: Sequence[str] = (),
+                     distinct_keys: Optional[Dict[str, str]] = None, first_cols: Sequence[str] = ()) -> List[Dict]:
+    """
+    Merge per-chunk result rows on group_by.
+    distinct_keys maps an output count column to the chunk column holding that chunk's distinct keys.
+    """
+    distinct_keys = distinct_keys or {}
+    merged = {}
+    for rows in chunk_results:
+        for row in rows:
+            key = tuple(row.get(c) for c in group_by)
+            acc = merged.get(key)
+            if acc is None:
+                acc = {c: row.get(c) for c in group_by}
+                acc.update({c: row.get(c) for c in first_cols})
+                acc.update({c: 0 for c in sum_cols})
+                acc.update({c: set() for c in distinct_keys})
+                merged[key] = acc
+            for c in sum_cols:
+                acc[c] += row.get(c) or 0
+            for out_col, key_col in distinct_keys.items():
+                # COUNT(DISTINCT ...) ignores NULL, so the merged key sets do too
+                acc[out_col].update(k for k in row.get(key_col) or [] if k is not None)
+    results = []
+    for key in sorted(merged, key=lambda k: tuple((v is None, v) for v in k)):
+        acc = merged[key]
+        for out_col in distinct_keys:
+            acc[out_col] = len(acc[out_col])
+        results.append(acc)
+    return results
+
+
+def run_portfolio_queries(portfolios: Dict[str, Sequence[str]], build_chunk_query: Callable[[str, List[str]], str],
+                          group_by: Sequence[str], sum_cols: Sequence[str] = (),
+                          distinct_keys: Optional[Dict[str, str]] = None, first_cols: Sequence[str] = (),
+                          chunk_size: int = PORTFOLIO_CHUNK_SIZE, workers: int = DEFAULT_WORKERS,
+                          run: Callable[[str], List[Dict]] = None,
+                          store_path: Optional[str] = None) -> Dict[str, Optional[List[Dict]]]:
+    """
+    Run build_chunk_query(name, chunk) for every chunk of every portfolio in one parallel batch
+    and merge each portfolio's chunks. A portfolio maps to None if any of its chunks failed
+    (a partial portfolio would under-report).
+    """
+    jobs = {}
+    for name, merchant_ids in portfolios.items():
+        chunks = chunk_merchant_ids(merchant_ids, chunk_size)
+        jobs[name] = [Job(f'{name}#chunk{i + 1}of{len(chunks)}', build_chunk_query(name, chunk), {'merchants': len(chunk)})
+                      for i, chunk in enumerate(chunks)]
+    results = run_jobs([job for name_jobs in jobs.values() for job in name_jobs],
+                       run=run, store_path=store_path, workers=workers)
+
+    merged = {}
+    for name, name_jobs in jobs.items():
+        if any(job.job_id not in results for job in name_jobs):
+            merged[name] = None
+        else:
+            merged[name] = merge_chunk_rows([results[job.job_id] for job in name_jobs],
+                                            group_by, sum_cols, distinct_keys, first_cols)
+    return merged
+
+
+# ----------------------------------------------------------------------------
+# MGS impact (Penang, May - October 2025)
+# ----------------------------------------------------------------------------
+
+PENANG_MONTHLY_GMV_CTE = """total_penang_gmv AS (
+    SELECT
+        CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER) as month_id,
+        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as total_penang_gmv
+    FROM ocd_adw.f_food_metrics f
+    WHERE f.city_id = 13
+        AND f.country_id = 1
+        AND f.date_id >= 20250501
+        AND f.date_id < 20251101
+        AND f.business_type = 0
+    GROUP BY CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER)
+)"""
+
+
+def generate_mgs_impact_query(mgs_name: str, merchant_ids: Sequence[str], chunked: bool = False) -> str:
+    """
+    MGS monthly impact query for the given merchants.
+    chunked=True is the per-chunk form: no Penang total and no ratios, plus the distinct
+    eater ids per month so eaters can be merged across chunks.
+    """
+    mgs_var_name = mgs_name.replace(' ', '_').replace('.', '').lower()
+    values_clause = merchant_values_clause(merchant_ids)
+    eater_ids_agg = (",\n        ARRAY_AGG(DISTINCT f.passenger_id) FILTER (WHERE f.booking_state_simple = 'COMPLETED'"
+                     " AND f.passenger_id IS NOT NULL)"
+                     " as eater_ids" if chunked else "")
+    merchants_cte = f"""{mgs_var_name}_merchants AS (
+    SELECT merchant_id_nk
+    FROM (VALUES {values_clause}) AS t(merchant_id_nk)
+)"""
+    monthly_gmv_cte = f"""monthly_gmv AS (
+    SELECT
+        CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER) as month_id,
+        COUNT(DISTINCT f.merchant_id) as unique_merchants,
+        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as orders,
+        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.passenger_id END) as unique_eaters,
+        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv{eater_ids_agg}
+    FROM ocd_adw.f_food_metrics f
+    WHERE f.city_id = 13
+        AND f.country_id = 1
+        AND f.date_id >= 20250501
+        AND f.date_id < 20251101
+        AND f.business_type = 0
+        AND f.merchant_id IN (SELECT merchant_id_nk FROM {mgs_var_name}_merchants)
+    GROUP BY CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER)
+)"""
+    if chunked:
+        return f"""
+-- {mgs_name} - impact chunk ({len(merchant_ids)} merchants)
+WITH {merchants_cte},
+{monthly_gmv_cte}
+SELECT
+    month_id,
+    unique_merchants,
+    orders,
+    gmv,
+    eater_ids
+FROM monthly_gmv
+ORDER BY month_id
+"""
+    return f"""
+WITH {merchants_cte},
+{monthly_gmv_cte},
+{PENANG_MONTHLY_GMV_CTE}
+SELECT
+    mg.month_id,
+    '{mgs_name}' as mgs_name,
+    mg.unique_merchants,
+    mg.orders,
+    mg.unique_eaters,
+    mg.gmv,
+    tp.total_penang_gmv,
+    ROUND(mg.gmv * 100.0 / NULLIF(tp.total_penang_gmv, 0), 2) as gmv_pct_of_penang,
+    ROUND(mg.gmv / NULLIF(mg.unique_merchants, 0), 2) as avg_gmv_per_merchant,
+    ROUND(mg.gmv / NULLIF(mg.orders, 0), 2) as avg_gmv_per_order,
+    ROUND(mg.gmv / NULLIF(mg.unique_eaters, 0), 2) as avg_gmv_per_eater
+FROM monthly_gmv mg
+INNER JOIN total_penang_gmv tp ON mg.month_id = tp.month_id
+ORDER BY mg.month_id;
+"""
+
+
+def _ratio(num, den, scale=1.0):
+    return round(num * scale / den, 2) if den else None
+
+
+def run_mgs_impact(portfolios: Dict[str, Sequence[str]], chunk_size: int = PORTFOLIO_CHUNK_SIZE,
+                   workers: int = DEFAULT_WORKERS, run: Callable[[str], List[Dict]] = None,
+                   store_path: Optional[str] = None) -> Dict[str, Optional[List[Dict]]]:
+    """Monthly impact rows (same columns as generate_mgs_impact_query) per MGS, for portfolios of any size"""
+    if run is None:
+        from query_executor import run_query
+        run = run_query
+    months_by_mgs = run_portfolio_queries(
+        portfolios, lambda name, chunk: generate_mgs_impact_query(name, chunk, chunked=True),
+        group_by=['month_id'], sum_cols=['unique_merchants', 'orders', 'gmv'],
+        distinct_keys={'unique_eaters': 'eater_ids'},
+        chunk_size=chunk_size, workers=workers, run=run, store_path=store_path)
+    # the Penang total doesn't depend on the portfolio: one query for every MGS
+    penang = {r['month_id']: r['total_penang_gmv'] for r in run(
+        f"WITH {PENANG_MONTHLY_GMV_CTE}\nSELECT month_id, total_penang_gmv FROM total_penang_gmv")}
+
+    impact = {}
+    for mgs_name, months in months_by_mgs.items():
+        if months is None:
+            impact[mgs_name] = None
+            continue
+        rows = []
+        for m in months:
+            if m['month_id'] not in penang:
+                continue
+            total = penang[m['month_id']]
+            rows.append({
+                'month_id': m['month_id'],
+                'mgs_name': mgs_name,
+                'unique_merchants': m['unique_merchants'],
+                'orders': m['orders'],
+                'unique_eaters': m['unique_eaters'],
+                'gmv': m['gmv'],
+                'total_penang_gmv': total,
+                'gmv_pct_of_penang': _ratio(m['gmv'], total, 100.0),
+                'avg_gmv_per_merchant': _ratio(m['gmv'], m['unique_merchants']),
+                'avg_gmv_per_order': _ratio(m['gmv'], m['orders']),
+                'avg_gmv_per_eater': _ratio(m['gmv'], m['unique_eaters']),
+            })
+        impact[mgs_name] = rows
+    return impact
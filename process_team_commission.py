@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 
+from pipe_table import read_pipe_table
+
 # Load merchant-level data from query result (use the latest/largest file)
 import glob
 import os
@@ -35,48 +37,16 @@ print(f"Team assignments created for {len(team_assignments)} merchants")
 
 # Load merchant data (pipe-delimited from query result)
 try:
-    # Read file line by line and parse manually
-    with open(merchant_data_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    
-    # Find header line (contains column names)
-    header_line = None
-    data_start = 0
-    for i, line in enumerate(lines):
-        if 'month_id' in line and 'merchant_id_nk' in line:
-            header_line = i
-            data_start = i + 2  # Skip header and separator line
-            break
-    
-    if header_line is None:
-        raise ValueError("Could not find header line")
-    
-    # Parse header
-    header = [col.strip() for col in lines[header_line].split('|') if col.strip() and '---' not in col]
-    print(f"Found columns: {header}")
-    
-    # Parse data rows
-    data_rows = []
-    for line in lines[data_start:]:
-        if '---' in line or not line.strip():
-            continue
-        parts = [p.strip() for p in line.split('|')]
-        if len(parts) >= 5 and parts[1]:  # Valid data row
-            data_rows.append({
-                'month_id': parts[1],
-                'merchant_id_nk': parts[2],
-                'merchant_gmv': parts[3],
-                'merchant_commission_billing': parts[4],
-                'total_penang_gmv': parts[5] if len(parts) > 5 else None
-            })
-    
-    df_merchants = pd.DataFrame(data_rows)
-    
-    # Convert numeric columns
-    numeric_cols = ['month_id', 'merchant_gmv', 'merchant_commission_billing', 'total_penang_gmv']
-    for col in numeric_cols:
-        if col in df_merchants.columns:
-            df_merchants[col] = pd.to_numeric(df_merchants[col], errors='coerce')
+    # Stream the pipe table straight into typed columns (the dump can be hundreds of MB;
+    # month_id / GMV / billing come back numeric)
+    df_merchants = read_pipe_table(
+        merchant_data_path,
+        required_columns=['month_id', 'merchant_id_nk'],
+        columns=['month_id', 'merchant_id_nk', 'merchant_gmv', 'merchant_commission_billing', 'total_penang_gmv'],
+        dtypes={'merchant_id_nk': 'string', 'merchant_gmv': 'float', 'merchant_commission_billing': 'float',
+                'total_penang_gmv': 'float'},
+    )
+    print(f"Found columns: {list(df_merchants.columns)}")
     
     # Remove rows with missing data
     df_merchants = df_merchants.dropna(subset=['merchant_id_nk', 'month_id'])
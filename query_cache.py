@@ -0,0 +1,274 @@
+"""
+Query Result Cache
+Caches query results on disk as parquet, keyed by the normalized SQL text plus
+any parameters (e.g. the backend), so reruns and retries of the weekly reports
+don't hit the warehouse again.
+
+How long an entry lives depends on the newest date the query reads:
+- window ends before today - QUERY_CACHE_SETTLE_DAYS -> closed history, never expires
+- window ends in the last few days                   -> QUERY_CACHE_RECENT_TTL_S (late data may still land)
+- window includes today / CURRENT_DATE / the future  -> QUERY_CACHE_OPEN_TTL_S
+- no recognisable dates                              -> QUERY_CACHE_DEFAULT_TTL_S
+Empty results live at most QUERY_CACHE_RECENT_TTL_S; None and error responses
+(a lone {'error': ...} row) aren't cached.
+
+Configuration (environment):
+    QUERY_CACHE            on | off (default: on)
+    QUERY_CACHE_DIR        cache directory (default: .query_cache)
+
+Usage:
+    rows = cached_query(sql, run_fn)                 # run_fn(sql) -> list of dicts
+    python query_cache.py --stats
+    python query_cache.py --purge-expired
+    python query_cache.py --clear
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import threading
+import calendar
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+QUERY_CACHE_ENABLED = os.getenv('QUERY_CACHE', 'on').lower() not in ('off', 'false', '0')
+QUERY_CACHE_DIR = os.getenv('QUERY_CACHE_DIR', '.query_cache')
+SETTLE_DAYS = int(os.getenv('QUERY_CACHE_SETTLE_DAYS', '2'))
+OPEN_TTL_S = int(os.getenv('QUERY_CACHE_OPEN_TTL_S', '900'))            # 15 minutes
+ERROR_KEYS = ('error', 'errors')  # a lone row with one of these is a failed query, never cached
+RECENT_TTL_S = int(os.getenv('QUERY_CACHE_RECENT_TTL_S', '21600'))      # 6 hours
+DEFAULT_TTL_S = int(os.getenv('QUERY_CACHE_DEFAULT_TTL_S', '3600'))     # 1 hour
+
+# date_id literals (20251130) and quoted ISO dates ('2025-11-30')
+DATE_ID_RE = re.compile(r"(?<![\d.])(20\d{2})(0[1-9]|1[0-2])([0-2]\d|3[01])(?![\d.])")
+ISO_DATE_RE = re.compile(r"'(20\d{2})-(0[1-9]|1[0-2])-([0-2]\d|3[01])'")
+OPEN_WINDOW_RE = re.compile(r"\b(CURRENT_DATE|CURRENT_TIMESTAMP|NOW\s*\(|LOCALTIMESTAMP)", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    """Strip comments and collapse whitespace outside string literals, drop a trailing semicolon"""
+    out = []
+    i, n = 0, len(sql)
+    pending_space = False
+    while i < n:
+        ch = sql[i]
+        if ch == "'":
+            end = i + 1
+            while end < n:
+                if sql[end] == "'":
+                    if end + 1 < n and sql[end + 1] == "'":  # escaped quote
+                        end += 2
+                        continue
+                    break
+                end += 1
+            token = sql[i:end + 1]
+            i = end + 1
+        elif sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = n if end == -1 else end
+            pending_space = True
+            continue
+        elif sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            pending_space = True
+            continue
+        elif ch.isspace():
+            pending_space = True
+            i += 1
+            continue
+        else:
+            token = ch
+            i += 1
+        if pending_space and out:
+            out.append(' ')
+        pending_space = False
+        out.append(token)
+    return ''.join(out).strip().rstrip(';').strip()
+
+
+def cache_key(sql: str, params: Optional[Dict] = None) -> str:
+    payload = normalize_sql(sql) + '\n' + json.dumps(params or {}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def latest_date(sql: str) -> Optional[datetime]:
+    """
+    Newest calendar date referenced by the query, if any. Day numbers past the end of
+    the month (20251131, a common month-end bound) count as the month's last day.
+    """
+    latest = None
+    for match in list(DATE_ID_RE.finditer(sql)) + list(ISO_DATE_RE.finditer(sql)):
+        year, month, day = int(match.group(1)), int(match.group(2)), int(match.group(3))
+        d = datetime(year, month, min(max(day, 1), calendar.monthrange(year, month)[1]))
+        if latest is None or d > latest:
+            latest = d
+    return latest
+
+
+def ttl_for_query(sql: str, now: Optional[datetime] = None) -> Optional[int]:
+    """Seconds an entry stays valid, or None when the window is closed history"""
+    sql = normalize_sql(sql)
+    today = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    if OPEN_WINDOW_RE.search(sql):
+        return OPEN_TTL_S
+    latest = latest_date(sql)
+    if latest is None:
+        return DEFAULT_TTL_S
+    if latest >= today:
+        return OPEN_TTL_S
+    if latest >= today - timedelta(days=SETTLE_DAYS):
+        return RECENT_TTL_S
+    return None
+
+
+def is_row_list(rows) -> bool:
+    """A list of row dicts - not None, not a wrapped error response such as [{'error': ...}]"""
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        return False
+    return not (len(rows) == 1 and any(key in rows[0] for key in ERROR_KEYS))
+
+
+class QueryCache:
+    """Parquet files under cache_dir, one per cache key, with creation time and TTL in the file metadata"""
+
+    def __init__(self, cache_dir: str = QUERY_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f'{key}.parquet')
+
+    @staticmethod
+    def _expired(meta: Dict, now: float) -> bool:
+        ttl = meta.get(b'ttl_s')
+        if ttl is None or ttl == b'':
+            return False
+        return now - float(meta[b'created_at']) > float(ttl)
+
+    def get(self, sql: str, params: Optional[Dict] = None) -> Optional[List[Dict]]:
+        path = self._path(cache_key(sql, params))
+        if not os.path.exists(path):
+            return None
+        try:
+            table = pq.read_table(path)
+        except Exception:
+            return None
+        if self._expired(table.schema.metadata or {}, time.time()):
+            return None
+        return table.to_pylist()
+
+    def put(self, sql: str, rows: List[Dict], params: Optional[Dict] = None,
+            max_ttl_s: Optional[float] = None) -> bool:
+        """Store rows (for at most max_ttl_s); returns False when they can't be represented as parquet (nothing is cached)"""
+        try:
+            table = pa.Table.from_pylist(rows)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            return False
+        ttl = ttl_for_query(sql)
+        if max_ttl_s is not None:
+            ttl = max_ttl_s if ttl is None else min(ttl, max_ttl_s)
+        table = table.replace_schema_metadata({
+            'created_at': str(time.time()),
+            'ttl_s': '' if ttl is None else str(ttl),
+            'sql': normalize_sql(sql)[:2000],
+        })
+        path = self._path(cache_key(sql, params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+        return True
+
+    def cached(self, sql: str, run: Callable[[str], Optional[List[Dict]]],
+               params: Optional[Dict] = None, refresh: bool = False) -> Optional[List[Dict]]:
+        """Return cached rows for sql, or run(sql) and cache its result"""
+        if not refresh:
+            rows = self.get(sql, params)
+            if rows is not None:
+                self.hits += 1
+                return rows
+        self.misses += 1
+        rows = run(sql)
+        if is_row_list(rows):
+            # an empty result may just be partitions that haven't landed yet - keep it only briefly
+            self.put(sql, rows, params, max_ttl_s=None if rows else RECENT_TTL_S)
+        return rows
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.parquet'):
+                    yield os.path.join(root, name)
+
+    def purge_expired(self) -> int:
+        removed = 0
+        now = time.time()
+        for path in self._entries():
+            try:
+                meta = pq.read_schema(path).metadata or {}
+            except Exception:
+                meta = {b'created_at': b'0', b'ttl_s': b'0'}
+            if self._expired(meta, now):
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def clear(self) -> int:
+        removed = 0
+        for path in list(self._entries()):
+            os.remove(path)
+            removed += 1
+        return removed
+
+    def stats(self) -> Dict:
+        now = time.time()
+        entries = expired = permanent = size = 0
+        for path in self._entries():
+            entries += 1
+            size += os.path.getsize(path)
+            meta = pq.read_schema(path).metadata or {}
+            if not meta.get(b'ttl_s'):
+                permanent += 1
+            elif self._expired(meta, now):
+                expired += 1
+        return {'entries': entries, 'permanent': permanent, 'expired': expired, 'size_mb': size / (1024 * 1024)}
+
+
+_cache = QueryCache()
+
+
+def cached_query(sql: str, run: Callable[[str], Optional[List[Dict]]],
+                 params: Optional[Dict] = None, refresh: bool = False) -> Optional[List[Dict]]:
+    """Run sql through the shared on-disk cache (bypassed when QUERY_CACHE=off)"""
+    if not QUERY_CACHE_ENABLED:
+        return run(sql)
+    return _cache.cached(sql, run, params, refresh)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or clean the on-disk query result cache')
+    parser.add_argument('--stats', action='store_true', help='Show entry counts and size')
+    parser.add_argument('--purge-expired', action='store_true', help='Delete expired entries')
+    parser.add_argument('--clear', action='store_true', help='Delete every entry')
+    args = parser.parse_args()
+
+    if args.clear:
+        print(f'🗑️  Removed {_cache.clear()} cached result(s) from {QUERY_CACHE_DIR}')
+    elif args.purge_expired:
+        print(f'🗑️  Removed {_cache.purge_expired()} expired result(s) from {QUERY_CACHE_DIR}')
+    else:
+        s = _cache.stats()
+        print(f"📦 {QUERY_CACHE_DIR}: {s['entries']} entries ({s['permanent']} permanent, "
+              f"{s['expired']} expired), {s['size_mb']:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+"""
+Query Executor for the Weekly Report Pipeline
+One interface for running the generated Presto SQL, with two backends:
+- PrestoExecutor: pooled presto-python-client connections against the warehouse
+- DuckDBExecutor: runs the same SQL locally against parquet extracts
+  (ocd_adw.f_food_metrics, ocd_adw.d_merchant, ocd_adw.d_area, ...) so the
+  whole pipeline can run unattended and be benchmarked offline
+
+Rows can be fetched as a list of dicts (execute), streamed as Arrow record
+batches (stream) or collected into an Arrow table (to_arrow). Every batch of a
+query has the same schema (Presto: from the column types in cursor.description),
+and a query with no rows yields one empty batch, so an extract always writes a file.
+
+Configuration (environment):
+    QUERY_BACKEND          presto | duckdb (default: presto)
+    PRESTO_HOST / PRESTO_PORT / PRESTO_USER / PRESTO_CATALOG / PRESTO_SCHEMA
+    PRESTO_POOL_SIZE       pooled connections (default: 4)
+    LOCAL_EXTRACT_DIR      parquet extracts for the duckdb backend (default: extracts)
+
+Extract layout for the duckdb backend, one table per file or directory:
+    extracts/ocd_adw/f_food_metrics.parquet
+    extracts/ocd_adw/d_merchant/part-0000.parquet    (directory of parquet parts)
+    extracts/d_area.parquet                          (top-level file -> ocd_adw)
+
+Usage:
+    python query_executor.py --sql query.sql
+    python query_executor.py --extract ocd_adw.f_food_metrics "SELECT * FROM ocd_adw.f_food_metrics WHERE date_id >= 20251101"
+"""
+
+import os
+import re
+import json
+import glob
+import queue
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from query_cache import cached_query
+from sql_lint import prepare_query
+
+QUERY_BACKEND = os.getenv('QUERY_BACKEND', 'presto').lower()
+PRESTO_HOST = os.getenv('PRESTO_HOST', '')
+PRESTO_PORT = int(os.getenv('PRESTO_PORT', '8080'))
+PRESTO_USER = os.getenv('PRESTO_USER', os.getenv('USER', 'weekly-report'))
+PRESTO_CATALOG = os.getenv('PRESTO_CATALOG', 'hive')
+PRESTO_SCHEMA = os.getenv('PRESTO_SCHEMA', 'ocd_adw')
+PRESTO_POOL_SIZE = int(os.getenv('PRESTO_POOL_SIZE', '4'))
+LOCAL_EXTRACT_DIR = os.getenv('LOCAL_EXTRACT_DIR', 'extracts')
+
+DEFAULT_BATCH_SIZE = 50_000
+DEFAULT_SCHEMA = 'ocd_adw'
+
+# Presto column types -> Arrow, as presto-python-client returns them (dates, timestamps and decimals as strings)
+PRESTO_ARROW_TYPES = {
+    'tinyint': pa.int64(), 'smallint': pa.int64(), 'integer': pa.int64(), 'bigint': pa.int64(),
+    'real': pa.float64(), 'double': pa.float64(), 'boolean': pa.bool_(),
+    'varchar': pa.string(), 'char': pa.string(), 'json': pa.string(), 'uuid': pa.string(),
+    'date': pa.string(), 'time': pa.string(), 'timestamp': pa.string(), 'decimal': pa.string(),
+    'varbinary': pa.binary(),
+}
+
+# Presto functions the generated SQL uses that DuckDB spells differently
+DUCKDB_PRESTO_MACROS = [
+    'CREATE OR REPLACE MACRO approx_percentile(x, p) AS quantile_cont(x, p)',
+    'CREATE OR REPLACE MACRO approx_distinct(x) AS approx_count_distinct(x)',
+]
+
+
+def strip_statement(query: str) -> str:
+    """Drop the trailing semicolon the saved .sql queries carry; DB-API drivers reject it"""
+    return query.strip().rstrip(';').rstrip()
+
+
+def _type_args(args: str) -> List[str]:
+    """Top-level comma-separated parameters of a type, e.g. 'varchar, array(bigint)'"""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(args):
+        depth += {'(': 1, ')': -1}.get(ch, 0)
+        if ch == ',' and depth == 0:
+            parts.append(args[start:i].strip())
+            start = i + 1
+    return parts + [args[start:].strip()]
+
+
+def presto_arrow_type(type_name: str) -> Optional[pa.DataType]:
+    """Arrow type for a Presto type name such as bigint, varchar(10), array(double), map(varchar, bigint); None for row etc."""
+    name = str(type_name).strip().lower()
+    base = re.match(r'[a-z]*', name).group()  # varchar(10) -> varchar, timestamp with time zone -> timestamp
+    args = _type_args(name[len(base) + 1:-1]) if name[len(base):].startswith('(') else []
+    if base == 'array' and len(args) == 1:
+        inner = presto_arrow_type(args[0])
+        return pa.list_(inner) if inner is not None else None
+    if base == 'map' and len(args) == 2:
+        key, value = presto_arrow_type(args[0]), presto_arrow_type(args[1])
+        return pa.map_(key, value) if key is not None and value is not None else None
+    return PRESTO_ARROW_TYPES.get(base)
+
+
+def presto_schema(description) -> pa.Schema:
+    """
+    Schema for every batch of a Presto result from the declared column types, so a page where a
+    column is all NULL keeps the same type; types with no Arrow mapping (row ...) are read as JSON text
+    """
+    return pa.schema([pa.field(desc[0], presto_arrow_type(desc[1]) or pa.string()) for desc in description])
+
+
+class QueryExecutor:
+    """Base executor: subclasses implement stream()"""
+
+    backend = None
+
+    def stream(self, query: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+        raise NotImplementedError
+
+    def to_arrow(self, query: str) -> pa.Table:
+        batches = list(self.stream(query))
+        if not batches:
+            return pa.table({})
+        return pa.Table.from_batches(batches)
+
+    def execute(self, query: str) -> List[Dict]:
+        """Run a query and return its rows as dictionaries"""
+        rows = []
+        for batch in self.stream(query):
+            rows.extend(batch.to_pylist())
+        return rows
+
+    def export_parquet(self, query: str, path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Stream query results into a parquet file without holding them in memory; returns rows written"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        writer = None
+        written = 0
+        try:
+            for batch in self.stream(query, batch_size):
+                if writer is None:
+                    writer = pq.ParquetWriter(path, batch.schema)
+                writer.write_batch(batch)
+                written += batch.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        return written
+
+    def close(self):
+        pass
+
+
+class PrestoExecutor(QueryExecutor):
+    """Presto backend with a fixed-size connection pool (presto-python-client)"""
+
+    backend = 'presto'
+
+    def __init__(self, host: str = PRESTO_HOST, port: int = PRESTO_PORT, user: str = PRESTO_USER,
+                 catalog: str = PRESTO_CATALOG, schema: str = PRESTO_SCHEMA, pool_size: int = PRESTO_POOL_SIZE):
+        try:
+            import prestodb
+        except ImportError:
+            raise RuntimeError('presto-python-client is not installed: pip install presto-python-client')
+        if not host:
+            raise RuntimeError('PRESTO_HOST is not set')
+        self._connect = lambda: prestodb.dbapi.connect(host=host, port=port, user=user, catalog=catalog, schema=schema)
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._created = 0
+        self._pool_size = pool_size
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection, opening a new one while under the pool size"""
+        conn = None
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self._pool_size:
+                    self._created += 1
+                    conn = self._connect()
+            if conn is None:
+                conn = self._pool.get()
+        healthy = False
+        try:
+            yield conn
+            healthy = True
+        finally:
+            if healthy:
+                self._pool.put(conn)
+            else:
+                # failed or abandoned mid-stream: don't hand it to the next caller
+                with self._lock:
+                    self._created -= 1
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def stream(self, query: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(strip_statement(query))
+            schema, as_text = None, []
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if schema is None:
+                    schema = presto_schema(cursor.description)
+                    as_text = [i for i, desc in enumerate(cursor.description) if presto_arrow_type(desc[1]) is None]
+                elif not rows:
+                    break
+                if as_text:
+                    rows = [list(row) for row in rows]
+                    for row in rows:
+                        for i in as_text:
+                            if row[i] is not None and not isinstance(row[i], str):
+                                row[i] = json.dumps(row[i], default=str)
+                yield pa.RecordBatch.from_pylist([dict(zip(schema.names, row)) for row in rows], schema=schema)
+                if not rows:
+                    break  # an empty result still yields one (empty) batch with the schema
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class DuckDBExecutor(QueryExecutor):
+    """Local backend: the generated SQL against parquet extracts registered as schema.table views"""
+
+    backend = 'duckdb'
+
+    def __init__(self, extract_dir: str = LOCAL_EXTRACT_DIR, database: str = ':memory:'):
+        try:
+            import duckdb
+        except ImportError:
+            raise RuntimeError('duckdb is not installed: pip install duckdb')
+        self.extract_dir = extract_dir
+        self.conn = duckdb.connect(database)
+        for macro in DUCKDB_PRESTO_MACROS:
+            self.conn.execute(macro)
+        self.tables = self.register_extracts(extract_dir)
+
+    def register_extracts(self, extract_dir: str) -> List[str]:
+        """Create a view per parquet file / directory: top-level folders are schemas, top-level files are ocd_adw tables"""
+        tables = []
+        if not os.path.isdir(extract_dir):
+            return tables
+        for entry in sorted(os.listdir(extract_dir)):
+            path = os.path.join(extract_dir, entry)
+            if entry.endswith('.parquet') and os.path.isfile(path):
+                tables.append(self._register(DEFAULT_SCHEMA, entry, path))
+            elif os.path.isdir(path):
+                for sub in sorted(os.listdir(path)):
+                    sub_path = os.path.join(path, sub)
+                    if sub.endswith('.parquet') or glob.glob(os.path.join(sub_path, '**', '*.parquet'), recursive=True):
+                        tables.append(self._register(entry, sub, sub_path))
+        return tables
+
+    def _register(self, schema: str, name: str, path: str) -> str:
+        table = re.sub(r'\.parquet$', '', name)
+        source = os.path.join(path, '**', '*.parquet') if os.path.isdir(path) else path
+        self.conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+        self.conn.execute(
+            f'CREATE OR REPLACE VIEW "{schema}"."{table}" AS '
+            f"SELECT * FROM read_parquet('{source}', hive_partitioning = true)"
+        )
+        return f'{schema}.{table}'
+
+    def stream(self, query: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+        # a cursor per call lets several threads share one database
+        cursor = self.conn.cursor()
+        try:
+            reader = cursor.execute(strip_statement(query)).fetch_record_batch(batch_size)
+            empty = True
+            for batch in reader:
+                empty = False
+                yield batch
+            if empty:
+                yield pa.RecordBatch.from_pylist([], schema=reader.schema)
+        finally:
+            cursor.close()
+
+    def close(self):
+        self.conn.close()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(backend: Optional[str] = None) -> QueryExecutor:
+    """Shared executor for QUERY_BACKEND (or an explicit backend), created on first use"""
+    global _executor
+    backend = (backend or QUERY_BACKEND).lower()
+    if _executor is None or _executor.backend != backend:
+        with _executor_lock:
+            if _executor is None or _executor.backend != backend:
+                if backend == 'duckdb':
+                    executor = DuckDBExecutor()
+                elif backend == 'presto':
+                    executor = PrestoExecutor()
+                else:
+                    raise ValueError(f'Unknown QUERY_BACKEND: {backend} (expected presto or duckdb)')
+                _executor = executor
+    return _executor
+
+
+def run_query(query: str, refresh: bool = False) -> List[Dict]:
+    """
+    Execute a query on the configured backend and return rows as dictionaries
+    The query is first rewritten for date_id partition pruning (sql_lint.py), then
+    results go through the on-disk query cache (query_cache.py); refresh=True forces a re-run
+    """
+    executor = get_executor()
+    query = prepare_query(query)
+    return cached_query(query, executor.execute, params={'backend': executor.backend}, refresh=refresh)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run generated SQL on Presto or on local parquet extracts')
+    parser.add_argument('--backend', choices=['presto', 'duckdb'], default=QUERY_BACKEND)
+    parser.add_argument('--sql', help='File with the query to run')
+    parser.add_argument('--extract', nargs=2, metavar=('SCHEMA.TABLE', 'QUERY'),
+                        help='Stream QUERY into LOCAL_EXTRACT_DIR/SCHEMA/TABLE.parquet for the duckdb backend')
+    parser.add_argument('--output', help='Write --sql results to this parquet file instead of printing')
+    args = parser.parse_args()
+
+    executor = get_executor(args.backend)
+    try:
+        if args.extract:
+            name, query = args.extract
+            schema, _, table = name.rpartition('.')
+            path = os.path.join(LOCAL_EXTRACT_DIR, schema or DEFAULT_SCHEMA, f'{table}.parquet')
+            print(f'📥 Extracting {name} -> {path}')
+            print(f'✅ {executor.export_parquet(query, path):,} rows written')
+        elif args.sql:
+            with open(args.sql, encoding='utf-8') as f:
+                query = prepare_query(f.read())
+            if args.output:
+                print(f'✅ {executor.export_parquet(query, args.output):,} rows written to {args.output}')
+            else:
+                print(executor.to_arrow(query).to_pandas().to_string())
+        else:
+            parser.print_help()
+    finally:
+        executor.close()
+
+
+if __name__ == '__main__':
+    main()
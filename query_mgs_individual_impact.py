@@ -4,6 +4,17 @@ Last 6 Months (May 2025 - October 2025)
 """
 
 import json
+import argparse
+
+from job_runner import DEFAULT_WORKERS
+from portfolio_query import PORTFOLIO_CHUNK_SIZE, clean_merchant_ids, generate_mgs_impact_query, run_mgs_impact
+
+parser = argparse.ArgumentParser(description='Generate (and optionally execute) MGS individual impact queries')
+parser.add_argument('--execute', action='store_true', help='Run all queries in parallel via the configured QUERY_BACKEND')
+parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Queries in flight at once')
+parser.add_argument('--chunk-size', type=int, default=PORTFOLIO_CHUNK_SIZE, help='Merchants per chunk query')
+parser.add_argument('--results', default='mgs_individual_impact_results.jsonl', help='Result store (resumable)')
+args = parser.parse_args()
 
 # Load MGS assignments
 print("Loading MGS assignments...")
@@ -17,78 +28,23 @@ for mgs, merchants in sorted(mgs_assignments.items(), key=lambda x: -len(x[1])):
 # Generate queries for each MGS
 print("\nGenerating impact queries...")
 
-# For large merchant lists, we'll use subqueries or batch approach
-# Let's create queries that can handle all merchants
-
 queries = []
 
 for mgs_name, merchant_ids in sorted(mgs_assignments.items(), key=lambda x: -len(x[1])):
-    # Create merchant ID list for SQL
-    # For very large lists, we'll use a VALUES clause or subquery
-    merchant_ids_clean = [mid.strip() for mid in merchant_ids if mid.strip()]
+    merchant_ids_clean = clean_merchant_ids(merchant_ids)
     
     if not merchant_ids_clean:
         continue
     
-    # Create VALUES clause (limit to 1000 for query size, but we can batch if needed)
-    # Actually, let's use a subquery approach with d_merchant to handle all merchants
     query = f"""
 -- ============================================================================
 -- {mgs_name} - Individual Impact Analysis
 -- Last 6 Months (May 2025 - October 2025)
 -- {len(merchant_ids_clean)} merchants
 -- ============================================================================
-
-WITH {mgs_name.replace(' ', '_').replace('.', '').lower()}_merchants AS (
-    SELECT merchant_id_nk
-    FROM (VALUES {', '.join([f"('{mid}')" for mid in merchant_ids_clean[:1000]])}) AS t(merchant_id_nk)
-),
-monthly_gmv AS (
-    SELECT 
-        CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER) as month_id,
-        COUNT(DISTINCT f.merchant_id) as unique_merchants,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.order_id END) as orders,
-        COUNT(DISTINCT CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.passenger_id END) as unique_eaters,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as gmv
-    FROM ocd_adw.f_food_metrics f
-    WHERE f.city_id = 13
-        AND f.country_id = 1
-        AND f.date_id >= 20250501
-        AND f.date_id < 20251101
-        AND f.business_type = 0
-        AND f.merchant_id IN (SELECT merchant_id_nk FROM {mgs_name.replace(' ', '_').replace('.', '').lower()}_merchants)
-    GROUP BY CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER)
-),
-total_penang_gmv AS (
-    SELECT 
-        CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER) as month_id,
-        SUM(CASE WHEN f.booking_state_simple = 'COMPLETED' THEN f.gross_merchandise_value ELSE 0 END) as total_penang_gmv
-    FROM ocd_adw.f_food_metrics f
-    WHERE f.city_id = 13
-        AND f.country_id = 1
-        AND f.date_id >= 20250501
-        AND f.date_id < 20251101
-        AND f.business_type = 0
-    GROUP BY CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER)
-)
-SELECT 
-    mg.month_id,
-    '{mgs_name}' as mgs_name,
-    mg.unique_merchants,
-    mg.orders,
-    mg.unique_eaters,
-    mg.gmv,
-    tp.total_penang_gmv,
-    ROUND(mg.gmv * 100.0 / NULLIF(tp.total_penang_gmv, 0), 2) as gmv_pct_of_penang,
-    ROUND(mg.gmv / NULLIF(mg.unique_merchants, 0), 2) as avg_gmv_per_merchant,
-    ROUND(mg.gmv / NULLIF(mg.orders, 0), 2) as avg_gmv_per_order,
-    ROUND(mg.gmv / NULLIF(mg.unique_eaters, 0), 2) as avg_gmv_per_eater
-FROM monthly_gmv mg
-INNER JOIN total_penang_gmv tp ON mg.month_id = tp.month_id
-ORDER BY mg.month_id;
-"""
+{generate_mgs_impact_query(mgs_name, merchant_ids_clean)}"""
     
-    queries.append((mgs_name, query, len(merchant_ids_clean)))
+    queries.append((mgs_name, query, merchant_ids_clean))
 
 # Save queries
 with open('query_mgs_individual_impact.sql', 'w', encoding='utf-8') as f:
@@ -97,16 +53,28 @@ with open('query_mgs_individual_impact.sql', 'w', encoding='utf-8') as f:
     f.write("-- Last 6 Months (May 2025 - October 2025)\n")
     f.write("-- ============================================================================\n\n")
     
-    for mgs_name, query, merchant_count in queries:
+    for mgs_name, query, merchant_ids_clean in queries:
         f.write(f"\n{'='*80}\n")
-        f.write(f"MGS: {mgs_name} ({merchant_count} merchants)\n")
+        f.write(f"MGS: {mgs_name} ({len(merchant_ids_clean)} merchants)\n")
         f.write(f"{'='*80}\n\n")
         f.write(query)
         f.write("\n\n")
 
 print(f"\n[OK] Generated SQL queries saved to: query_mgs_individual_impact.sql")
-print(f"\n[INFO] Note: Queries use up to 1000 merchants per MGS")
-print(f"       For MGS with >1000 merchants, queries may need batching")
+print(f"\n[INFO] Queries include every merchant; --execute runs them in chunks of {args.chunk_size}")
 
-# Now let's execute the queries
-print("\n[INFO] Executing queries to get impact metrics...")
+if args.execute:
+    print("\n[INFO] Executing queries to get impact metrics...")
+    results = run_mgs_impact({mgs_name: merchant_ids_clean for mgs_name, _, merchant_ids_clean in queries},
+                             chunk_size=args.chunk_size, workers=args.workers, store_path=args.results)
+    for mgs_name, _, merchant_ids_clean in queries:
+        merchant_count = len(merchant_ids_clean)
+        rows = results.get(mgs_name)
+        if rows is None:
+            print(f"  {mgs_name}: FAILED - rerun with --execute to retry")
+            continue
+        gmv = sum(float(r.get('gmv') or 0) for r in rows)
+        print(f"  {mgs_name} ({merchant_count} merchants): GMV RM {gmv:,.2f} over {len(rows)} months")
+    print(f"\n[OK] Results saved to: {args.results}")
+else:
+    print("\n[INFO] Rerun with --execute to run the queries")
@@ -0,0 +1,256 @@
+"""
+Staged Report Runner
+Runs a report as a small DAG of named stages with declared inputs, e.g.
+
+    dates -> oc_query -> oc_rows ----------> oc_report ----> message -> send
+          -> cities_query -> cities_rows --> top_cities --/
+
+Stages whose inputs are ready run concurrently (the query stages of a weekly
+report overlap), and each stage's output is cached on disk under a key built
+from the stage's code and the hashes of its inputs' outputs. A rerun only
+executes stages whose code or inputs changed: after a failed send, or a tweak
+to the message formatting, the queries come from the cache.
+
+A stage's fingerprint is the source of its function plus any extra `code`
+(functions or whole modules it depends on) and `version`. Cache entries live
+for the stage's ttl_s - a number, None (forever) or a function of the stage's
+inputs, such as query_cache.ttl_for_query for a stage fed one SQL string.
+Stages with cache=False (side effects like sending) always run.
+
+A failing stage doesn't stop independent branches; its dependents are skipped
+and run_dag raises StageFailed once everything runnable has finished.
+
+Configuration (environment):
+    STAGE_CACHE            on | off (default: on)
+    STAGE_CACHE_DIR        cache directory (default: .stage_cache)
+
+Usage:
+    from report_dag import Stage, run_dag
+    outputs = run_dag([
+        Stage('dates', get_week_dates, cache=False),
+        Stage('oc_query', generate_oc_query_with_new_pax, ['dates']),
+        Stage('oc_rows', run_query, ['oc_query'], ttl_s=ttl_for_query),
+    ])
+    outputs['oc_rows']
+
+    python report_dag.py --stats
+    python report_dag.py --clear
+"""
+
+import os
+import time
+import pickle
+import hashlib
+import inspect
+import argparse
+import functools
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+STAGE_CACHE_ENABLED = os.getenv('STAGE_CACHE', 'on').lower() not in ('off', 'false', '0')
+STAGE_CACHE_DIR = os.getenv('STAGE_CACHE_DIR', '.stage_cache')
+DEFAULT_WORKERS = int(os.getenv('STAGE_WORKERS', '4'))
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable
+    inputs: Sequence[str] = ()
+    cache: bool = True
+    ttl_s: Any = None
+    code: Sequence[Any] = ()
+    version: str = ''
+    meta: Dict = field(default_factory=dict)
+
+
+class StageFailed(Exception):
+    def __init__(self, failed: Dict[str, str], skipped: List[str], outputs: Dict[str, Any]):
+        detail = '; '.join(f'{name}: {error}' for name, error in failed.items())
+        super().__init__(f"{len(failed)} stage(s) failed ({detail})"
+                         + (f", skipped: {', '.join(skipped)}" if skipped else ''))
+        self.failed = failed
+        self.skipped = skipped
+        self.outputs = outputs
+
+
+def _source(obj) -> str:
+    """Source text of a function / module for fingerprinting (partials: their function and bound arguments)"""
+    if isinstance(obj, functools.partial):
+        return _source(obj.func) + repr(obj.args) + repr(sorted(obj.keywords.items()))
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        code = getattr(obj, '__code__', None)
+        return f"{getattr(obj, '__module__', '')}.{getattr(obj, '__qualname__', repr(obj))}" + (
+            code.co_code.hex() if code else '')
+
+
+def stage_fingerprint(stage: Stage) -> str:
+    parts = [stage.name, stage.version, _source(stage.fn)] + [_source(obj) for obj in stage.code]
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def output_hash(value) -> str:
+    return hashlib.sha256(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+
+class StageCache:
+    """Pickled stage outputs, one file per (stage, key), with the output hash and expiry alongside"""
+
+    def __init__(self, cache_dir: str = STAGE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, name: str, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{name}-{key[:24]}.pkl')
+
+    def get(self, name: str, key: str) -> Optional[Tuple[Any, str]]:
+        """(output, output hash) or None when missing / expired / unreadable"""
+        try:
+            with open(self._path(name, key), 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        if entry['key'] != key or (entry['expires_at'] is not None and entry['expires_at'] < time.time()):
+            return None
+        return entry['output'], entry['hash']
+
+    def put(self, name: str, key: str, output, digest: str, ttl_s: Optional[float]):
+        entry = {'key': key, 'output': output, 'hash': digest, 'created_at': time.time(),
+                 'expires_at': time.time() + ttl_s if ttl_s is not None else None}
+        tmp = self._path(name, key) + f'.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(name, key))
+
+    def _entries(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                yield os.path.join(self.cache_dir, name)
+
+    def clear(self) -> int:
+        removed = 0
+        for path in self._entries():
+            os.remove(path)
+            removed += 1
+        return removed
+
+    def stats(self) -> Dict:
+        entries = list(self._entries())
+        return {'entries': len(entries), 'bytes': sum(os.path.getsize(p) for p in entries)}
+
+
+def _check_stages(stages: Sequence[Stage]) -> Dict[str, Stage]:
+    by_name = {}
+    for stage in stages:
+        if stage.name in by_name:
+            raise ValueError(f'duplicate stage {stage.name}')
+        by_name[stage.name] = stage
+    for stage in stages:
+        missing = [i for i in stage.inputs if i not in by_name]
+        if missing:
+            raise ValueError(f"stage {stage.name}: unknown input(s) {', '.join(missing)}")
+    # Depth-first cycle check
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"cycle: {' -> '.join(path + [name])}")
+        state[name] = 'visiting'
+        for i in by_name[name].inputs:
+            visit(i, path + [name])
+        state[name] = 'done'
+
+    for name in by_name:
+        visit(name, [])
+    return by_name
+
+
+def run_dag(stages: Sequence[Stage], workers: int = DEFAULT_WORKERS, cache_dir: Optional[str] = STAGE_CACHE_DIR,
+            force: Sequence[str] = (), log=print) -> Dict[str, Any]:
+    """
+    Run every stage once its inputs are available; returns {stage name: output}.
+    force: stage names to rerun regardless of the cache (their dependents follow if the output changes).
+    """
+    by_name = _check_stages(stages)
+    cache = StageCache(cache_dir) if (cache_dir and STAGE_CACHE_ENABLED) else None
+    outputs: Dict[str, Any] = {}
+    hashes: Dict[str, str] = {}
+    failed: Dict[str, str] = {}
+    skipped: List[str] = []
+    waiting = dict(by_name)
+    t_start = time.perf_counter()
+
+    def execute(stage: Stage) -> Tuple[Any, str, str]:
+        args = [outputs[i] for i in stage.inputs]
+        key = None
+        if cache and stage.cache:
+            key = hashlib.sha256('\n'.join([stage_fingerprint(stage)] + [hashes[i] for i in stage.inputs])
+                                 .encode('utf-8')).hexdigest()
+            if stage.name not in force:
+                hit = cache.get(stage.name, key)
+                if hit is not None:
+                    return hit[0], hit[1], 'cached'
+        t0 = time.perf_counter()
+        output = stage.fn(*args)
+        digest = output_hash(output)
+        if key:
+            ttl_s = stage.ttl_s(*args) if callable(stage.ttl_s) else stage.ttl_s
+            cache.put(stage.name, key, output, digest, ttl_s)
+        return output, digest, f'{time.perf_counter() - t0:.1f}s'
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        running = {}
+        while waiting or running:
+            for name, stage in list(waiting.items()):
+                if any(i in failed or i in skipped for i in stage.inputs):
+                    skipped.append(name)
+                    del waiting[name]
+                elif all(i in outputs for i in stage.inputs):
+                    running[pool.submit(execute, stage)] = name
+                    del waiting[name]
+            if not running:
+                if waiting:
+                    # Only reachable through inputs that were skipped this pass - loop again to skip them
+                    continue
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    output, digest, how = future.result()
+                except Exception as e:
+                    failed[name] = f'{type(e).__name__}: {e}'
+                    log(f"   ❌ {name}: {failed[name]}")
+                    continue
+                outputs[name], hashes[name] = output, digest
+                log(f"   {'⏭️ ' if how == 'cached' else '✅'} {name} ({how})")
+
+    log(f"Ran {len(outputs)}/{len(by_name)} stage(s) in {time.perf_counter() - t_start:.1f}s")
+    if failed or skipped:
+        raise StageFailed(failed, skipped, outputs)
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or clear the report stage cache')
+    parser.add_argument('--cache-dir', default=STAGE_CACHE_DIR)
+    parser.add_argument('--stats', action='store_true', help='Show cache size')
+    parser.add_argument('--clear', action='store_true', help='Remove every cached stage output')
+    args = parser.parse_args()
+
+    cache = StageCache(args.cache_dir)
+    if args.clear:
+        print(f'🗑️  Removed {cache.clear()} cached stage output(s) from {args.cache_dir}')
+    else:
+        stats = cache.stats()
+        print(f"📦 {args.cache_dir}: {stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,8 @@ import csv
 from datetime import datetime, timedelta
 from typing import Dict, Optional, List
 
+from weekly_metrics import compute_growth_frame
+
 # Fix Windows console encoding for emojis
 if sys.platform == 'win32':
     import io
@@ -84,47 +86,50 @@ def process_query_results(results: List[Dict]) -> Optional[Dict]:
     
     data = results[0]
     
+    # Week-over-week growth for every metric in one vectorized pass
+    g = compute_growth_frame(results[:1], {'wow': ['last_week']}).to_dict(orient='records')[0]
+    
     # Calculate deltas and growth percentages
     report = {
         'orders': {
             'last_week': int(data.get('last_week_orders', 0)),
             'this_week': int(data.get('this_week_orders', 0)),
             'delta': int(data.get('this_week_orders', 0)) - int(data.get('last_week_orders', 0)),
-            'growth_pct': round((int(data.get('this_week_orders', 0)) - int(data.get('last_week_orders', 0))) / data.get('last_week_orders', 1) * 100, 2) if data.get('last_week_orders', 0) > 0 else 0
+            'growth_pct': round(g['orders_growth_pct_wow'], 2)
         },
         'gmv': {
             'last_week': round(float(data.get('last_week_gmv', 0)), 2),
             'this_week': round(float(data.get('this_week_gmv', 0)), 2),
             'delta': round(float(data.get('this_week_gmv', 0)) - float(data.get('last_week_gmv', 0)), 2),
-            'growth_pct': round((float(data.get('this_week_gmv', 0)) - float(data.get('last_week_gmv', 0))) / float(data.get('last_week_gmv', 1)) * 100, 2) if data.get('last_week_gmv', 0) > 0 else 0
+            'growth_pct': round(g['gmv_growth_pct_wow'], 2)
         },
         'eaters': {
             'last_week': int(data.get('last_week_eaters', 0)),
             'this_week': int(data.get('this_week_eaters', 0)),
             'delta': int(data.get('this_week_eaters', 0)) - int(data.get('last_week_eaters', 0)),
-            'growth_pct': round((int(data.get('this_week_eaters', 0)) - int(data.get('last_week_eaters', 0))) / data.get('last_week_eaters', 1) * 100, 2) if data.get('last_week_eaters', 0) > 0 else 0
+            'growth_pct': round(g['eaters_growth_pct_wow'], 2)
         },
         'basket_size': {
             'last_week': round(float(data.get('last_week_basket', 0)), 2),
             'this_week': round(float(data.get('this_week_basket', 0)), 2),
             'delta': round(float(data.get('this_week_basket', 0)) - float(data.get('last_week_basket', 0)), 2),
-            'growth_pct': round((float(data.get('this_week_basket', 0)) - float(data.get('last_week_basket', 0))) / float(data.get('last_week_basket', 1)) * 100, 2) if data.get('last_week_basket', 0) > 0 else 0
+            'growth_pct': round(g['basket_size_growth_pct_wow'], 2)
         },
         'completion_rate': {
             'last_week': round(float(data.get('last_week_completion_rate', 0)), 1),
             'this_week': round(float(data.get('this_week_completion_rate', 0)), 1),
-            'delta_pp': round(float(data.get('this_week_completion_rate', 0)) - float(data.get('last_week_completion_rate', 0)), 1)
+            'delta_pp': round(g['completion_rate_delta_pp_wow'], 1)
         },
         'sessions': {
             'last_week': int(data.get('last_week_sessions', 0)),
             'this_week': int(data.get('this_week_sessions', 0)),
             'delta': int(data.get('this_week_sessions', 0)) - int(data.get('last_week_sessions', 0)),
-            'growth_pct': round((int(data.get('this_week_sessions', 0)) - int(data.get('last_week_sessions', 0))) / data.get('last_week_sessions', 1) * 100, 2) if data.get('last_week_sessions', 0) > 0 else 0
+            'growth_pct': round(g['sessions_growth_pct_wow'], 2)
         },
         'cops': {
             'last_week': round(float(data.get('last_week_cops', 0)), 2),
             'this_week': round(float(data.get('this_week_cops', 0)), 2),
-            'delta': round(float(data.get('this_week_cops', 0)) - float(data.get('last_week_cops', 0)), 2)
+            'delta': round(g['cops_delta_wow'], 2)
         },
         'promo': {
             'expense_last_week': round(float(data.get('last_week_promo_expense', 0)), 2),
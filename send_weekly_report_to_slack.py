@@ -6,11 +6,13 @@ This script reads the existing weekly report data and sends it to Slack
 import os
 import sys
 import json
-import requests
 import csv
 from datetime import datetime
 from typing import Dict, Optional
 
+from calendar_dim import get_calendar
+from slack_delivery import deliver
+
 # Fix Windows console encoding for emojis
 if sys.platform == 'win32':
     import io
@@ -225,25 +227,14 @@ def send_to_slack(message: Dict) -> bool:
         print("  Or update SLACK_WEBHOOK_URL in this script")
         return False
     
-    try:
-        response = requests.post(
-            SLACK_WEBHOOK_URL,
-            json=message,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            print("✅ Successfully sent message to Slack")
-            return True
-        else:
-            print(f"❌ Failed to send to Slack. Status code: {response.status_code}")
-            print(f"Response: {response.text}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Error sending to Slack: {str(e)}")
-        return False
+    # Split at 50 blocks, retried on rate limits / 5xx (slack_delivery.py)
+    # Deduped per report week (same id as process_and_send_weekly_report.py), so a rerun doesn't post it twice
+    report_id = f"weekly-{get_calendar().report_windows()['this_week_end']}-oc"
+    if deliver(message, [SLACK_WEBHOOK_URL], report_id=report_id)[SLACK_WEBHOOK_URL]:
+        print("✅ Successfully sent message to Slack")
+        return True
+    print("❌ Failed to send to Slack")
+    return False
 
 def main():
     """Main function"""
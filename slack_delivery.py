@@ -0,0 +1,246 @@
+"""
+Slack Delivery Queue
+Posts report messages to Slack webhooks / channels from a small worker pool over
+one pooled HTTP session, so a multi-channel send takes about as long as the
+slowest channel instead of the sum of all of them.
+
+- Messages over Slack's 50-block limit are split into parts, preferably at a
+  divider. Parts after the first carry a "continued" marker; with a bot token
+  (channel targets) they are posted as thread replies to the first part.
+- 429s wait for Retry-After, 5xx and connection errors back off exponentially,
+  other 4xx (invalid_blocks, no_service ...) fail straight away.
+- Sends with a report_id are deduplicated per target: every finished send is
+  appended to a JSON Lines ledger (SLACK_DELIVERY_LOG), a report already posted
+  is skipped and a partly posted one resumes after its last posted part.
+  SLACK_DEDUPE=off ignores the ledger (it is still written).
+
+Targets are webhook URLs, or channel IDs posted with chat.postMessage and
+SLACK_BOT_TOKEN.
+
+Usage:
+    from slack_delivery import SlackDeliveryQueue, deliver
+    with SlackDeliveryQueue() as queue:
+        sent = queue.submit(message, webhook_url, report_id='weekly-20251130-oc')
+        ...
+        sent.result()  # -> True / False
+
+    deliver(message, [webhook_a, webhook_b], report_id='weekly-20251130-oc')  # -> {target: True / False}
+
+    python slack_delivery.py                     # summarise the delivery ledger
+"""
+
+import os
+import sys
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from job_runner import ResultStore
+
+MAX_BLOCKS = 50
+DEFAULT_WORKERS = int(os.getenv('SLACK_DELIVERY_WORKERS', '8'))
+DEFAULT_RETRIES = int(os.getenv('SLACK_DELIVERY_RETRIES', '5'))
+DEFAULT_TIMEOUT_S = float(os.getenv('SLACK_DELIVERY_TIMEOUT_S', '10'))
+DEFAULT_BACKOFF_S = 1.0
+DELIVERY_LOG = os.getenv('SLACK_DELIVERY_LOG', 'slack_deliveries.jsonl')
+DEDUPE_ENABLED = os.getenv('SLACK_DEDUPE', 'on').lower() not in ('off', 'false', '0')
+SLACK_BOT_TOKEN = os.getenv('SLACK_BOT_TOKEN', '')
+CHAT_POST_MESSAGE_URL = 'https://slack.com/api/chat.postMessage'
+
+
+class SlackDeliveryError(Exception):
+    pass
+
+
+class _Retry(Exception):
+    def __init__(self, reason: str, delay_s: Optional[float] = None):
+        super().__init__(reason)
+        self.delay_s = delay_s
+
+
+def split_blocks(blocks: List[Dict], max_blocks: int = MAX_BLOCKS) -> List[List[Dict]]:
+    """Split a block list into parts of at most max_blocks, cutting after the last divider that fits"""
+    parts = []
+    rest = list(blocks)
+    while len(rest) > max_blocks:
+        cut = max((i + 1 for i, block in enumerate(rest[:max_blocks]) if block.get('type') == 'divider'), default=0)
+        if cut < max_blocks // 2:
+            cut = max_blocks  # no divider in a sensible place - hard cut
+        parts.append(rest[:cut])
+        rest = rest[cut:]
+    if rest or not parts:
+        parts.append(rest)
+    return parts
+
+
+def message_parts(message: Dict, max_blocks: int = MAX_BLOCKS) -> List[Dict]:
+    """The message as one or more payloads within the block limit (one block per follow-up is the marker)"""
+    blocks = message.get('blocks') or []
+    if len(blocks) <= max_blocks:
+        return [message]
+    chunks = split_blocks(blocks, max_blocks - 1)
+    base = {k: v for k, v in message.items() if k != 'blocks'}
+    parts = []
+    for n, chunk in enumerate(chunks, 1):
+        if n > 1:
+            chunk = [{
+                "type": "context",
+                "elements": [{"type": "mrkdwn", "text": f"_continued ({n}/{len(chunks)})_"}]
+            }] + chunk
+        parts.append({**base, 'blocks': chunk})
+    return parts
+
+
+def _is_webhook(target: str) -> bool:
+    return target.startswith('https://')
+
+
+def _label(target: str) -> str:
+    """Webhook URLs are credentials - only their tail is printed / stored"""
+    return f'webhook …{target[-6:]}' if _is_webhook(target) else target
+
+
+def _delivery_key(report_id: str, target: str) -> str:
+    return f"{report_id}@{hashlib.sha1(target.encode('utf-8')).hexdigest()[:12]}"
+
+
+class SlackDeliveryQueue:
+    """
+    Worker pool posting messages to Slack; submit() returns a Future resolving to True / False.
+    Submitting the same report_id to the same target twice returns the first send's Future.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, retries: int = DEFAULT_RETRIES,
+                 timeout_s: float = DEFAULT_TIMEOUT_S, backoff_s: float = DEFAULT_BACKOFF_S,
+                 log_path: Optional[str] = DELIVERY_LOG, bot_token: str = SLACK_BOT_TOKEN,
+                 dedupe: bool = DEDUPE_ENABLED, max_blocks: int = MAX_BLOCKS):
+        self.retries = retries
+        self.timeout_s = timeout_s
+        self.backoff_s = backoff_s
+        self.bot_token = bot_token
+        self.max_blocks = max_blocks
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('https://', adapter)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='slack')
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+        self._log = ResultStore(log_path) if log_path else None
+        self._ledger = self._log.load() if (self._log and dedupe) else {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Wait for queued sends and release the workers and connections"""
+        self._pool.shutdown(wait=True)
+        self.session.close()
+
+    def submit(self, message: Dict, target: str, report_id: Optional[str] = None) -> Future:
+        if not target:
+            raise SlackDeliveryError('no Slack target (webhook URL or channel ID) given')
+        key = _delivery_key(report_id, target) if report_id else None
+        with self._lock:
+            if key in self._futures:
+                return self._futures[key]
+            previous = self._ledger.get(key) if key else None
+            if previous and previous.get('status') == 'ok':
+                print(f"   ⏭️  {report_id} already sent to {_label(target)}")
+                future = Future()
+                future.set_result(True)
+            else:
+                future = self._pool.submit(self._deliver, message, target, report_id, key, previous)
+            if key:
+                self._futures[key] = future
+        return future
+
+    def _deliver(self, message: Dict, target: str, report_id: Optional[str], key: Optional[str],
+                 previous: Optional[Dict]) -> bool:
+        t0 = time.perf_counter()
+        parts = message_parts(message, self.max_blocks)
+        posted, thread_ts = 0, None
+        if previous and previous.get('parts') == len(parts):
+            posted, thread_ts = previous.get('parts_sent', 0), previous.get('thread_ts')
+            if posted:
+                print(f"   ↪ {report_id}: resuming {_label(target)} after part {posted}/{len(parts)}")
+        error = None
+        try:
+            for part in parts[posted:]:
+                ts = self._post(target, part, thread_ts)
+                thread_ts = thread_ts or ts
+                posted += 1
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            print(f"   ❌ Slack send to {_label(target)} failed after {posted}/{len(parts)} part(s): {error}")
+        status = 'ok' if posted == len(parts) else ('partial' if posted else 'failed')
+        if key and self._log:
+            self._log.append({'job_id': key, 'status': status, 'report_id': report_id, 'target': _label(target),
+                              'parts': len(parts), 'parts_sent': posted, 'thread_ts': thread_ts, 'error': error,
+                              'elapsed_s': round(time.perf_counter() - t0, 2)})
+        return status == 'ok'
+
+    def _post(self, target: str, payload: Dict, thread_ts: Optional[str] = None) -> Optional[str]:
+        """One payload with retries; returns the message ts (chat.postMessage only)"""
+        for n in range(1, self.retries + 2):
+            try:
+                return self._post_once(target, payload, thread_ts)
+            except (_Retry, requests.ConnectionError, requests.Timeout) as e:
+                if n > self.retries:
+                    raise SlackDeliveryError(f'gave up after {n} attempt(s): {e}')
+                delay = getattr(e, 'delay_s', None)
+                if delay is None:
+                    delay = self.backoff_s * (2 ** (n - 1)) * (1 + random.random() * 0.25)
+                print(f"   ↻ Slack {_label(target)}: {e}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _post_once(self, target: str, payload: Dict, thread_ts: Optional[str]) -> Optional[str]:
+        if _is_webhook(target):
+            response = self.session.post(target, json=payload, timeout=self.timeout_s)
+        else:
+            if not self.bot_token:
+                raise SlackDeliveryError(f'{target} is not a webhook URL and SLACK_BOT_TOKEN is not set')
+            body = {**payload, 'channel': target}
+            if thread_ts:
+                body['thread_ts'] = thread_ts
+            response = self.session.post(CHAT_POST_MESSAGE_URL, json=body, timeout=self.timeout_s,
+                                         headers={'Authorization': f'Bearer {self.bot_token}'})
+        if response.status_code == 429:
+            retry_after = response.headers.get('Retry-After')
+            raise _Retry('rate limited (429)', float(retry_after) if retry_after else None)
+        if response.status_code >= 500:
+            raise _Retry(f'status {response.status_code}')
+        if response.status_code != 200:
+            raise SlackDeliveryError(f'status {response.status_code}: {response.text[:200]}')
+        if _is_webhook(target):
+            return None
+        data = response.json()
+        if not data.get('ok'):
+            if data.get('error') == 'ratelimited':
+                raise _Retry('rate limited')
+            raise SlackDeliveryError(data.get('error', 'unknown error'))
+        return data.get('ts')
+
+
+def deliver(message: Dict, targets: Sequence[str], report_id: Optional[str] = None, **queue_options) -> Dict[str, bool]:
+    """Send one message to every target concurrently; returns {target: sent}"""
+    with SlackDeliveryQueue(**queue_options) as queue:
+        futures = {target: queue.submit(message, target, report_id) for target in targets}
+        return {target: future.result() for target, future in futures.items()}
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else DELIVERY_LOG
+    for key, record in sorted(ResultStore(path).load().items()):
+        status = {'ok': '✅', 'partial': '⚠️ '}.get(record.get('status'), '❌')
+        print(f"{status} {record.get('report_id')} -> {record.get('target')}: "
+              f"{record.get('parts_sent')}/{record.get('parts')} part(s)"
+              + (f" - {record['error']}" if record.get('error') else ''))
@@ -0,0 +1,231 @@
+"""
+Partition-Pruning SQL Linter / Rewriter
+ocd_adw fact tables are partitioned on date_id, and a predicate only prunes
+partitions when it compares date_id itself. Many generators filter on the month
+(or year) derived from it:
+
+    CAST(SUBSTRING(CAST(f.date_id AS VARCHAR), 1, 6) AS INTEGER) IN (202509, 202510, 202511)
+
+which reads every partition. rewrite_partition_predicates turns such
+predicates (IN, =, BETWEEN, <, <=, >, >= against month / year literals) into
+date_id ranges:
+
+    f.date_id BETWEEN 20250901 AND 20251130
+
+Ranges run from the first to the last real day of each month (or year), so
+query_cache can tell how recent the window is. Predicates whose literal is part
+of an arithmetic expression (= 202510 + 1) are left alone, as is the same
+expression used in SELECT / GROUP BY - it doesn't affect pruning.
+
+lint_sql also warns about patterns it can't fix:
+- NOT IN (SELECT ...) subqueries (NULL-unsafe, usually a full anti-join)
+- the same partitioned table scanned more than once in one query
+- a partitioned table read with no date_id predicate at all
+- date_id still wrapped in functions inside a predicate
+
+query_executor.run_query applies prepare_query to every query before it runs
+(SQL_REWRITE=off disables the rewrite; warnings are still printed).
+
+Usage:
+    python sql_lint.py query.sql other.sql          # report rewrites and warnings
+    python sql_lint.py --write query.sql            # rewrite the files in place
+"""
+
+import os
+import re
+import sys
+import argparse
+import calendar
+import threading
+from typing import List, Sequence, Tuple
+
+from query_cache import normalize_sql
+
+SQL_REWRITE_ENABLED = os.getenv('SQL_REWRITE', 'on').lower() not in ('off', 'false', '0')
+
+# Tables partitioned on date_id
+PARTITIONED_TABLES = (
+    'f_food_metrics',
+    'f_food_discount',
+    'agg_food_cops_metrics',
+)
+
+_INT = r"(?:INTEGER|INT|BIGINT)"
+# CAST(SUBSTRING(CAST(x.date_id AS VARCHAR), 1, 6) AS INTEGER), or the bare SUBSTRING(...) compared to a string
+_PERIOD_EXPR = (
+    r"(?:CAST\s*\(\s*SUBSTR(?:ING)?\s*\(\s*CAST\s*\(\s*(?P<col>(?:\w+\.)?date_id)\s+AS\s+VARCHAR\s*\)\s*,\s*1\s*,\s*(?P<len>[46])\s*\)\s+AS\s+" + _INT + r"\s*\)"
+    r"|SUBSTR(?:ING)?\s*\(\s*CAST\s*\(\s*(?P<scol>(?:\w+\.)?date_id)\s+AS\s+VARCHAR\s*\)\s*,\s*1\s*,\s*(?P<slen>[46])\s*\))"
+)
+_LITERAL = r"'?\d{4}(?:\d{2})?'?"
+# A literal followed by arithmetic / concatenation is part of an expression, not a period
+_NO_ARITHMETIC = r"(?!\d)(?!\s*(?:[+*%]|-(?!-)|/(?!\*)|\|\|))"
+PERIOD_EXPR_RE = re.compile(_PERIOD_EXPR, re.IGNORECASE)
+PERIOD_IN_RE = re.compile(_PERIOD_EXPR + r"\s+IN\s*\(\s*(?P<values>" + _LITERAL + r"(?:\s*,\s*" + _LITERAL + r")*)\s*\)",
+                          re.IGNORECASE)
+PERIOD_BETWEEN_RE = re.compile(_PERIOD_EXPR + r"\s+BETWEEN\s+(?P<low>" + _LITERAL + r")\s+AND\s+(?P<high>" + _LITERAL + r")" + _NO_ARITHMETIC,
+                               re.IGNORECASE)
+PERIOD_CMP_RE = re.compile(_PERIOD_EXPR + r"\s*(?P<op>>=|<=|=|>|<)\s*(?P<value>" + _LITERAL + r")" + _NO_ARITHMETIC,
+                           re.IGNORECASE)
+PERIOD_PREDICATE_RE = re.compile(_PERIOD_EXPR + r"\s*(?:>=|<=|<>|!=|=|>|<|\bIN\b|\bNOT\s+IN\b|\bBETWEEN\b)", re.IGNORECASE)
+NOT_IN_SUBQUERY_RE = re.compile(r"\bNOT\s+IN\s*\(\s*SELECT\b", re.IGNORECASE)
+TABLE_SCAN_RE = re.compile(r"\b(?:FROM|JOIN)\s+((?:\w+\.)?(" + "|".join(PARTITIONED_TABLES) + r"))\b", re.IGNORECASE)
+DATE_ID_PREDICATE_RE = re.compile(r"\bdate_id\s*(?:>=|<=|=|>|<|\bBETWEEN\b|\bIN\b)", re.IGNORECASE)
+
+
+def _period_bounds(value: str, length: int) -> Tuple[int, int]:
+    """First and last date_id of a YYYYMM month or YYYY year"""
+    value = value.strip("'")
+    if len(value) != length:
+        raise ValueError(f'{value} is not a {length}-digit period')
+    if length == 4:
+        return int(f'{value}0101'), int(f'{value}1231')
+    year, month = int(value[:4]), int(value[4:])
+    if not 1 <= month <= 12:
+        raise ValueError(f'{value} is not a YYYYMM month')
+    return int(f'{value}01'), int(f'{value}{calendar.monthrange(year, month)[1]:02d}')
+
+
+def _next_period(value: int, length: int) -> int:
+    if length == 4:
+        return value + 1
+    year, month = divmod(value, 100)
+    return (year + 1) * 100 + 1 if month == 12 else value + 1
+
+
+def _ranges_predicate(col: str, periods: Sequence[str], length: int) -> str:
+    """date_id BETWEEN ranges covering the periods, consecutive periods merged"""
+    runs = []
+    for period in sorted({int(p.strip("'")) for p in periods}):
+        if runs and period == _next_period(runs[-1][1], length):
+            runs[-1][1] = period
+        else:
+            runs.append([period, period])
+    ranges = [f"{col} BETWEEN {_period_bounds(str(start), length)[0]} AND {_period_bounds(str(end), length)[1]}"
+              for start, end in runs]
+    return ranges[0] if len(ranges) == 1 else '(' + ' OR '.join(ranges) + ')'
+
+
+def _expr_parts(match) -> Tuple[str, int]:
+    col = match.group('col') or match.group('scol')
+    length = int(match.group('len') or match.group('slen'))
+    return col, length
+
+
+def rewrite_partition_predicates(sql: str) -> Tuple[str, int]:
+    """Rewrite month / year predicates on date_id into prunable date_id ranges; returns (sql, rewrites)"""
+    rewrites = 0
+
+    def sub_in(match):
+        nonlocal rewrites
+        col, length = _expr_parts(match)
+        try:
+            predicate = _ranges_predicate(col, re.findall(_LITERAL, match.group('values')), length)
+        except ValueError:
+            return match.group(0)
+        rewrites += 1
+        return predicate
+
+    def sub_between(match):
+        nonlocal rewrites
+        col, length = _expr_parts(match)
+        try:
+            low = _period_bounds(match.group('low'), length)[0]
+            high = _period_bounds(match.group('high'), length)[1]
+        except ValueError:
+            return match.group(0)
+        rewrites += 1
+        return f'{col} BETWEEN {low} AND {high}'
+
+    def sub_cmp(match):
+        nonlocal rewrites
+        col, length = _expr_parts(match)
+        try:
+            first, last = _period_bounds(match.group('value'), length)
+        except ValueError:
+            return match.group(0)
+        op = match.group('op')
+        rewrites += 1
+        if op == '=':
+            return f'{col} BETWEEN {first} AND {last}'
+        # >= / < compare against the period's first day, > / <= against its last day
+        return f'{col} {op} {first if op in (">=", "<") else last}'
+
+    sql = PERIOD_IN_RE.sub(sub_in, sql)
+    sql = PERIOD_BETWEEN_RE.sub(sub_between, sql)
+    sql = PERIOD_CMP_RE.sub(sub_cmp, sql)
+    return sql, rewrites
+
+
+def lint_sql(sql: str) -> List[str]:
+    """Warnings for partition-pruning and scan anti-patterns left in a query"""
+    text = normalize_sql(sql)
+    warnings = []
+
+    unprunable = len(PERIOD_PREDICATE_RE.findall(text))
+    if unprunable:
+        warnings.append(f'{unprunable} predicate(s) compare a function of date_id - these scan every partition; '
+                        f'compare date_id itself')
+
+    not_in = len(NOT_IN_SUBQUERY_RE.findall(text))
+    if not_in:
+        warnings.append(f'{not_in} NOT IN (SELECT ...) subquery(ies) - NULL-unsafe and usually a full anti-join; '
+                        f'prefer NOT EXISTS or LEFT JOIN ... IS NULL')
+
+    scans = {}
+    for full_name, table in TABLE_SCAN_RE.findall(text):
+        scans[table.lower()] = scans.get(table.lower(), 0) + 1
+    for table, count in sorted(scans.items()):
+        if count > 1:
+            warnings.append(f'{table} is scanned {count} times - consider one scan with conditional aggregation')
+    if scans and not DATE_ID_PREDICATE_RE.search(text):
+        warnings.append(f"no date_id predicate - {', '.join(sorted(scans))} read across all partitions")
+    return warnings
+
+
+_reported = set()
+_reported_lock = threading.Lock()
+
+
+def prepare_query(sql: str, log=print) -> str:
+    """
+    Rewrite a query for partition pruning (unless SQL_REWRITE=off) and log its lint warnings.
+    Each distinct query is reported once per process, so batch runners don't repeat themselves.
+    """
+    rewritten, rewrites = rewrite_partition_predicates(sql) if SQL_REWRITE_ENABLED else (sql, 0)
+    key = hash(normalize_sql(sql))
+    with _reported_lock:
+        first_time = key not in _reported
+        _reported.add(key)
+    if first_time and log:
+        if rewrites:
+            log(f'   🔧 sql_lint: rewrote {rewrites} month/year predicate(s) into date_id ranges')
+        for warning in lint_sql(rewritten):
+            log(f'   ⚠️  sql_lint: {warning}')
+    return rewritten
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check generated SQL for partition pruning and rewrite date predicates')
+    parser.add_argument('files', nargs='+', help='SQL files to check')
+    parser.add_argument('--write', action='store_true', help='Rewrite the files in place')
+    args = parser.parse_args()
+
+    total_warnings = 0
+    for path in args.files:
+        with open(path, encoding='utf-8') as f:
+            sql = f.read()
+        rewritten, rewrites = rewrite_partition_predicates(sql)
+        warnings = lint_sql(rewritten)
+        total_warnings += len(warnings)
+        print(f'{path}: {rewrites} predicate(s) rewritable, {len(warnings)} warning(s)')
+        for warning in warnings:
+            print(f'   ⚠️  {warning}')
+        if args.write and rewrites:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(rewritten)
+            print(f'   ✅ rewritten')
+    sys.exit(1 if total_warnings else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,6 +14,8 @@ import io
 import subprocess
 from datetime import datetime
 
+from sql_lint import prepare_query
+
 # Fix Windows encoding
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
@@ -205,7 +207,8 @@ def main():
     print("="*80)
     print()
     
-    query = generate_metrics_query()
+    # rewritten so the month filter prunes date_id partitions
+    query = prepare_query(generate_metrics_query())
     print(query)
     print()
     print("="*80)
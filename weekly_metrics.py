@@ -0,0 +1,188 @@
+"""
+Shared growth-metric kernel for the weekly reports
+Takes the raw weekly query rows (one per city, or one for OC overall) as a
+DataFrame and computes every growth %, delta-pp, pax frequency and COPS delta
+for all rows in one vectorized pass, then assembles the report dicts used by
+process_and_send_weekly_report.py and the other weekly report scripts.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Sequence
+
+# Weekly metrics compared as growth %: (report key, query column suffix)
+GROWTH_METRICS = [
+    ('orders', 'orders'),
+    ('gmv', 'gmv'),
+    ('eaters', 'eaters'),
+    ('basket_size', 'basket'),
+    ('sessions', 'sessions'),
+    ('new_pax', 'new_pax'),
+]
+
+# Monthly metrics (MTM, median MEX earnings) have their own baselines
+MONTH_METRICS = ['mtm', 'earning_per_mex']
+MONTH_BASELINES = {'mom': 'last_month', 'yoy': 'same_month_last_year'}
+
+# Default comparison windows for the weekly report. The query labels the
+# same-week-last-year window "ytd_avg", so YoY falls back to it.
+WEEKLY_BASELINES = {
+    'mom': ['same_week_last_month'],
+    'yoy': ['same_week_last_year', 'ytd_avg'],
+}
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name in df.columns:
+        return pd.to_numeric(df[name], errors='coerce')
+    return pd.Series(np.nan, index=df.index)
+
+
+def _first_present(df: pd.DataFrame, names: Sequence[str]) -> pd.Series:
+    """Coalesce several candidate columns, first one wins (missing -> 0)"""
+    result = pd.Series(np.nan, index=df.index)
+    for name in names:
+        result = result.fillna(_column(df, name))
+    return result.fillna(0)
+
+
+def _growth_pct(current: pd.Series, base: pd.Series) -> np.ndarray:
+    """(current - base) / base * 100, or 0 where there is no positive base"""
+    safe_base = base.where(base > 0)
+    return ((current - safe_base) / safe_base * 100).fillna(0).to_numpy()
+
+
+def _ratio(num: pd.Series, den: pd.Series) -> np.ndarray:
+    return (num / den.where(den > 0)).fillna(0).to_numpy()
+
+
+def compute_growth_frame(rows: List[Dict], baselines: Dict[str, Sequence[str]] = None,
+                         current: str = 'this_week') -> pd.DataFrame:
+    """
+    Vectorized metric computation for every row of a weekly query result.
+
+    baselines maps a comparison label (e.g. 'mom', 'yoy', 'wow') to the
+    column prefixes to compare against, in fallback order. Returns one row per
+    input row with, for each label L:
+        {metric}_base_{L}, {metric}_growth_pct_{L}   for orders/gmv/eaters/basket/sessions/new_pax
+        pax_frequency_{L}, pax_frequency_growth_pct_{L}
+        completion_rate_delta_pp_{L}, cops_delta_{L}
+    plus pax_frequency (current window) and the monthly MTM / earning per MEX growth.
+    """
+    baselines = baselines or WEEKLY_BASELINES
+    df = pd.DataFrame(rows)
+    out = {}
+
+    cur = {suffix: _column(df, f'{current}_{suffix}').fillna(0)
+           for _, suffix in GROWTH_METRICS + [('', 'completion_rate'), ('', 'cops')]}
+    out['pax_frequency'] = _ratio(cur['orders'], cur['eaters'])
+
+    for label, prefixes in baselines.items():
+        base = {suffix: _first_present(df, [f'{p}_{suffix}' for p in prefixes])
+                for _, suffix in GROWTH_METRICS + [('', 'completion_rate'), ('', 'cops')]}
+        for key, suffix in GROWTH_METRICS:
+            out[f'{key}_base_{label}'] = base[suffix].to_numpy()
+            out[f'{key}_growth_pct_{label}'] = _growth_pct(cur[suffix], base[suffix])
+
+        pax_frequency_base = pd.Series(_ratio(base['orders'], base['eaters']), index=df.index)
+        out[f'pax_frequency_{label}'] = pax_frequency_base.to_numpy()
+        out[f'pax_frequency_growth_pct_{label}'] = _growth_pct(
+            pd.Series(out['pax_frequency'], index=df.index), pax_frequency_base)
+        out[f'completion_rate_delta_pp_{label}'] = (cur['completion_rate'] - base['completion_rate']).to_numpy()
+        out[f'cops_delta_{label}'] = (cur['cops'] - base['cops']).to_numpy()
+
+    for metric in MONTH_METRICS:
+        month_current = _column(df, f'current_month_{metric}').fillna(0)
+        for label, prefix in MONTH_BASELINES.items():
+            out[f'{metric}_growth_pct_{label}'] = _growth_pct(
+                month_current, _column(df, f'{prefix}_{metric}').fillna(0))
+
+    return pd.DataFrame(out, index=df.index)
+
+
+def _raw(row: Dict, names: Sequence[str], default=0):
+    """Raw query value from the first present key, keeping its original type"""
+    for name in names:
+        if name in row:
+            return row[name]
+    return default
+
+
+def _growth_pcts(m: Dict, metric: str) -> Dict:
+    return {
+        'growth_pct_mom': round(m[f'{metric}_growth_pct_mom'], 1),
+        'growth_pct_yoy': round(m[f'{metric}_growth_pct_yoy'], 1)
+    }
+
+
+def _growth_block(row: Dict, m: Dict, key: str, suffix: str, yoy_prefixes: Sequence[str]) -> Dict:
+    return {
+        'this_week': row.get(f'this_week_{suffix}', 0),
+        'same_week_last_month': row.get(f'same_week_last_month_{suffix}', 0),
+        'same_week_last_year': _raw(row, [f'{p}_{suffix}' for p in yoy_prefixes]),
+        **_growth_pcts(m, key)
+    }
+
+
+def build_weekly_report(row: Dict, m: Dict, yoy_prefixes: Sequence[str]) -> Dict:
+    """Assemble the weekly report dict for one query row from its computed metrics"""
+    return {
+        'orders': _growth_block(row, m, 'orders', 'orders', yoy_prefixes),
+        'gmv': _growth_block(row, m, 'gmv', 'gmv', yoy_prefixes),
+        'eaters': _growth_block(row, m, 'eaters', 'eaters', yoy_prefixes),
+        'basket_size': _growth_block(row, m, 'basket_size', 'basket', yoy_prefixes),
+        'fulfilment_rate': {
+            'this_week': row.get('this_week_completion_rate', 0),
+            'same_week_last_month': row.get('same_week_last_month_completion_rate', 0),
+            'same_week_last_year': _raw(row, [f'{p}_completion_rate' for p in yoy_prefixes]),
+            'delta_pp_mom': round(m['completion_rate_delta_pp_mom'], 1),
+            'delta_pp_yoy': round(m['completion_rate_delta_pp_yoy'], 1)
+        },
+        'sessions': _growth_block(row, m, 'sessions', 'sessions', yoy_prefixes),
+        'cops': {
+            'this_week': row.get('this_week_cops', 0),
+            'same_week_last_month': row.get('same_week_last_month_cops', 0),
+            'same_week_last_year': _raw(row, [f'{p}_cops' for p in yoy_prefixes]),
+            'delta_mom': round(m['cops_delta_mom'], 2),
+            'delta_yoy': round(m['cops_delta_yoy'], 2)
+        },
+        'promo': {
+            'penetration_this_week': row.get('this_week_promo_penetration', 0),
+            'penetration_same_week_last_month': row.get('same_week_last_month_promo_penetration', 0),
+            'penetration_same_week_last_year': _raw(row, [f'{p}_promo_penetration' for p in yoy_prefixes])
+        },
+        'pax_frequency': {
+            'this_week': round(m['pax_frequency'], 2),
+            'same_week_last_month': round(m['pax_frequency_mom'], 2),
+            'same_week_last_year': round(m['pax_frequency_yoy'], 2),
+            'growth_pct_mom': round(m['pax_frequency_growth_pct_mom'], 1),
+            'growth_pct_yoy': round(m['pax_frequency_growth_pct_yoy'], 1)
+        },
+        'new_pax': {
+            'this_week': int(row.get('this_week_new_pax', 0)),
+            'same_week_last_month': int(row.get('same_week_last_month_new_pax', 0)),
+            'same_week_last_year': int(_raw(row, [f'{p}_new_pax' for p in yoy_prefixes])),
+            **_growth_pcts(m, 'new_pax')
+        },
+        'mtm': {
+            'current_month': int(row.get('current_month_mtm', 0)),
+            'last_month': int(row.get('last_month_mtm', 0)),
+            'same_month_last_year': int(row.get('same_month_last_year_mtm', 0)),
+            **_growth_pcts(m, 'mtm')
+        },
+        'earning_per_mex': {
+            'current_month': round(row.get('current_month_earning_per_mex', 0), 2),
+            'last_month': round(row.get('last_month_earning_per_mex', 0), 2),
+            'same_month_last_year': round(row.get('same_month_last_year_earning_per_mex', 0), 2),
+            **_growth_pcts(m, 'earning_per_mex')
+        }
+    }
+
+
+def build_weekly_reports(rows: List[Dict], yoy_prefixes: Sequence[str] = ('same_week_last_year', 'ytd_avg')) -> List[Dict]:
+    """Weekly report dicts for every row, computed in one vectorized pass"""
+    if not rows:
+        return []
+    metrics = compute_growth_frame(rows, {'mom': ['same_week_last_month'], 'yoy': list(yoy_prefixes)})
+    return [build_weekly_report(row, m, yoy_prefixes)
+            for row, m in zip(rows, metrics.to_dict(orient='records'))]
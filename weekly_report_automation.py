@@ -3,7 +3,7 @@ Automated Weekly Report Generator for OC Cities and Penang
 Sends weekly performance reports via Slack every week
 
 Setup:
-1. Install required packages: pip install requests pandas
+1. Install required packages: pip install requests pandas pyarrow duckdb presto-python-client
 2. Set SLACK_WEBHOOK_URL environment variable or update in script
 3. Schedule to run weekly (see instructions at bottom)
 
@@ -15,39 +15,27 @@ import os
 import sys
 import json
 import requests
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List, Optional
 import pandas as pd
 
+from calendar_dim import get_calendar
+from query_executor import get_executor, run_query
+
 # Configuration
 SLACK_WEBHOOK_URL = os.getenv('SLACK_WEBHOOK_URL', '')  # Set your Slack webhook URL
 SLACK_CHANNEL = os.getenv('SLACK_CHANNEL', '#food-analytics')  # Default channel
 SLACK_USERNAME = os.getenv('SLACK_USERNAME', 'Weekly Report Bot')
 
-# Presto/Hubble Connection (adjust based on your setup)
-# Note: You may need to use your organization's Presto connection method
-# This is a template - adjust connection details as needed
+# Presto/Hubble Connection - configured through QUERY_BACKEND / PRESTO_* environment variables
 
 def get_presto_connection():
     """
-    Get Presto connection - adjust based on your organization's setup
-    You may need to use:
-    - Presto Python client
-    - SQLAlchemy
-    - Your organization's internal query tool
+    Get the shared query executor (see query_executor.py)
+    QUERY_BACKEND=presto uses pooled Presto connections (PRESTO_HOST, PRESTO_USER, ...),
+    QUERY_BACKEND=duckdb runs the same SQL against local parquet extracts (LOCAL_EXTRACT_DIR)
     """
-    # TODO: Configure your Presto connection here
-    # Example using presto-python-client:
-    # from presto.dbapi import connect
-    # conn = connect(
-    #     host='your-presto-host',
-    #     port=8080,
-    #     user='your-username',
-    #     catalog='hive',
-    #     schema='ocd_adw'
-    # )
-    # return conn
-    pass
+    return get_executor()
 
 def run_presto_query(query: str) -> List[Dict]:
     """
@@ -57,20 +45,9 @@ def run_presto_query(query: str) -> List[Dict]:
         query: SQL query string
         
     Returns:
-        List of dictionaries with query results
+        List of dictionaries with query results (cached on disk, see query_cache.py)
     """
-    # TODO: Implement your Presto query execution
-    # This is a placeholder - you'll need to use your organization's method
-    # Example:
-    # conn = get_presto_connection()
-    # cursor = conn.cursor()
-    # cursor.execute(query)
-    # columns = [desc[0] for desc in cursor.description]
-    # results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-    # return results
-    
-    # For now, return empty - you'll need to implement this
-    return []
+    return run_query(query)
 
 def get_week_dates():
     """
@@ -79,27 +56,8 @@ def get_week_dates():
     Returns:
         Tuple of (this_week_start, this_week_end, last_week_start, last_week_end)
     """
-    today = datetime.now()
-    
-    # Calculate this week (Monday to Sunday)
-    days_since_monday = today.weekday()
-    this_week_start = today - timedelta(days=days_since_monday)
-    this_week_end = this_week_start + timedelta(days=6)
-    
-    # Calculate last week
-    last_week_start = this_week_start - timedelta(days=7)
-    last_week_end = this_week_end - timedelta(days=7)
-    
-    # Format as YYYYMMDD
-    def format_date(d):
-        return d.strftime('%Y%m%d')
-    
-    return (
-        format_date(this_week_start),
-        format_date(this_week_end),
-        format_date(last_week_start),
-        format_date(last_week_end)
-    )
+    # Monday-Sunday weeks from the precomputed calendar dimension (calendar_dim.py)
+    return get_calendar().monday_weeks(datetime.now())
 
 def generate_oc_report(this_week_start: str, this_week_end: str, 
                       last_week_start: str, last_week_end: str) -> Dict: